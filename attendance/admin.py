@@ -1,10 +1,11 @@
 from django.contrib import admin
 from django.contrib import messages
-from django.utils import timezone
 from django.urls import reverse
 from django.utils.html import format_html
 from django.contrib.auth import get_user_model
-from .models import LeaveRequest, Attendance, Holiday
+from .models import LeaveRequest, Attendance, Holiday, DailyAttendanceSummary, LeaveBalance, WeeklyOfficeAttendance
+from .leaves import review_leave_requests
+from .summaries import resync_daily_summaries
 
 User = get_user_model()
 
@@ -94,20 +95,12 @@ class LeaveRequestAdmin(admin.ModelAdmin):
     action_buttons.allow_tags = True
     
     def approve_selected_leave(self, request, queryset):
-        updated = queryset.filter(status='pending').update(
-            status='approved',
-            reviewed_by=request.user,
-            reviewed_at=timezone.now()
-        )
+        updated = review_leave_requests(queryset, LeaveRequest.APPROVED, request.user)
         self.message_user(request, f'Successfully approved {updated} leave request(s).', messages.SUCCESS)
     approve_selected_leave.short_description = 'Approve selected leave requests'
     
     def reject_selected_leave(self, request, queryset):
-        updated = queryset.filter(status='pending').update(
-            status='rejected',
-            reviewed_by=request.user,
-            reviewed_at=timezone.now()
-        )
+        updated = review_leave_requests(queryset, LeaveRequest.REJECTED, request.user)
         self.message_user(request, f'Successfully rejected {updated} leave request(s).', messages.SUCCESS)
     reject_selected_leave.short_description = 'Reject selected leave requests'
     
@@ -130,9 +123,48 @@ class AttendanceAdmin(admin.ModelAdmin):
     search_fields = ('user__email', 'user__first_name', 'user__last_name')
     list_per_page = 50
 
+    # Punches edited here bypass the clock-in service, so their days' summaries are recomputed
+    def save_model(self, request, obj, form, change):
+        previous = Attendance.objects.filter(pk=obj.pk).values_list('user_id', 'date').first() if change else None
+        super().save_model(request, obj, form, change)
+        resync_daily_summaries({(obj.user_id, obj.date), previous} - {None})
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        resync_daily_summaries([(obj.user_id, obj.date)])
+
+    def delete_queryset(self, request, queryset):
+        pairs = set(queryset.values_list('user_id', 'date'))
+        super().delete_queryset(request, queryset)
+        resync_daily_summaries(pairs)
+
 @admin.register(Holiday)
 class HolidayAdmin(admin.ModelAdmin):
     list_display = ('name', 'date', 'is_recurring')
     list_filter = ('is_recurring',)
     search_fields = ('name', 'description')
     date_hierarchy = 'date'
+
+@admin.register(DailyAttendanceSummary)
+class DailyAttendanceSummaryAdmin(admin.ModelAdmin):
+    list_display = ('user', 'date', 'status', 'first_check_in', 'last_check_out', 'duration')
+    list_filter = ('status', 'date')
+    search_fields = ('user__email', 'user__first_name', 'user__last_name')
+    list_per_page = 50
+
+@admin.register(LeaveBalance)
+class LeaveBalanceAdmin(admin.ModelAdmin):
+    list_display = ('user', 'year', 'leave_type', 'entitled_days', 'used_days', 'pending_days', 'remaining_days')
+    list_filter = ('year', 'leave_type')
+    search_fields = ('user__email', 'user__first_name', 'user__last_name')
+    readonly_fields = ('used_days', 'pending_days', 'updated_at')
+    list_per_page = 50
+
+
+@admin.register(WeeklyOfficeAttendance)
+class WeeklyOfficeAttendanceAdmin(admin.ModelAdmin):
+    list_display = ('office', 'week_start', 'staff_count', 'expected_days', 'leave_days', 'present_days', 'attendance_percentage')
+    list_filter = ('office',)
+    date_hierarchy = 'week_start'
+    readonly_fields = ('staff_count', 'working_days', 'expected_days', 'leave_days', 'present_days', 'updated_at')
+    list_per_page = 50
@@ -0,0 +1,124 @@
+import logging
+from datetime import datetime, time as dt_time, timedelta
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .dashboard import invalidate_dashboard
+from .models import Attendance, DailyAttendanceSummary
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CUTOFF = '18:00'
+
+
+def _parse_time(value):
+    return datetime.strptime(value, '%H:%M').time()
+
+
+def _zone(name):
+    try:
+        return ZoneInfo(name) if name else None
+    except (ZoneInfoNotFoundError, ValueError):
+        logger.warning(f"Unknown timezone '{name}' in auto-close settings; ignoring it")
+        return None
+
+
+def office_cutoff(office_id, user_timezone=None):
+    """
+    Cut-off (local time, timezone) used to close a check-in for an office.
+
+    Settings:
+        ATTENDANCE_AUTO_CHECKOUT_TIME  default local cut-off, 'HH:MM' (default 18:00)
+        ATTENDANCE_OFFICE_CHECKOUT     {office_id: {'time': 'HH:MM', 'timezone': 'Area/City'}}
+
+    An office without its own timezone falls back to the staff member's
+    timezone and then to TIME_ZONE.
+    """
+    office_settings = getattr(settings, 'ATTENDANCE_OFFICE_CHECKOUT', {}).get(office_id, {})
+    cutoff = _parse_time(
+        office_settings.get('time') or getattr(settings, 'ATTENDANCE_AUTO_CHECKOUT_TIME', DEFAULT_CUTOFF)
+    )
+    tz = _zone(office_settings.get('timezone')) or _zone(user_timezone) or timezone.get_default_timezone()
+    return cutoff, tz
+
+
+def open_check_ins(day):
+    """Check-ins on ``day`` with no matching check-out, in one query"""
+    check_out = Attendance.objects.filter(
+        user=OuterRef('user'),
+        date=OuterRef('date'),
+        attendance_type=Attendance.CHECK_OUT
+    )
+    return Attendance.objects.filter(
+        date=day,
+        attendance_type=Attendance.CHECK_IN
+    ).exclude(
+        Exists(check_out)
+    ).order_by().values_list('user_id', 'timestamp', 'user__office_id', 'user__timezone')
+
+
+def close_open_check_ins(day, now=None, dry_run=False):
+    """
+    Write a synthetic check-out for every check-in left open on ``day``.
+
+    The check-out is stamped at the office cut-off on that day, in the
+    office's timezone, or at the end of the local day when the check-in
+    itself came after the cut-off. Punches whose closing time is still in
+    the future are left alone. The rows are inserted with one
+    ``bulk_create`` (status 'auto', with the rule used in the notes) and the
+    matching daily summaries are updated with one ``bulk_update``.
+
+    Returns a dict with the number of open check-ins found, closed and
+    skipped.
+    """
+    now = now or timezone.now()
+    report = {'date': day, 'open': 0, 'closed': 0, 'skipped': 0}
+
+    check_outs = []
+    for user_id, check_in, office_id, user_timezone in open_check_ins(day):
+        report['open'] += 1
+        cutoff, tz = office_cutoff(office_id, user_timezone)
+        closes_at = timezone.make_aware(datetime.combine(day, cutoff), tz)
+        rule = f'cut-off {cutoff.strftime("%H:%M")} {tz}'
+        if closes_at <= check_in:
+            closes_at = timezone.make_aware(datetime.combine(day + timedelta(days=1), dt_time.min), tz) - timedelta(seconds=1)
+            rule = f'end of day {tz}'
+        if closes_at > now:
+            report['skipped'] += 1
+            continue
+
+        check_outs.append(Attendance(
+            user_id=user_id,
+            date=day,
+            timestamp=closes_at,
+            attendance_type=Attendance.CHECK_OUT,
+            status='auto',
+            notes=f'Automatically checked out at {rule} (no check-out recorded)',
+        ))
+
+    report['closed'] = len(check_outs)
+    if dry_run or not check_outs:
+        return report
+
+    with transaction.atomic():
+        # A check-out recorded since the scan above wins over the synthetic one
+        Attendance.objects.bulk_create(check_outs, batch_size=1000, ignore_conflicts=True)
+
+        closing = {punch.user_id: punch.timestamp for punch in check_outs}
+        summaries = list(DailyAttendanceSummary.objects.filter(date=day, user_id__in=closing.keys()))
+        for summary in summaries:
+            if summary.last_check_out is None:
+                summary.last_check_out = closing[summary.user_id]
+                summary.refresh_status()
+                summary.updated_at = now
+        DailyAttendanceSummary.objects.bulk_update(
+            summaries, ['last_check_out', 'duration', 'status', 'updated_at'], batch_size=1000
+        )
+        invalidate_dashboard()
+
+    logger.info(f"Auto-closed {report['closed']} open check-ins for {day} ({report['skipped']} not yet due)")
+    return report
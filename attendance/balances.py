@@ -0,0 +1,171 @@
+import operator
+from collections import defaultdict
+from datetime import date
+from functools import reduce
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, Q, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .business_calendar import business_calendar
+from .models import LeaveBalance, LeaveRequest
+
+# Working days per year when ATTENDANCE_LEAVE_ENTITLEMENTS does not say otherwise;
+# types missing from the mapping have no limit
+DEFAULT_ENTITLEMENTS = {
+    'annual': 20,
+    'sick': 10,
+}
+
+# Balances adjusted per UPDATE statement
+APPLY_BATCH_SIZE = 500
+
+
+def entitlement(leave_type):
+    return getattr(settings, 'ATTENDANCE_LEAVE_ENTITLEMENTS', DEFAULT_ENTITLEMENTS).get(leave_type)
+
+
+def contribution(state):
+    """
+    How one request, given as LeaveRequest.balance_state(), counts against
+    the balances: {(user_id, year, leave_type): [used_days, pending_days]}.
+    """
+    if not state:
+        return {}
+    user_id, leave_type, status, start_date, end_date = state
+    if status not in (LeaveRequest.APPROVED, LeaveRequest.PENDING) or not (user_id and start_date and end_date):
+        return {}
+
+    result = {}
+    for year in range(start_date.year, end_date.year + 1):
+        days = business_calendar.count_working_days(max(start_date, date(year, 1, 1)),
+                                                    min(end_date, date(year, 12, 31)))
+        if days:
+            result[(user_id, year, leave_type)] = [days, 0] if status == LeaveRequest.APPROVED else [0, days]
+    return result
+
+
+def _add(deltas, changes, sign):
+    for key, (used, pending) in changes.items():
+        deltas[key][0] += sign * used
+        deltas[key][1] += sign * pending
+
+
+def apply_deltas(deltas, create_missing=True):
+    """
+    Add ``{(user_id, year, leave_type): [used, pending]}`` to the balances.
+
+    Missing rows are created first with one ``bulk_create``; then one
+    UPDATE ... SET used_days = used_days + CASE ... END per
+    APPLY_BATCH_SIZE touched balances adds every delta in place, so
+    concurrent changes to the same balance still add up. Results are
+    clamped at zero: a row created here for a request the ledger never
+    counted has nothing to take the request's old days from.
+    """
+    deltas = {key: value for key, value in deltas.items() if any(value)}
+    if not deltas:
+        return
+
+    keys = list(deltas)
+    with transaction.atomic():
+        if create_missing:
+            LeaveBalance.objects.bulk_create(
+                [
+                    LeaveBalance(user_id=user_id, year=year, leave_type=leave_type,
+                                 entitled_days=entitlement(leave_type))
+                    for user_id, year, leave_type in keys
+                ],
+                ignore_conflicts=True,
+            )
+        for start in range(0, len(keys), APPLY_BATCH_SIZE):
+            matches = {
+                key: Q(user_id=key[0], year=key[1], leave_type=key[2])
+                for key in keys[start:start + APPLY_BATCH_SIZE]
+            }
+            LeaveBalance.objects.filter(reduce(operator.or_, matches.values())).update(
+                used_days=Greatest(F('used_days') + _per_balance(matches, deltas, 0), Value(0)),
+                pending_days=Greatest(F('pending_days') + _per_balance(matches, deltas, 1), Value(0)),
+            )
+
+
+def _per_balance(matches, deltas, index):
+    """CASE expression giving every matched balance its own delta"""
+    return Case(*(When(match, then=Value(deltas[key][index])) for key, match in matches.items()), default=Value(0))
+
+
+def apply_balance_change(old_state, new_state):
+    """Move a request's days from its previous state to its new one"""
+    deltas = defaultdict(lambda: [0, 0])
+    _add(deltas, contribution(old_state), -1)
+    _add(deltas, contribution(new_state), 1)
+    # Deletions only ever subtract, so never recreate rows there (the user
+    # may be going away in the same cascade)
+    apply_deltas(deltas, create_missing=new_state is not None)
+
+
+def apply_bulk_status_change(leave_requests, new_status):
+    """Balance updates for requests whose status changed through QuerySet.update()"""
+    deltas = defaultdict(lambda: [0, 0])
+    for leave in leave_requests:
+        old_state = getattr(leave, '_loaded_balance_state', None) or leave.balance_state()
+        user_id, leave_type, _, start_date, end_date = old_state
+        _add(deltas, contribution(old_state), -1)
+        _add(deltas, contribution((user_id, leave_type, new_status, start_date, end_date)), 1)
+    apply_deltas(deltas)
+
+
+def rebuild_leave_balances(user_ids=None, years=None):
+    """
+    Recompute used/pending days from the LeaveRequest table.
+
+    Entitlements already stored on balance rows are kept; new rows get the
+    configured default. Returns the number of balances with days in use.
+    """
+    requests = LeaveRequest.objects.filter(status__in=[LeaveRequest.APPROVED, LeaveRequest.PENDING])
+    balances = LeaveBalance.objects.all()
+    if user_ids is not None:
+        requests = requests.filter(user_id__in=list(user_ids))
+        balances = balances.filter(user_id__in=list(user_ids))
+    if years:
+        years = sorted(years)
+        requests = requests.filter(start_date__lte=date(years[-1], 12, 31), end_date__gte=date(years[0], 1, 1))
+        balances = balances.filter(year__in=years)
+
+    totals = defaultdict(lambda: [0, 0])
+    rows = requests.order_by().values_list('user_id', 'leave_type', 'status', 'start_date', 'end_date')
+    for state in rows.iterator(chunk_size=2000):
+        _add(totals, contribution(state), 1)
+    if years:
+        totals = {key: value for key, value in totals.items() if key[1] in years}
+
+    with transaction.atomic():
+        existing = {
+            (balance.user_id, balance.year, balance.leave_type): balance
+            for balance in balances.select_for_update()
+        }
+        new_rows = []
+        for key, (used, pending) in totals.items():
+            balance = existing.get(key)
+            if balance is None:
+                user_id, year, leave_type = key
+                new_rows.append(LeaveBalance(
+                    user_id=user_id, year=year, leave_type=leave_type,
+                    entitled_days=entitlement(leave_type), used_days=used, pending_days=pending,
+                ))
+            else:
+                balance.used_days, balance.pending_days = used, pending
+        # Balances without any remaining request keep their entitlement at zero use
+        for key, balance in existing.items():
+            if key not in totals:
+                balance.used_days = balance.pending_days = 0
+
+        LeaveBalance.objects.bulk_update(existing.values(), ['used_days', 'pending_days'], batch_size=1000)
+        LeaveBalance.objects.bulk_create(new_rows, batch_size=1000)
+    return len(totals)
+
+
+def balances_for(user, year=None):
+    """The user's balances for a year, one row per leave type that has one"""
+    return list(LeaveBalance.objects.filter(user=user, year=year or timezone.now().year))
@@ -0,0 +1,168 @@
+import calendar
+import logging
+import threading
+import time
+from array import array
+from datetime import date, timedelta
+from itertools import accumulate
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+
+logger = logging.getLogger(__name__)
+
+try:
+    import numpy
+except ImportError:  # NumPy is optional; the bitmap backend needs nothing extra
+    numpy = None
+
+
+class BusinessCalendar:
+    """
+    Working-day calendar built from the weekday rule and the Holiday table.
+
+    Each year is materialised once per process as a day-of-year bitmap
+    (1 = working day) plus its prefix sums, so counting the working days in
+    any range is two array lookups per calendar year it spans. Saving or
+    deleting a Holiday drops this process's bitmaps at once and bumps a
+    version key in the shared cache; the other processes read that key at
+    most every ATTENDANCE_CALENDAR_CHECK_SECONDS and rebuild when it has
+    moved. A year is also rebuilt once it is ATTENDANCE_CALENDAR_TTL old, so
+    holidays written without signals (bulk updates, raw SQL) or a lost
+    version bump are picked up eventually.
+
+    Settings:
+        ATTENDANCE_WORKING_WEEKDAYS        weekdays that are worked (Monday=0), default Monday-Friday
+        ATTENDANCE_CALENDAR_BACKEND        'bitmap' (default) or 'numpy' for numpy.busday_count
+        ATTENDANCE_CALENDAR_CHECK_SECONDS  how often the version key is read (default 30)
+        ATTENDANCE_CALENDAR_TTL            seconds a year's bitmap is kept (default 3600)
+    """
+
+    VERSION_CACHE_KEY = 'attendance:business_calendar:version'
+
+    def __init__(self):
+        self._years = {}
+        self._version = None
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def working_weekdays(self):
+        return frozenset(getattr(settings, 'ATTENDANCE_WORKING_WEEKDAYS', (0, 1, 2, 3, 4)))
+
+    @property
+    def backend(self):
+        backend = getattr(settings, 'ATTENDANCE_CALENDAR_BACKEND', 'bitmap')
+        if backend == 'numpy' and numpy is None:
+            logger.warning("ATTENDANCE_CALENDAR_BACKEND is 'numpy' but NumPy is not installed; using bitmap")
+            return 'bitmap'
+        return backend
+
+    def invalidate(self):
+        """Drop cached years here and signal other processes to do the same"""
+        with self._lock:
+            self._years.clear()
+            self._checked_at = None
+        try:
+            cache.incr(self.VERSION_CACHE_KEY)
+        except ValueError:
+            cache.set(self.VERSION_CACHE_KEY, 1, None)
+
+    def _load_year(self, year):
+        from .models import Holiday
+
+        first_day = date(year, 1, 1)
+        days_in_year = 366 if calendar.isleap(year) else 365
+        weekdays = self.working_weekdays
+        first_weekday = first_day.weekday()
+
+        bitmap = bytearray(
+            1 if (first_weekday + offset) % 7 in weekdays else 0
+            for offset in range(days_in_year)
+        )
+
+        # Fixed holidays of this year plus recurring ones moved onto this year
+        holidays = set()
+        rows = Holiday.objects.filter(
+            Q(date__range=[first_day, date(year, 12, 31)]) | Q(is_recurring=True)
+        ).values_list('date', 'is_recurring')
+        for holiday_date, is_recurring in rows:
+            if holiday_date.year != year:
+                if not is_recurring or ((holiday_date.month, holiday_date.day) == (2, 29) and days_in_year == 365):
+                    continue
+                holiday_date = holiday_date.replace(year=year)
+            holidays.add(holiday_date)
+            bitmap[(holiday_date - first_day).days] = 0
+
+        prefix = array('H', accumulate(bitmap, initial=0))
+        return bitmap, prefix, sorted(holidays)
+
+    def _year(self, year):
+        now = time.monotonic()
+        check_seconds = getattr(settings, 'ATTENDANCE_CALENDAR_CHECK_SECONDS', 30)
+        with self._lock:
+            stale = self._checked_at is None or now - self._checked_at >= check_seconds
+        if stale:
+            version = cache.get(self.VERSION_CACHE_KEY, 0)
+            with self._lock:
+                if version != self._version:
+                    self._years.clear()
+                    self._version = version
+                self._checked_at = now
+
+        with self._lock:
+            loaded_at, entry = self._years.get(year, (None, None))
+        if entry is None or now - loaded_at >= getattr(settings, 'ATTENDANCE_CALENDAR_TTL', 3600):
+            entry = self._load_year(year)
+            with self._lock:
+                self._years[year] = (now, entry)
+        return entry
+
+    def is_working_day(self, day):
+        bitmap, _, _ = self._year(day.year)
+        return bool(bitmap[day.timetuple().tm_yday - 1])
+
+    def holidays(self, start_date, end_date):
+        """Holiday dates (including recurring ones) between two dates, inclusive"""
+        result = []
+        for year in range(start_date.year, end_date.year + 1):
+            result.extend(d for d in self._year(year)[2] if start_date <= d <= end_date)
+        return result
+
+    def count_working_days(self, start_date, end_date):
+        """Number of working days between two dates, inclusive"""
+        if end_date < start_date:
+            return 0
+        if self.backend == 'numpy':
+            weekmask = [1 if weekday in self.working_weekdays else 0 for weekday in range(7)]
+            return int(numpy.busday_count(
+                start_date, end_date + timedelta(days=1),
+                weekmask=weekmask,
+                holidays=self.holidays(start_date, end_date),
+            ))
+
+        total = 0
+        for year in range(start_date.year, end_date.year + 1):
+            _, prefix, _ = self._year(year)
+            first = start_date.timetuple().tm_yday - 1 if year == start_date.year else 0
+            last = end_date.timetuple().tm_yday if year == end_date.year else len(prefix) - 1
+            total += prefix[last] - prefix[first]
+        return total
+
+    def working_days(self, start_date, end_date):
+        """List the working dates between two dates, inclusive"""
+        result = []
+        current = start_date
+        while current <= end_date:
+            bitmap, _, _ = self._year(current.year)
+            year_end = min(end_date, date(current.year, 12, 31))
+            first = current.timetuple().tm_yday - 1
+            for offset in range((year_end - current).days + 1):
+                if bitmap[first + offset]:
+                    result.append(current + timedelta(days=offset))
+            current = year_end + timedelta(days=1)
+        return result
+
+
+business_calendar = BusinessCalendar()
@@ -0,0 +1,128 @@
+import logging
+
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from . import counters
+from .models import Attendance, DailyAttendanceSummary
+from .summaries import format_duration, record_attendance
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+CHECKED_IN = 'Checked In'
+CHECKED_OUT = 'Checked Out'
+
+
+PUNCH_ACTIONS = (Attendance.CHECK_IN, Attendance.CHECK_OUT)
+
+
+def _refusal(action, recorded_types):
+    """Why ``action`` cannot be recorded given today's punches, or None when it can"""
+    if action in recorded_types:
+        if action == Attendance.CHECK_IN:
+            return 'You have already checked in today.'
+        return 'You have already checked out for today.'
+    if action == Attendance.CHECK_OUT and Attendance.CHECK_IN not in recorded_types:
+        return 'You have not checked in today.'
+    return None
+
+
+def next_action(user, day=None):
+    """The punch the user would make next today (check-in, then check-out), or None when both are done"""
+    day = day or timezone.now().date()
+    recorded_types = set(Attendance.objects.filter(user=user, date=day).values_list('attendance_type', flat=True))
+    return next((action for action in PUNCH_ACTIONS if _refusal(action, recorded_types) is None), None)
+
+
+def clock_in_out(user, action, ip_address=None, location=None, source='web interface', recorded_by=None):
+    """
+    Record the check-in or check-out the user asked for today.
+
+    ``action`` is the punch the form showed (Attendance.CHECK_IN or
+    CHECK_OUT), so submitting it again (double-clicks, parallel tabs, a
+    resent form) finds it already recorded and changes nothing.
+
+    The check and the insert happen in one transaction while holding a
+    row lock on the user, so parallel submits are serialised. On databases
+    without SELECT ... FOR UPDATE the restored unique key on
+    (user, date, attendance_type) still rejects the duplicate insert, and
+    the losing request is reported as already done.
+
+    Returns a dict with the action taken (or None), a message/level pair
+    for the UI and the day's resulting state.
+    """
+    if action not in PUNCH_ACTIONS:
+        raise ValueError(f"Cannot clock '{action}'")
+
+    now = timezone.now()
+    today = now.date()
+
+    with transaction.atomic():
+        # Serialise concurrent punches of the same user
+        list(User.objects.select_for_update().filter(pk=user.pk).values_list('pk', flat=True))
+
+        recorded_types = set(
+            Attendance.objects.filter(user=user, date=today).values_list('attendance_type', flat=True)
+        )
+        refusal = _refusal(action, recorded_types)
+
+        attendance = None
+        if refusal is None:
+            verb = 'Checked in' if action == Attendance.CHECK_IN else 'Checked out'
+            try:
+                attendance = Attendance(
+                    user=user,
+                    date=today,
+                    attendance_type=action,
+                    ip_address=ip_address,
+                    notes=f'{verb} at {now.strftime("%I:%M %p")} via {source}',
+                    location=location,
+                    status='auto',
+                    recorded_by=recorded_by or user
+                )
+                # Counted below; tells the signal handler not to drop the counter
+                attendance._counted = True
+                with transaction.atomic():
+                    attendance.save(force_insert=True)
+            except IntegrityError:
+                logger.info(f"Concurrent {action} for user {user.pk} on {today} rejected by unique key")
+                attendance = None
+                refusal = _refusal(action, {action})
+
+        if attendance and action == Attendance.CHECK_IN:
+            counters.record_check_in(today)
+
+        summary = record_attendance(attendance) if attendance else None
+
+    if attendance is None:
+        return _result(user, today, None, 'warning', refusal, summary)
+
+    if action == Attendance.CHECK_IN:
+        message = 'Successfully checked in!'
+    else:
+        message = 'Successfully checked out!'
+    return _result(user, today, action, 'success', message, summary, attendance)
+
+
+def _result(user, today, action, level, message, summary=None, attendance=None):
+    if summary is None:
+        summary = DailyAttendanceSummary.objects.filter(user=user, date=today).first()
+
+    check_in = summary.first_check_in if summary else None
+    check_out = summary.last_check_out if summary else None
+    checked_in = bool(check_in and not check_out)
+
+    return {
+        'action': action,
+        'level': level,
+        'message': message,
+        'attendance': attendance,
+        'current_status': CHECKED_IN if checked_in else CHECKED_OUT,
+        'can_clock_in': not checked_in and not check_out,
+        'check_in': check_in,
+        'check_out': check_out,
+        'today_hours': format_duration(summary.duration) if summary and summary.duration else None,
+    }
@@ -0,0 +1,126 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Attendance, AttendanceCounter
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+TOTAL_STAFF_KEY = 'total_staff'
+
+
+def _present_key(day):
+    return f'present:{day.isoformat()}'
+
+
+def _timeout():
+    # Long enough to outlive the day it counts; reconcile drops rows older than this
+    return getattr(settings, 'ATTENDANCE_COUNTER_TIMEOUT', 2 * 24 * 60 * 60)
+
+
+def count_present(day):
+    """Distinct staff with a check-in on ``day``, straight from the database"""
+    return Attendance.objects.filter(
+        date=day,
+        attendance_type=Attendance.CHECK_IN
+    ).order_by().values('user').distinct().count()
+
+
+def count_staff():
+    return User.objects.filter(is_staff=True).count()
+
+
+def _read(key, compute):
+    value = AttendanceCounter.objects.filter(name=key).values_list('value', flat=True).first()
+    if value is None:
+        # get_or_create() so a seed never overwrites increments made meanwhile
+        value = AttendanceCounter.objects.get_or_create(name=key, defaults={'value': compute()})[0].value
+    return value
+
+
+def present_today(day=None):
+    """
+    Number of staff checked in on ``day`` (default today), read from its
+    AttendanceCounter row.
+
+    The counter is keyed by the attendance day, the same ``date`` the clock-in
+    service stamps on punches, so it starts again from zero when the day
+    rolls over. A missing counter is seeded from the database. The counters
+    are kept in the database rather than the cache: the database cache
+    backend's incr() is a read followed by a write, which loses increments
+    in a burst of check-ins.
+    """
+    day = day or timezone.now().date()
+    return _read(_present_key(day), lambda: count_present(day))
+
+
+def total_staff():
+    """Number of staff accounts, read from its AttendanceCounter row"""
+    return _read(TOTAL_STAFF_KEY, count_staff)
+
+
+def _incr(key):
+    # Nothing to add to when the counter is not seeded: the next read counts from the database
+    AttendanceCounter.objects.filter(name=key).update(value=F('value') + 1, updated_at=timezone.now())
+
+
+def record_check_in(day):
+    """
+    Count one more staff member present on ``day``.
+
+    Called by the clock-in service for each check-in it records. The
+    increment runs once the punch is committed, so a rolled back check-in is
+    never counted.
+    """
+    transaction.on_commit(lambda: _incr(_present_key(day)))
+
+
+def forget_present(*days):
+    """Drop the counters of ``days`` so they are recounted on the next read"""
+    keys = [_present_key(day) for day in days]
+    transaction.on_commit(lambda: AttendanceCounter.objects.filter(name__in=keys).delete())
+
+
+def forget_present_range(start_date, end_date, today=None):
+    """forget_present() for the days of a range that can still hold a counter"""
+    today = today or timezone.now().date()
+    first = max(start_date, today - timedelta(days=_timeout() // 86400 + 1))
+    last = min(end_date, today)
+    if first <= last:
+        forget_present(*(first + timedelta(days=offset) for offset in range((last - first).days + 1)))
+
+
+def forget_total_staff():
+    transaction.on_commit(lambda: AttendanceCounter.objects.filter(name=TOTAL_STAFF_KEY).delete())
+
+
+def reconcile_counters(day=None):
+    """
+    Reset the counters of ``day`` (default today) from the database and
+    drop the rows of days past ATTENDANCE_COUNTER_TIMEOUT.
+
+    Increments can be lost (a seed racing a check-in, rows written outside
+    the clock-in service without signals), so this is meant to run
+    periodically. Returns {name: (cached, actual)} for every counter.
+    """
+    day = day or timezone.now().date()
+    AttendanceCounter.objects.filter(updated_at__lt=timezone.now() - timedelta(seconds=_timeout())).delete()
+    report = {}
+    for name, key, compute in (
+        ('present_today', _present_key(day), lambda: count_present(day)),
+        ('total_staff', TOTAL_STAFF_KEY, count_staff),
+    ):
+        cached = AttendanceCounter.objects.filter(name=key).values_list('value', flat=True).first()
+        actual = compute()
+        AttendanceCounter.objects.update_or_create(name=key, defaults={'value': actual})
+        if cached is not None and cached != actual:
+            logger.warning(f'Attendance counter {name} for {day} drifted: cached {cached}, actual {actual}')
+        report[name] = (cached, actual)
+    return report
@@ -0,0 +1,136 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, OuterRef, Q, Subquery
+
+from .models import Attendance, Holiday, LeaveRequest
+
+User = get_user_model()
+
+VERSION_CACHE_KEY = 'attendance:admin_dashboard:version'
+
+# Dashboard rows shown per section
+DASHBOARD_LIMIT = 10
+RECENT_LIMIT = 5
+
+
+def _timeout():
+    return getattr(settings, 'ATTENDANCE_DASHBOARD_CACHE_TIMEOUT', 300)
+
+
+def dashboard_version():
+    return cache.get(VERSION_CACHE_KEY, 0)
+
+
+def _bump_version():
+    try:
+        cache.incr(VERSION_CACHE_KEY)
+    except ValueError:
+        cache.set(VERSION_CACHE_KEY, 1, None)
+
+
+def invalidate_dashboard():
+    """
+    Retire every cached dashboard entry by bumping the version key.
+
+    The bump is deferred until the surrounding transaction commits so a
+    concurrent request cannot re-cache the pre-commit data under the new
+    version.
+    """
+    transaction.on_commit(_bump_version)
+
+
+def staff_week_summary(start_of_week, today, limit=DASHBOARD_LIMIT):
+    """
+    Weekly presence and last check-in of active staff in one annotated query.
+
+    ``present_days`` counts the daily summaries with a check-in this week and
+    ``last_check_in`` is the timestamp of the member's latest check-in.
+    """
+    last_check_in = Attendance.objects.filter(
+        user=OuterRef('pk'),
+        attendance_type=Attendance.CHECK_IN
+    ).order_by('-timestamp').values('timestamp')[:1]
+
+    staff = User.objects.filter(
+        is_active=True,
+        is_staff=True
+    ).annotate(
+        present_days=Count(
+            'daily_attendance',
+            filter=Q(
+                daily_attendance__date__range=[start_of_week, today],
+                daily_attendance__first_check_in__isnull=False
+            )
+        ),
+        last_check_in=Subquery(last_check_in),
+    ).only('id', 'first_name', 'last_name', 'email').order_by('pk')[:limit]
+
+    total_days = (today - start_of_week).days + 1
+    return [
+        {
+            'staff': member,
+            'present_days': member.present_days,
+            'total_days': total_days,
+            'last_check_in': member.last_check_in,
+        }
+        for member in staff
+    ]
+
+
+def _build_dashboard(today, start_of_week):
+    pending_requests = list(
+        LeaveRequest.objects.filter(
+            status=LeaveRequest.PENDING
+        ).select_related('user').only(
+            'id', 'user__first_name', 'user__last_name', 'user__email',
+            'leave_type', 'start_date', 'end_date', 'created_at'
+        ).order_by('-created_at')[:DASHBOARD_LIMIT]
+    )
+
+    recent_checkins = list(
+        Attendance.objects.filter(
+            date=today,
+            attendance_type=Attendance.CHECK_IN
+        ).select_related('user').only(
+            'id', 'user__first_name', 'user__last_name', 'timestamp',
+            'user__email', 'attendance_type'
+        ).order_by('-timestamp')[:RECENT_LIMIT]
+    )
+
+    return {
+        'today_attendance_count': Attendance.objects.filter(date=today).count(),
+        'pending_requests': pending_requests,
+        'upcoming_holidays': list(
+            Holiday.objects.filter(date__gte=today).only('id', 'name', 'date').order_by('date')[:RECENT_LIMIT]
+        ),
+        'past_holidays': list(
+            Holiday.objects.filter(date__lt=today).only('id', 'name', 'date').order_by('-date')[:RECENT_LIMIT]
+        ),
+        'staff_attendance': staff_week_summary(start_of_week, today),
+        'recent_checkins': recent_checkins,
+        'total_staff': User.objects.filter(is_active=True, is_staff=True).count(),
+    }
+
+
+def get_admin_dashboard(today):
+    """
+    Aggregates for the admin attendance dashboard, served from the cache.
+
+    Entries are keyed by the dashboard version and the day, so a change to
+    attendance, leave or holidays (see ``attendance.signals``) and the date
+    rolling over both produce a fresh entry. ATTENDANCE_DASHBOARD_CACHE_TIMEOUT
+    (seconds, default 300) caps how long an entry lives regardless.
+    """
+    start_of_week = today - timedelta(days=today.weekday())
+    key = f'attendance:admin_dashboard:v{dashboard_version()}:{today.isoformat()}'
+
+    data = cache.get(key)
+    if data is None:
+        data = _build_dashboard(today, start_of_week)
+        cache.set(key, data, _timeout())
+
+    return dict(data, today=today, start_of_week=start_of_week)
@@ -0,0 +1,144 @@
+import csv
+
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from .models import DailyAttendanceSummary
+
+# Rows fetched per query; each page starts where the previous one ended
+EXPORT_CHUNK_SIZE = 2000
+
+# Spreadsheets run a cell starting with one of these as a formula
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+class Echo:
+    """File-like object whose write() just hands the line back to csv.writer"""
+
+    def write(self, value):
+        return value
+
+
+def _format_timestamp(value):
+    if not value:
+        return ''
+    return timezone.localtime(value).strftime('%Y-%m-%d %H:%M')
+
+
+def _format_hours(duration):
+    if not duration:
+        return ''
+    return f"{duration.total_seconds() / 3600:.2f}"
+
+
+def _cell(value):
+    """Text cells that a spreadsheet would evaluate are quoted with a leading apostrophe"""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def stream_csv(rows, filename):
+    """
+    Wrap an iterable of row tuples in a StreamingHttpResponse.
+
+    Rows are encoded one at a time, so the response never holds more than a
+    single database page in memory and the first byte is sent right away.
+    Text that would start a formula (reason, notes, names) is neutralised.
+    """
+    writer = csv.writer(Echo())
+    response = StreamingHttpResponse(
+        (writer.writerow([_cell(value) for value in row]) for row in rows),
+        content_type='text/csv; charset=utf-8',
+    )
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def daily_attendance_rows(start_date, end_date, users):
+    """
+    Header plus one row per staff member and day with attendance data.
+
+    ``users`` are exported in the order given, a group at a time, with as
+    many staff per query as fit EXPORT_CHUNK_SIZE days of the range. Bounded
+    queries keep memory flat on every backend; ``iterator()`` only streams
+    where the driver has server-side cursors, which pymysql does not.
+    """
+    yield ('Date', 'Staff', 'Email', 'Check In', 'Check Out', 'Hours', 'Status')
+
+    users = list(users)
+    days = (end_date - start_date).days + 1
+    group_size = max(1, EXPORT_CHUNK_SIZE // max(days, 1))
+    for index in range(0, len(users), group_size):
+        group = users[index:index + group_size]
+        position = {user.pk: offset for offset, user in enumerate(group)}
+        summaries = DailyAttendanceSummary.objects.filter(
+            user__in=group,
+            date__range=[start_date, end_date]
+        ).select_related('user').only(
+            'date', 'first_check_in', 'last_check_out', 'duration', 'status',
+            'user__first_name', 'user__last_name', 'user__email'
+        ).order_by()
+
+        for summary in sorted(summaries, key=lambda summary: (position[summary.user_id], summary.date)):
+            yield (
+                summary.date.isoformat(),
+                summary.user.get_full_name(),
+                summary.user.email,
+                _format_timestamp(summary.first_check_in),
+                _format_timestamp(summary.last_check_out),
+                _format_hours(summary.duration),
+                summary.get_status_display(),
+            )
+
+
+def staff_summary_rows(staff_attendance):
+    """Header plus one row per entry of the all-staff attendance summary"""
+    yield ('Staff', 'Email', 'Present Days', 'Total Days', 'Attendance %', 'Total Hours', 'Last Activity')
+
+    for entry in staff_attendance:
+        yield (
+            entry['staff'].get_full_name(),
+            entry['staff'].email,
+            entry['present_days'],
+            entry['total_days'],
+            entry['attendance_percentage'],
+            entry['total_hours'],
+            _format_timestamp(entry['last_activity']),
+        )
+
+
+def leave_request_rows(leave_requests):
+    """
+    Header plus one row per leave request, newest first.
+
+    Read EXPORT_CHUNK_SIZE rows at a time with ``pk < last`` pages, so any
+    ordering of ``leave_requests`` is replaced by descending pk.
+    """
+    yield ('Staff', 'Email', 'Leave Type', 'Start Date', 'End Date', 'Days',
+           'Status', 'Reason', 'Submitted', 'Reviewed By', 'Reviewed At', 'Response Notes')
+
+    leave_requests = leave_requests.select_related('user', 'reviewed_by').order_by('-pk')
+    last_pk = None
+    while True:
+        page = leave_requests if last_pk is None else leave_requests.filter(pk__lt=last_pk)
+        page = list(page[:EXPORT_CHUNK_SIZE])
+        if not page:
+            break
+        last_pk = page[-1].pk
+
+        for leave in page:
+            yield (
+                leave.user.get_full_name(),
+                leave.user.email,
+                leave.get_leave_type_display(),
+                leave.start_date.isoformat(),
+                leave.end_date.isoformat(),
+                leave.duration_days,
+                leave.get_status_display(),
+                leave.reason,
+                _format_timestamp(leave.created_at),
+                leave.reviewed_by.email if leave.reviewed_by else '',
+                _format_timestamp(leave.reviewed_at),
+                leave.response_notes or '',
+            )
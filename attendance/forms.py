@@ -1,6 +1,8 @@
 from django import forms
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
+from core.models import get_timezone_choices
+from .leaves import overlapping_leave
 from .models import LeaveRequest, Holiday, Attendance
 
 class LeaveRequestForm(forms.ModelForm):
@@ -59,15 +61,10 @@ class LeaveRequestForm(forms.ModelForm):
             # Check for overlapping leave requests
             user = getattr(self, 'user', None)
             if user and user.is_authenticated:
-                overlapping = LeaveRequest.objects.filter(
-                    user=user,
-                    status__in=['pending', 'approved'],
-                    start_date__lte=end_date,
-                    end_date__gte=start_date
+                overlapping = overlapping_leave(
+                    user, start_date, end_date,
+                    exclude_pk=self.instance.pk if self.instance else None
                 )
-                
-                if self.instance and self.instance.pk:
-                    overlapping = overlapping.exclude(pk=self.instance.pk)
                     
                 if overlapping.exists():
                     raise forms.ValidationError(
@@ -143,3 +140,32 @@ class HolidayForm(forms.ModelForm):
                 'data-offstyle': 'secondary'
             }),
         }
+
+
+class PunchImportForm(forms.Form):
+    """Upload form for badge reader CSV punch logs"""
+    file = forms.FileField(
+        label=_('CSV file'),
+        help_text=_('Columns: email (or user_id), timestamp, type (check_in/check_out), optional location and notes'),
+        widget=forms.ClearableFileInput(attrs={'class': 'form-control', 'accept': '.csv,text/csv'})
+    )
+    timezone = forms.ChoiceField(
+        label=_('Timezone of the timestamps'),
+        choices=get_timezone_choices,
+        initial='UTC',
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+    source = forms.CharField(
+        label=_('Reader name'),
+        initial='kiosk',
+        max_length=100,
+        widget=forms.TextInput(attrs={'class': 'form-control'})
+    )
+    replace = forms.BooleanField(
+        label=_('Overwrite existing punches for the same day'),
+        required=False
+    )
+    dry_run = forms.BooleanField(
+        label=_('Validate only (do not write)'),
+        required=False
+    )
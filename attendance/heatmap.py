@@ -0,0 +1,177 @@
+from array import array
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+
+from .business_calendar import business_calendar
+from .models import DailyAttendanceSummary, LeaveRequest
+
+try:
+    import numpy
+except ImportError:  # Falls back to the array-backed grid
+    numpy = None
+
+User = get_user_model()
+
+# Cell codes of the heatmap matrix, in legend order
+ABSENT = 0
+PRESENT = 1
+PARTIAL = 2
+LEAVE = 3
+HOLIDAY = 4
+WEEKEND = 5
+FUTURE = 6
+
+CELL_LABELS = ['absent', 'present', 'partial', 'leave', 'holiday', 'weekend', 'future']
+
+SUMMARY_CODES = {
+    DailyAttendanceSummary.PRESENT: PRESENT,
+    DailyAttendanceSummary.CHECKED_IN_ONLY: PARTIAL,
+    DailyAttendanceSummary.CHECKED_OUT_ONLY: PARTIAL,
+    DailyAttendanceSummary.INVALID_TIMES: PARTIAL,
+    DailyAttendanceSummary.ABSENT: ABSENT,
+}
+
+
+class _ArrayGrid:
+    """Row-major uint8 grid on top of ``array('B')`` for when NumPy is missing"""
+
+    def __init__(self, rows, cols):
+        self.rows = rows
+        self.cols = cols
+        self.data = array('B', bytes(rows * cols))
+
+    def scatter(self, row_idx, col_idx, values):
+        data, cols = self.data, self.cols
+        for row, col, value in zip(row_idx, col_idx, values):
+            data[row * cols + col] = value
+
+    def replace_in_row(self, row, start, stop, old, new):
+        data = self.data
+        base = row * self.cols
+        for index in range(base + start, base + stop):
+            if data[index] == old:
+                data[index] = new
+
+    def replace_in_columns(self, columns, old, new):
+        data, cols = self.data, self.cols
+        for row in range(self.rows):
+            base = row * cols
+            for col in columns:
+                if data[base + col] == old:
+                    data[base + col] = new
+
+    def tolist(self):
+        return [self.data[row * self.cols:(row + 1) * self.cols].tolist() for row in range(self.rows)]
+
+
+class _NumpyGrid:
+    """The same grid as a dense ``numpy.uint8`` matrix with vectorised updates"""
+
+    def __init__(self, rows, cols):
+        self.data = numpy.zeros((rows, cols), dtype=numpy.uint8)
+
+    def scatter(self, row_idx, col_idx, values):
+        self.data[numpy.asarray(row_idx, dtype=numpy.intp),
+                  numpy.asarray(col_idx, dtype=numpy.intp)] = numpy.asarray(values, dtype=numpy.uint8)
+
+    def replace_in_row(self, row, start, stop, old, new):
+        segment = self.data[row, start:stop]
+        segment[segment == old] = new
+
+    def replace_in_columns(self, columns, old, new):
+        if not columns:
+            return
+        block = self.data[:, columns]
+        block[block == old] = new
+        self.data[:, columns] = block
+
+    def tolist(self):
+        return self.data.tolist()
+
+
+def _grid(rows, cols):
+    if numpy is not None and getattr(settings, 'ATTENDANCE_HEATMAP_BACKEND', 'numpy') == 'numpy':
+        return _NumpyGrid(rows, cols)
+    return _ArrayGrid(rows, cols)
+
+
+def staff_for_heatmap(office_id=None):
+    staff = User.objects.filter(is_staff=True, is_active=True)
+    if office_id:
+        staff = staff.filter(office_id=office_id)
+    return list(staff.only('id', 'first_name', 'last_name', 'email').order_by('first_name', 'last_name', 'id'))
+
+
+def build_heatmap(start_date, end_date, staff, today=None):
+    """
+    Staff x day attendance matrix for ``start_date``..``end_date`` inclusive.
+
+    Cell (i, j) holds the code for ``staff[i]`` on ``start_date + j`` days.
+    The daily summaries of the whole range are read in one query and
+    scattered into the grid. Holidays and weekends then replace the absent
+    cells of their columns, approved leave replaces the remaining absent
+    cells inside each leave range (one slice per request) and days after
+    ``today`` become future. Attendance recorded on a leave day or holiday
+    still shows.
+    """
+    num_days = (end_date - start_date).days + 1
+    grid = _grid(len(staff), num_days)
+    row_of = {member.pk: row for row, member in enumerate(staff)}
+
+    rows = DailyAttendanceSummary.objects.filter(
+        user_id__in=row_of.keys(),
+        date__range=[start_date, end_date]
+    ).order_by().values_list('user_id', 'date', 'status')
+
+    row_idx, col_idx, values = [], [], []
+    for user_id, day, status in rows.iterator(chunk_size=5000):
+        row_idx.append(row_of[user_id])
+        col_idx.append((day - start_date).days)
+        values.append(SUMMARY_CODES.get(status, ABSENT))
+    grid.scatter(row_idx, col_idx, values)
+
+    holiday_cols = [(day - start_date).days for day in business_calendar.holidays(start_date, end_date)]
+    working = set(business_calendar.working_days(start_date, end_date))
+    holiday_set = set(holiday_cols)
+    weekend_cols = [
+        offset for offset in range(num_days)
+        if offset not in holiday_set and start_date + timedelta(days=offset) not in working
+    ]
+    grid.replace_in_columns(holiday_cols, ABSENT, HOLIDAY)
+    grid.replace_in_columns(weekend_cols, ABSENT, WEEKEND)
+
+    leaves = LeaveRequest.objects.filter(
+        user_id__in=row_of.keys(),
+        status=LeaveRequest.APPROVED,
+        start_date__lte=end_date,
+        end_date__gte=start_date,
+    ).order_by().values_list('user_id', 'start_date', 'end_date')
+    for user_id, leave_start, leave_end in leaves:
+        first = max((leave_start - start_date).days, 0)
+        last = min((leave_end - start_date).days, num_days - 1)
+        grid.replace_in_row(row_of[user_id], first, last + 1, ABSENT, LEAVE)
+
+    if today is not None and today < end_date:
+        first_future = max((today - start_date).days + 1, 0)
+        grid.replace_in_columns(list(range(first_future, num_days)), ABSENT, FUTURE)
+
+    return grid
+
+
+def heatmap_payload(start_date, end_date, staff, today=None):
+    """JSON-ready heatmap: axis labels, the cell legend and the matrix as lists"""
+    grid = build_heatmap(start_date, end_date, staff, today=today)
+    num_days = (end_date - start_date).days + 1
+    return {
+        'start_date': start_date.isoformat(),
+        'end_date': end_date.isoformat(),
+        'days': [(start_date + timedelta(days=offset)).isoformat() for offset in range(num_days)],
+        'staff': [
+            {'id': member.pk, 'name': member.get_full_name() or member.email}
+            for member in staff
+        ],
+        'legend': CELL_LABELS,
+        'matrix': grid.tolist(),
+    }
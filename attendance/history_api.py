@@ -0,0 +1,101 @@
+from datetime import datetime, timedelta, timezone
+
+from django.db.models import Q
+
+from .models import DailyAttendanceSummary
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+DEFAULT_PAGE_SIZE = 31
+MAX_PAGE_SIZE = 100
+
+
+def parse_cursor(value):
+    """Date cursor from a YYYY-MM-DD query parameter, None when absent"""
+    if not value:
+        return None
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def parse_sync_cursor(value):
+    """
+    (updated_at, pk) from a sync cursor '<microseconds since epoch>-<pk>',
+    None when absent; '0' starts a sync from the beginning.
+    """
+    if not value:
+        return None
+    micros, _, pk = value.partition('-')
+    micros, pk = int(micros), int(pk or 0)
+    if micros < 0 or pk < 0:
+        raise ValueError(f'Invalid sync cursor "{value}"')
+    return EPOCH + timedelta(microseconds=micros), pk
+
+
+def format_sync_cursor(updated_at, pk):
+    return f'{(updated_at - EPOCH) // timedelta(microseconds=1)}-{pk}'
+
+
+def parse_limit(value):
+    if not value:
+        return DEFAULT_PAGE_SIZE
+    return max(1, min(int(value), MAX_PAGE_SIZE))
+
+
+def _serialize(summary):
+    return {
+        'date': summary.date.isoformat(),
+        'check_in': summary.first_check_in.isoformat() if summary.first_check_in else None,
+        'check_out': summary.last_check_out.isoformat() if summary.last_check_out else None,
+        'duration_seconds': int(summary.duration.total_seconds()) if summary.duration else None,
+        'status': summary.status,
+        'updated_at': summary.updated_at.isoformat(),
+    }
+
+
+def history_page(user, before=None, after=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    One keyset page of a user's per-day attendance.
+
+    With ``before`` (a date, or no cursor) days are returned newest first,
+    strictly older than the cursor, which is how the history pages scroll
+    back. With ``after`` (a sync cursor, see parse_sync_cursor) they are
+    returned in the order they were last written, strictly after the
+    cursor, which is how a client syncs: a day that got its check-out, or
+    an older day backfilled, imported or auto-closed later, comes back with
+    its new values. Each page is a single range scan on the (user, date)
+    unique index or on summary_user_updated_idx.
+
+    Returns (payload, last_modified).
+    """
+    summaries = DailyAttendanceSummary.objects.filter(user=user)
+    if after is not None:
+        updated_at, pk = after
+        summaries = summaries.filter(
+            Q(updated_at__gt=updated_at) | Q(updated_at=updated_at, pk__gt=pk)
+        ).order_by('updated_at', 'pk')
+        direction = 'after'
+    else:
+        if before is not None:
+            summaries = summaries.filter(date__lt=before)
+        summaries = summaries.order_by('-date')
+        direction = 'before'
+
+    rows = list(summaries[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    if direction == 'after':
+        # Syncing clients resume from the last change they got, even when caught up
+        next_cursor = format_sync_cursor(rows[-1].updated_at, rows[-1].pk) if rows else format_sync_cursor(*after)
+    else:
+        next_cursor = rows[-1].date.isoformat() if has_more else None
+
+    payload = {
+        'user_id': user.pk,
+        'direction': direction,
+        'days': [_serialize(summary) for summary in rows],
+        'has_more': has_more,
+        'next_cursor': next_cursor,
+    }
+    last_modified = max((summary.updated_at for summary in rows), default=None)
+    return payload, last_modified
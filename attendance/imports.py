@@ -0,0 +1,238 @@
+import csv
+import logging
+import time
+from datetime import datetime
+
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .counters import forget_present_range
+from .models import Attendance
+from .summaries import rebuild_daily_summaries
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+IMPORT_CHUNK_SIZE = 5000
+
+# Punch types as badge readers write them
+PUNCH_TYPES = {
+    'check_in': Attendance.CHECK_IN,
+    'checkin': Attendance.CHECK_IN,
+    'in': Attendance.CHECK_IN,
+    'check_out': Attendance.CHECK_OUT,
+    'checkout': Attendance.CHECK_OUT,
+    'out': Attendance.CHECK_OUT,
+}
+
+# Keep at most this many row errors in the report
+MAX_REPORTED_ERRORS = 50
+
+
+class PunchImportResult:
+    """Counters and timing of one import run"""
+
+    def __init__(self):
+        self.rows_read = 0
+        self.rows_valid = 0
+        self.duplicates = 0
+        self.written = 0
+        self.replaced = 0
+        self.kept = 0
+        self.summaries = 0
+        self.errors = []
+        self.error_count = 0
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    def add_error(self, line_number, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f'Line {line_number}: {message}')
+
+    @property
+    def rows_per_second(self):
+        return self.rows_read / self.elapsed if self.elapsed else 0
+
+    def summary(self):
+        return (
+            f'Read {self.rows_read} rows in {self.elapsed:.2f}s ({self.rows_per_second:,.0f} rows/s): '
+            f'{self.written} punches written, {self.replaced} replaced, {self.kept} already recorded and kept, '
+            f'{self.duplicates} duplicates merged, '
+            f'{self.error_count} rejected, {self.summaries} daily summaries rebuilt.'
+        )
+
+
+def _user_lookup():
+    """One query mapping lower-cased emails and string ids to user ids"""
+    lookup = {}
+    for user_id, email in User.objects.filter(is_active=True).values_list('id', 'email').iterator(chunk_size=10000):
+        lookup[str(user_id)] = user_id
+        if email:
+            lookup[email.strip().lower()] = user_id
+    return lookup
+
+
+def _parse_timestamp(value, tz):
+    value = value.strip()
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        parsed = datetime.strptime(value, '%Y-%m-%d %H:%M')
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, tz)
+    return parsed
+
+
+def _keep(existing, candidate):
+    """Within one file keep the earliest check-in and the latest check-out"""
+    if candidate.attendance_type == Attendance.CHECK_IN:
+        return candidate if candidate.timestamp < existing.timestamp else existing
+    return candidate if candidate.timestamp > existing.timestamp else existing
+
+
+def _existing_keys(punches):
+    """The (user, date, type) keys of ``punches`` that are already stored"""
+    keys = {(punch.user_id, punch.date, punch.attendance_type) for punch in punches}
+    dates = [punch.date for punch in punches]
+    stored = Attendance.objects.filter(
+        user_id__in={punch.user_id for punch in punches},
+        date__range=[min(dates), max(dates)],
+        attendance_type__in={punch.attendance_type for punch in punches},
+    ).values_list('user_id', 'date', 'attendance_type')
+    return keys.intersection(stored)
+
+
+def _write_chunk(punches, replace, dry_run=False):
+    """
+    Insert one chunk of punches; returns (new rows, existing rows).
+
+    Existing punches are looked up first, since bulk_create() reports every
+    object it was given, including the ones a conflict skipped or updated.
+    """
+    if not punches:
+        return 0, 0
+    existing = len(_existing_keys(punches))
+    if dry_run:
+        return len(punches) - existing, existing
+
+    if replace:
+        options = {
+            'update_conflicts': True,
+            'update_fields': ['timestamp', 'status', 'notes', 'location', 'recorded_by'],
+        }
+        if connection.features.supports_update_conflicts_with_target:
+            options['unique_fields'] = ['user', 'date', 'attendance_type']
+    else:
+        options = {'ignore_conflicts': True}
+    Attendance.objects.bulk_create(punches, batch_size=IMPORT_CHUNK_SIZE, **options)
+    return len(punches) - existing, existing
+
+
+def import_punches(lines, recorded_by=None, source='kiosk', tz=None, replace=False,
+                   chunk_size=IMPORT_CHUNK_SIZE, dry_run=False):
+    """
+    Stream-parse a badge reader CSV and bulk insert its punches.
+
+    ``lines`` is any iterable of text lines (an open file, a wrapped upload),
+    so the file is never held in memory. The header must name a user column
+    (``email``, ``user_id`` or ``user``), ``timestamp`` and ``type``
+    (check_in/check_out, in/out); ``location`` and ``notes`` are optional.
+    Naive timestamps are read in ``tz`` (the current timezone by default).
+
+    Users are resolved against one preloaded dict. Rows are inserted with
+    ``bulk_create`` in chunks of ``chunk_size``. A punch that already exists
+    for (user, date, attendance_type) is kept, or overwritten when
+    ``replace`` is set; the result counts new, replaced and kept punches
+    separately. The daily summaries of the imported range are
+    rebuilt at the end. Returns a PunchImportResult.
+    """
+    tz = tz or timezone.get_current_timezone()
+    result = PunchImportResult()
+    users = _user_lookup()
+    recorded_by_id = recorded_by.pk if recorded_by else None
+
+    reader = csv.DictReader(lines)
+    if reader.fieldnames:
+        reader.fieldnames = [name.strip().lower() for name in reader.fieldnames]
+    fields = set(reader.fieldnames or ())
+    user_field = next((name for name in ('email', 'user_id', 'user') if name in fields), None)
+    type_field = 'type' if 'type' in fields else 'attendance_type'
+    if not user_field or 'timestamp' not in fields or type_field not in fields:
+        raise ValueError('CSV header must include a user column (email, user_id or user), timestamp and type')
+
+    pending = {}
+    touched_users = set()
+    first_date = last_date = None
+
+    def flush():
+        nonlocal pending
+        with transaction.atomic():
+            written, existing = _write_chunk(list(pending.values()), replace, dry_run)
+        result.written += written
+        if replace:
+            result.replaced += existing
+        else:
+            result.kept += existing
+        pending = {}
+
+    for line_number, row in enumerate(reader, start=2):
+        result.rows_read += 1
+
+        user_id = users.get((row.get(user_field) or '').strip().lower())
+        if user_id is None:
+            result.add_error(line_number, f'unknown user "{row.get(user_field)}"')
+            continue
+        attendance_type = PUNCH_TYPES.get((row.get(type_field) or '').strip().lower())
+        if attendance_type is None:
+            result.add_error(line_number, f'unknown punch type "{row.get(type_field)}"')
+            continue
+        try:
+            timestamp = _parse_timestamp(row.get('timestamp') or '', tz)
+        except (ValueError, TypeError):
+            result.add_error(line_number, f'invalid timestamp "{row.get("timestamp")}"')
+            continue
+
+        day = timezone.localtime(timestamp, tz).date()
+        punch = Attendance(
+            user_id=user_id,
+            date=day,
+            timestamp=timestamp,
+            attendance_type=attendance_type,
+            status='auto',
+            location=(row.get('location') or '').strip() or None,
+            notes=(row.get('notes') or '').strip() or f'Imported from {source}',
+            recorded_by_id=recorded_by_id,
+        )
+        result.rows_valid += 1
+
+        key = (user_id, day, attendance_type)
+        if key in pending:
+            result.duplicates += 1
+            pending[key] = _keep(pending[key], punch)
+        else:
+            pending[key] = punch
+
+        touched_users.add(user_id)
+        first_date = day if first_date is None or day < first_date else first_date
+        last_date = day if last_date is None or day > last_date else last_date
+
+        if len(pending) >= chunk_size:
+            flush()
+
+    flush()
+
+    if touched_users and not dry_run:
+        result.summaries = rebuild_daily_summaries(
+            start_date=first_date,
+            end_date=last_date,
+            user_ids=touched_users,
+        )
+        # bulk_create sends no signals, so the live counters are recounted here
+        forget_present_range(first_date, last_date)
+
+    result.elapsed = time.perf_counter() - result.started
+    logger.info(f'Attendance import from {source}: {result.summary()}')
+    return result
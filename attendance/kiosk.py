@@ -0,0 +1,112 @@
+import base64
+import io
+import time
+
+import qrcode
+import qrcode.image.svg
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.utils.crypto import constant_time_compare, salted_hmac
+
+SALT = 'attendance.kiosk'
+CONFIRMATION_SALT = 'attendance.kiosk.confirmation'
+
+
+class InvalidKioskToken(Exception):
+    """Raised for a kiosk token that is malformed, forged or expired"""
+
+
+def _period():
+    return getattr(settings, 'ATTENDANCE_KIOSK_TOKEN_SECONDS', 30)
+
+
+def current_window(now=None):
+    return int((time.time() if now is None else now) // _period())
+
+
+def seconds_left(now=None):
+    now = time.time() if now is None else now
+    return _period() - now % _period()
+
+
+def _signature(office_id, window):
+    digest = salted_hmac(SALT, f'{office_id}.{window}', algorithm='sha256').digest()
+    return base64.urlsafe_b64encode(digest[:16]).rstrip(b'=').decode('ascii')
+
+
+def make_token(office_id, window=None):
+    """'<office id>.<window>.<signature>' for the current (or given) time window"""
+    window = current_window() if window is None else window
+    return f'{office_id}.{window}.{_signature(office_id, window)}'
+
+
+def verify_token(token, now=None):
+    """
+    Return the office id a kiosk token was issued for.
+
+    Needs no database or cache: the signature is recomputed from
+    SECRET_KEY and the window checked against the clock. Tokens of the
+    current window and of ATTENDANCE_KIOSK_GRACE_WINDOWS before it pass.
+    Raises InvalidKioskToken otherwise.
+
+    Settings:
+        ATTENDANCE_KIOSK_TOKEN_SECONDS  how often the QR code rotates (default 30)
+        ATTENDANCE_KIOSK_GRACE_WINDOWS  earlier windows still accepted, for slow scans (default 1)
+    """
+    try:
+        office_id, window, signature = token.split('.')
+        office_id, window = int(office_id), int(window)
+    except (AttributeError, ValueError):
+        raise InvalidKioskToken('Malformed kiosk code.')
+
+    if not constant_time_compare(signature, _signature(office_id, window)):
+        raise InvalidKioskToken('This kiosk code is not valid.')
+
+    age = current_window(now) - window
+    if age < 0 or age > getattr(settings, 'ATTENDANCE_KIOSK_GRACE_WINDOWS', 1):
+        raise InvalidKioskToken('This kiosk code has expired. Scan the code on the screen again.')
+    return office_id
+
+
+def _confirmation_seconds():
+    return getattr(settings, 'ATTENDANCE_KIOSK_CONFIRMATION_SECONDS', 300)
+
+
+def make_confirmation(office_id):
+    """
+    Signed proof that a valid code of the office was just scanned. It rides
+    along through the login redirect and the confirmation page, so a slow
+    login or a pause before pressing the button does not outlast the
+    rotating code.
+    """
+    return signing.dumps(office_id, salt=CONFIRMATION_SALT)
+
+
+def verify_confirmation(value):
+    """
+    Return the office id of a confirmation from make_confirmation().
+    Raises InvalidKioskToken when it is forged or older than
+    ATTENDANCE_KIOSK_CONFIRMATION_SECONDS (default 300).
+    """
+    try:
+        return signing.loads(value, salt=CONFIRMATION_SALT, max_age=_confirmation_seconds())
+    except signing.SignatureExpired:
+        raise InvalidKioskToken('This scan has expired. Scan the code on the screen again.')
+    except signing.BadSignature:
+        raise InvalidKioskToken('This kiosk code is not valid.')
+
+
+def qr_svg(url, office_id, window):
+    """SVG of the QR code for ``url``; cached for the window so every kiosk of an office shares it"""
+    key = f'attendance:kiosk:qr:{office_id}:{window}'
+    svg = cache.get(key)
+    if svg is None:
+        image = qrcode.make(url, image_factory=qrcode.image.svg.SvgPathImage, box_size=12, border=2)
+        output = io.BytesIO()
+        image.save(output)
+        svg = output.getvalue().decode('utf-8')
+        # Drop the XML declaration so the markup can be inlined in a page
+        svg = svg[svg.index('<svg'):]
+        cache.set(key, svg, _period() * 2)
+    return svg
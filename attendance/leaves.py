@@ -0,0 +1,188 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .balances import apply_bulk_status_change
+from .business_calendar import business_calendar
+from .dashboard import invalidate_dashboard
+from .models import Attendance, LeaveRequest
+from .summaries import mark_absent_pairs
+
+User = get_user_model()
+
+
+def materialize_leave_absences(leave_requests):
+    """
+    Write the ABSENT attendance rows for a batch of approved leave requests.
+
+    Existing absences inside the leave ranges are removed with one DELETE and
+    the working days of every request are inserted with one ``bulk_create``,
+    all in a single transaction. Returns the number of absences written.
+    """
+    leave_requests = [leave for leave in leave_requests if leave.status == LeaveRequest.APPROVED]
+    if not leave_requests:
+        return 0
+
+    # Later requests win when two approved ranges of one user overlap
+    absences = {}
+    for leave in leave_requests:
+        notes = f'On approved {leave.get_leave_type_display()}: {leave.reason}'
+        for day in business_calendar.working_days(leave.start_date, leave.end_date):
+            absences[(leave.user_id, day)] = Attendance(
+                user_id=leave.user_id,
+                date=day,
+                attendance_type=Attendance.ABSENT,
+                status='manual',
+                notes=notes,
+                recorded_by_id=leave.reviewed_by_id,
+            )
+
+    ranges = Q()
+    for leave in leave_requests:
+        ranges |= Q(user_id=leave.user_id, date__range=[leave.start_date, leave.end_date])
+
+    with transaction.atomic():
+        Attendance.objects.filter(ranges, attendance_type=Attendance.ABSENT).delete()
+        Attendance.objects.bulk_create(absences.values(), batch_size=1000)
+        mark_absent_pairs(absences.keys())
+        # bulk_create sends no post_save
+        invalidate_dashboard()
+    return len(absences)
+
+
+def review_leave_requests(leave_requests, status, reviewer, response_notes=None):
+    """
+    Approve or reject every pending request in ``leave_requests`` at once.
+
+    Runs a constant number of queries however many requests are selected:
+    one locked read, one UPDATE of the requests, the balance insert and UPDATE
+    (see apply_deltas) and, for approvals, the set-based absence write.
+    Returns the number of requests that changed.
+    """
+    if status not in (LeaveRequest.APPROVED, LeaveRequest.REJECTED):
+        raise ValueError(f"Cannot bulk review leave requests to status '{status}'")
+
+    reviewed_at = timezone.now()
+    changes = {'status': status, 'reviewed_by': reviewer, 'reviewed_at': reviewed_at}
+    if response_notes is not None:
+        changes['response_notes'] = response_notes
+
+    with transaction.atomic():
+        # Locked so a concurrent review of the same requests waits, then finds them no longer pending
+        pending = list(LeaveRequest.objects.select_for_update().filter(
+            pk__in=leave_requests.values('pk'), status=LeaveRequest.PENDING,
+        ))
+        if not pending:
+            return 0
+
+        LeaveRequest.objects.filter(pk__in=[leave.pk for leave in pending]).update(updated_at=reviewed_at, **changes)
+        apply_bulk_status_change(pending, status)
+        # update() sends no post_save
+        invalidate_dashboard()
+        for leave in pending:
+            for field, value in changes.items():
+                setattr(leave, field, value)
+            leave._loaded_status = status
+            leave._loaded_balance_state = leave.balance_state()
+        if status == LeaveRequest.APPROVED:
+            materialize_leave_absences(pending)
+    return len(pending)
+
+
+def overlapping_leave(user, start_date, end_date, exclude_pk=None,
+                      statuses=(LeaveRequest.PENDING, LeaveRequest.APPROVED)):
+    """The user's own pending/approved requests intersecting [start_date, end_date]"""
+    overlapping = LeaveRequest.objects.filter(
+        user=user,
+        status__in=statuses,
+        start_date__lte=end_date,
+        end_date__gte=start_date
+    )
+    if exclude_pk:
+        overlapping = overlapping.exclude(pk=exclude_pk)
+    return overlapping
+
+
+def away_by_day(start_date, end_date, office_id=None, exclude_user_id=None,
+                statuses=(LeaveRequest.APPROVED,)):
+    """
+    Who is away on each working day of [start_date, end_date].
+
+    One range query on the (status, start_date, end_date) index fetches
+    every request intersecting the window; the matches are then spread
+    over the working days of the window. Returns an ordered dict of
+    day -> list of {'user_id', 'name', 'status', 'leave_type'}.
+    """
+    leaves = LeaveRequest.objects.filter(
+        status__in=statuses,
+        start_date__lte=end_date,
+        end_date__gte=start_date
+    )
+    if office_id is not None:
+        leaves = leaves.filter(user__office_id=office_id)
+    if exclude_user_id is not None:
+        leaves = leaves.exclude(user_id=exclude_user_id)
+    leaves = leaves.order_by().values_list(
+        'user_id', 'user__first_name', 'user__last_name', 'user__email',
+        'status', 'leave_type', 'start_date', 'end_date'
+    )
+
+    days = business_calendar.working_days(start_date, end_date)
+    away = {day: [] for day in days}
+    for user_id, first_name, last_name, email, status, leave_type, leave_start, leave_end in leaves:
+        entry = {
+            'user_id': user_id,
+            'name': f'{first_name} {last_name}'.strip() or email,
+            'status': status,
+            'leave_type': leave_type,
+        }
+        for day in days:
+            if leave_start <= day <= leave_end:
+                away[day].append(entry)
+    return away
+
+
+def staffing_conflicts(user, start_date, end_date, exclude_pk=None):
+    """
+    Staffing check for a leave of ``user`` over [start_date, end_date].
+
+    Counts how many colleagues from the same office are already away
+    (approved, or pending too so reviewers see what is queued) on each
+    working day and flags the days on which adding this leave would take
+    the office past ATTENDANCE_MAX_OFFICE_AWAY_RATIO of its active staff
+    (default 0.3). Staff without an office are only checked for their own
+    overlaps.
+    """
+    result = {
+        'overlapping': list(overlapping_leave(user, start_date, end_date, exclude_pk=exclude_pk)),
+        'office': None,
+        'office_size': 0,
+        'max_away': None,
+        'days': [],
+        'conflict_days': [],
+    }
+    office_id = getattr(user, 'office_id', None)
+    if not office_id:
+        return result
+
+    office_size = User.objects.filter(office_id=office_id, is_active=True, is_staff=True).count()
+    ratio = getattr(settings, 'ATTENDANCE_MAX_OFFICE_AWAY_RATIO', 0.3)
+    max_away = max(int(office_size * ratio), 1)
+
+    away = away_by_day(
+        start_date, end_date,
+        office_id=office_id,
+        exclude_user_id=user.pk,
+        statuses=(LeaveRequest.APPROVED, LeaveRequest.PENDING),
+    )
+    for day, people in away.items():
+        approved = sum(1 for person in people if person['status'] == LeaveRequest.APPROVED)
+        row = {'date': day, 'people': people, 'approved': approved, 'pending': len(people) - approved}
+        result['days'].append(row)
+        if approved + 1 > max_away:
+            result['conflict_days'].append(row)
+
+    result.update(office=user.office, office_size=office_size, max_away=max_away)
+    return result
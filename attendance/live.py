@@ -0,0 +1,163 @@
+import asyncio
+import json
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Max
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import Attendance, LeaveRequest
+
+# Rows of each table sent per poll
+EVENT_BATCH_LIMIT = 100
+
+
+def parse_cursor(value):
+    """'<attendance id>-<leave request id>' as sent in the SSE id field, or None"""
+    try:
+        attendance_id, leave_id = (int(part) for part in (value or '').split('-'))
+    except ValueError:
+        return None
+    if attendance_id < 0 or leave_id < 0:
+        return None
+    return attendance_id, leave_id
+
+
+def format_cursor(cursor):
+    return f'{cursor[0]}-{cursor[1]}'
+
+
+def current_cursor():
+    """Cursor at the newest rows, so a stream started from it only sees later ones"""
+    return (
+        Attendance.objects.aggregate(last=Max('pk'))['last'] or 0,
+        LeaveRequest.objects.aggregate(last=Max('pk'))['last'] or 0,
+    )
+
+
+def _name(user):
+    return user.get_full_name() or user.email
+
+
+def attendance_event(punch):
+    return {
+        'id': punch.pk,
+        'user_id': punch.user_id,
+        'name': _name(punch.user),
+        'email': punch.user.email,
+        'type': punch.attendance_type,
+        'type_display': punch.get_attendance_type_display(),
+        'date': punch.date,
+        'timestamp': punch.timestamp,
+        'time': timezone.localtime(punch.timestamp).strftime('%H:%M'),
+        'history_url': reverse('attendance:staff_attendance_history', kwargs={'user_id': punch.user_id}),
+    }
+
+
+def leave_event(leave):
+    return {
+        'id': leave.pk,
+        'user_id': leave.user_id,
+        'name': _name(leave.user),
+        'email': leave.user.email,
+        'leave_type': leave.leave_type,
+        'leave_type_display': leave.get_leave_type_display(),
+        'start_date': leave.start_date,
+        'end_date': leave.end_date,
+        'duration_days': leave.duration_days,
+        'status': leave.status,
+        'status_display': leave.get_status_display(),
+        'reason': leave.reason or '',
+        'created_at': leave.created_at,
+        'url': reverse('attendance:view_leave_request', args=[leave.pk]),
+        'manage_url': reverse('attendance:manage_leave', args=[leave.pk]),
+    }
+
+
+def events_since(cursor, limit=EVENT_BATCH_LIMIT):
+    """
+    New Attendance and LeaveRequest rows after ``cursor``.
+
+    Both tables are read with a primary key range (``pk > last id``), so a
+    poll with nothing new costs two index lookups. Returns the list of
+    (event name, payload, cursor after the event) and the new cursor; each
+    event carries its own cursor so a reconnect resumes right after the
+    last event the browser received.
+    """
+    attendance_id, leave_id = cursor
+    events = []
+
+    punches = Attendance.objects.filter(pk__gt=attendance_id).select_related('user').only(
+        'id', 'user__first_name', 'user__last_name', 'user__email',
+        'attendance_type', 'date', 'timestamp'
+    ).order_by('pk')[:limit]
+    for punch in punches:
+        attendance_id = punch.pk
+        events.append(('attendance', attendance_event(punch), (attendance_id, leave_id)))
+
+    leaves = LeaveRequest.objects.filter(pk__gt=leave_id).select_related('user').only(
+        'id', 'user__first_name', 'user__last_name', 'user__email',
+        'leave_type', 'start_date', 'end_date', 'status', 'reason', 'created_at'
+    ).order_by('pk')[:limit]
+    for leave in leaves:
+        leave_id = leave.pk
+        events.append(('leave_request', leave_event(leave), (attendance_id, leave_id)))
+
+    return events, (attendance_id, leave_id)
+
+
+def format_event(name, data, cursor):
+    payload = json.dumps(data, cls=DjangoJSONEncoder, separators=(',', ':'))
+    return f'id: {format_cursor(cursor)}\nevent: {name}\ndata: {payload}\n\n'
+
+
+def poll_once(cursor):
+    """
+    WSGI fallback: the events available now, then the response ends.
+
+    A long-lived response would hold a sync worker for its whole life, so
+    under WSGI the browser's EventSource reconnects after the ``retry``
+    delay with Last-Event-ID set, which turns the stream into cheap polling.
+    """
+    yield f'retry: {getattr(settings, "ATTENDANCE_LIVE_POLL_RETRY_MS", 10000)}\n\n'
+    events, _ = events_since(cursor)
+    for name, data, event_cursor in events:
+        yield format_event(name, data, event_cursor)
+
+
+async def stream(cursor):
+    """
+    ASGI stream: poll for new rows every few seconds for a bounded time.
+
+    Database reads run in a thread through ``sync_to_async``; waiting costs
+    the event loop nothing. Quiet streams get a comment line now and then so
+    proxies keep the connection open. When the stream ends the browser
+    reconnects from the last event id.
+
+    Settings:
+        ATTENDANCE_LIVE_POLL_SECONDS    seconds between looks for new rows (default 2)
+        ATTENDANCE_LIVE_STREAM_SECONDS  lifetime of one stream (default 300)
+        ATTENDANCE_LIVE_HEARTBEAT       seconds between keep-alive comments (default 15)
+        ATTENDANCE_LIVE_POLL_RETRY_MS   reconnect delay of the WSGI fallback (default 10000)
+    """
+    poll = getattr(settings, 'ATTENDANCE_LIVE_POLL_SECONDS', 2)
+    heartbeat = getattr(settings, 'ATTENDANCE_LIVE_HEARTBEAT', 15)
+    deadline = time.monotonic() + getattr(settings, 'ATTENDANCE_LIVE_STREAM_SECONDS', 300)
+    read_events = sync_to_async(events_since)
+
+    yield 'retry: 1000\n\n'
+    last_sent = time.monotonic()
+    while time.monotonic() < deadline:
+        events, cursor = await read_events(cursor)
+        for name, data, event_cursor in events:
+            yield format_event(name, data, event_cursor)
+        now = time.monotonic()
+        if events:
+            last_sent = now
+        elif now - last_sent >= heartbeat:
+            yield ': keep-alive\n\n'
+            last_sent = now
+        await asyncio.sleep(poll)
@@ -0,0 +1,53 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from attendance.pdf_reports import default_workers, monthly_report_pdfs, parse_month, staff_for_reports, stream_zip
+
+
+class Command(BaseCommand):
+    help = ('Render the monthly attendance PDF of every staff member (optionally of one office) '
+            'into a directory or a zip file. Meant to run monthly from cron, e.g. '
+            '"0 2 1 * * manage.py attendance_pdf_reports --output /srv/reports".')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--month', help='Month to report (YYYY-MM, default: last month)')
+        parser.add_argument('--office', type=int, help='Only staff of this office id')
+        parser.add_argument('--output', required=True,
+                            help='Directory for the PDFs, or a path ending in .zip for one archive')
+        parser.add_argument('--workers', type=int, help='Render processes (default: ATTENDANCE_PDF_WORKERS or one per CPU)')
+
+    def handle(self, *args, **options):
+        today = timezone.now().date()
+        last_month = (today.year, today.month - 1) if today.month > 1 else (today.year - 1, 12)
+        try:
+            year, month = parse_month(options['month'], default=last_month)
+        except (ValueError, TypeError):
+            raise CommandError(f'Invalid month "{options["month"]}". Use YYYY-MM format.')
+        if options['workers'] is not None and options['workers'] < 1:
+            raise CommandError('--workers must be at least 1.')
+
+        staff = staff_for_reports(options['office'])
+        if not staff:
+            raise CommandError('No active staff found.')
+
+        started = time.perf_counter()
+        files = monthly_report_pdfs(staff, year, month, workers=options['workers'] or default_workers())
+        output = options['output']
+        if output.endswith('.zip'):
+            os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+            with open(output, 'wb') as archive:
+                for chunk in stream_zip(files):
+                    archive.write(chunk)
+        else:
+            os.makedirs(output, exist_ok=True)
+            for filename, pdf in files:
+                with open(os.path.join(output, filename), 'wb') as pdf_file:
+                    pdf_file.write(pdf)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Wrote {len(staff)} attendance PDFs for {year:04d}-{month:02d} to {output} '
+            f'in {time.perf_counter() - started:.1f}s'
+        ))
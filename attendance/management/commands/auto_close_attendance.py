@@ -0,0 +1,37 @@
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from attendance.autoclose import close_open_check_ins
+
+
+class Command(BaseCommand):
+    help = ('Close check-ins that were never checked out with a synthetic check-out at the '
+            'office cut-off. Meant to run nightly from cron, e.g. "15 0 * * * manage.py auto_close_attendance".')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help='Day to close (YYYY-MM-DD, default: yesterday)')
+        parser.add_argument('--days', type=int, default=1,
+                            help='Number of days to process, ending at --date (to catch up missed runs)')
+        parser.add_argument('--dry-run', action='store_true', help='Report what would be closed without writing')
+
+    def handle(self, *args, **options):
+        if options['date']:
+            try:
+                last_day = datetime.strptime(options['date'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError(f'Invalid date "{options["date"]}". Use YYYY-MM-DD format.')
+        else:
+            last_day = timezone.now().date() - timedelta(days=1)
+        if options['days'] < 1:
+            raise CommandError('--days must be at least 1.')
+
+        prefix = '[dry run] ' if options['dry_run'] else ''
+        for offset in range(options['days'] - 1, -1, -1):
+            day = last_day - timedelta(days=offset)
+            report = close_open_check_ins(day, dry_run=options['dry_run'])
+            self.stdout.write(self.style.SUCCESS(
+                f"{prefix}{day}: {report['open']} open check-ins, {report['closed']} closed, "
+                f"{report['skipped']} not yet past their cut-off"
+            ))
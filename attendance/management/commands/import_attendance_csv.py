@@ -0,0 +1,49 @@
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from django.core.management.base import BaseCommand, CommandError
+
+from attendance.imports import IMPORT_CHUNK_SIZE, import_punches
+
+
+class Command(BaseCommand):
+    help = 'Import check-in/check-out punches from a badge reader CSV file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV file with email/user_id, timestamp and type columns')
+        parser.add_argument('--timezone', help='IANA timezone of naive timestamps (default: TIME_ZONE)')
+        parser.add_argument('--source', default='kiosk', help='Name of the reader, stored in the notes')
+        parser.add_argument('--replace', action='store_true',
+                            help='Overwrite punches that already exist for the same user, day and type')
+        parser.add_argument('--dry-run', action='store_true', help='Validate the file without writing')
+        parser.add_argument('--chunk-size', type=int, default=IMPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        tz = None
+        if options['timezone']:
+            try:
+                tz = ZoneInfo(options['timezone'])
+            except ZoneInfoNotFoundError:
+                raise CommandError(f'Unknown timezone "{options["timezone"]}".')
+
+        try:
+            with open(options['path'], newline='', encoding='utf-8-sig') as csv_file:
+                result = import_punches(
+                    csv_file,
+                    source=options['source'],
+                    tz=tz,
+                    replace=options['replace'],
+                    chunk_size=options['chunk_size'],
+                    dry_run=options['dry_run'],
+                )
+        except OSError as e:
+            raise CommandError(f'Cannot read {options["path"]}: {e}')
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        for error in result.errors:
+            self.stderr.write(error)
+        if result.error_count > len(result.errors):
+            self.stderr.write(f'... and {result.error_count - len(result.errors)} more rejected rows')
+
+        prefix = '[dry run] ' if options['dry_run'] else ''
+        self.stdout.write(self.style.SUCCESS(prefix + result.summary()))
@@ -0,0 +1,39 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from attendance.summaries import rebuild_daily_summaries
+
+
+class Command(BaseCommand):
+    help = 'Rebuild DailyAttendanceSummary rows from the raw Attendance records'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start-date', help='First day to rebuild (YYYY-MM-DD)')
+        parser.add_argument('--end-date', help='Last day to rebuild (YYYY-MM-DD)')
+        parser.add_argument('--user', type=int, action='append', dest='user_ids',
+                            help='Only rebuild this user id (can be repeated)')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        start_date = self._parse_date(options['start_date'])
+        end_date = self._parse_date(options['end_date'])
+        if start_date and end_date and end_date < start_date:
+            raise CommandError('End date cannot be before start date.')
+
+        written = rebuild_daily_summaries(
+            start_date=start_date,
+            end_date=end_date,
+            user_ids=options['user_ids'],
+            batch_size=options['batch_size'],
+        )
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {written} daily attendance summaries.'))
+
+    @staticmethod
+    def _parse_date(value):
+        if not value:
+            return None
+        try:
+            return datetime.strptime(value, '%Y-%m-%d').date()
+        except ValueError:
+            raise CommandError(f'Invalid date "{value}". Use YYYY-MM-DD format.')
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from attendance.balances import rebuild_leave_balances
+from attendance.models import LeaveBalance
+
+
+class Command(BaseCommand):
+    help = 'Recompute LeaveBalance used/pending days from the approved and pending LeaveRequest rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='user_ids',
+                            help='Only rebuild this user id (can be repeated)')
+        parser.add_argument('--year', type=int, action='append', dest='years',
+                            help='Only rebuild this year (can be repeated)')
+        parser.add_argument('--if-empty', action='store_true',
+                            help='Only seed the ledger: do nothing once any balance exists (run by build.sh)')
+
+    def handle(self, *args, **options):
+        if options['if_empty'] and LeaveBalance.objects.exists():
+            self.stdout.write('Leave balances already exist; nothing to seed.')
+            return
+        written = rebuild_leave_balances(user_ids=options['user_ids'], years=options['years'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {written} leave balances.'))
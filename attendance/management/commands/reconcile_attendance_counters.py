@@ -0,0 +1,29 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from attendance.counters import reconcile_counters
+
+
+class Command(BaseCommand):
+    help = ('Reset the cached "present today" and staff counters from the database. '
+            'Meant to run periodically from cron, e.g. "*/15 * * * * manage.py reconcile_attendance_counters".')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help='Day whose presence counter to reconcile (YYYY-MM-DD, default: today)')
+
+    def handle(self, *args, **options):
+        day = None
+        if options['date']:
+            try:
+                day = datetime.strptime(options['date'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError(f'Invalid date "{options["date"]}". Use YYYY-MM-DD format.')
+
+        for name, (cached, actual) in reconcile_counters(day).items():
+            if cached is None:
+                self.stdout.write(f'{name}: not cached, set to {actual}')
+            elif cached != actual:
+                self.stdout.write(self.style.WARNING(f'{name}: cached {cached}, corrected to {actual}'))
+            else:
+                self.stdout.write(self.style.SUCCESS(f'{name}: {actual} (in sync)'))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from attendance.office_rollups import REFRESH_WEEKS, TREND_WEEKS, refresh_office_rollups
+
+
+class Command(BaseCommand):
+    help = ('Recompute the weekly per-office attendance rollup for the most recent weeks. '
+            'Meant to run nightly from cron, e.g. "30 0 * * * manage.py rollup_office_attendance"; '
+            f'use --weeks {TREND_WEEKS} once to backfill the trend chart.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--weeks', type=int, default=REFRESH_WEEKS,
+                            help=f'Number of weeks to recompute, ending with the current one (default {REFRESH_WEEKS})')
+
+    def handle(self, *args, **options):
+        if options['weeks'] < 1:
+            raise CommandError('--weeks must be at least 1.')
+        written = refresh_office_rollups(weeks=options['weeks'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {written} weekly office rows over the last {options['weeks']} week(s)."
+        ))
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.1 on 2026-10-18 05:07
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyAttendanceSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('first_check_in', models.DateTimeField(blank=True, null=True)),
+                ('last_check_out', models.DateTimeField(blank=True, null=True)),
+                ('duration', models.DurationField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('present', 'Present'), ('checked_in_only', 'Checked In Only'), ('checked_out_only', 'Checked Out Only'), ('invalid_times', 'Invalid Times'), ('absent', 'Absent')], default='absent', max_length=20)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_attendance', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'Daily Attendance Summaries',
+                'ordering': ['-date'],
+                'indexes': [models.Index(fields=['date', 'status'], name='attendance__date_3ed358_idx')],
+                'unique_together': {('user', 'date')},
+            },
+        ),
+    ]
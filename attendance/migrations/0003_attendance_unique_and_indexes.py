@@ -0,0 +1,56 @@
+# Generated by Django 5.2.1 on 2026-10-18 05:09
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def remove_duplicate_attendance(apps, schema_editor):
+    """
+    Collapse duplicate (user, date, attendance_type) rows before the unique
+    key is restored. The earliest check-in and the latest check-out of the
+    day are kept; for other types the most recent row wins.
+    """
+    Attendance = apps.get_model('attendance', 'Attendance')
+
+    duplicates = (
+        Attendance.objects
+        .values('user_id', 'date', 'attendance_type')
+        .annotate(rows=Count('id'), last_id=Max('id'))
+        .filter(rows__gt=1)
+        .order_by()
+    )
+
+    for group in duplicates.iterator():
+        rows = Attendance.objects.filter(
+            user_id=group['user_id'],
+            date=group['date'],
+            attendance_type=group['attendance_type'],
+        )
+        if group['attendance_type'] == 'check_in':
+            keep = rows.order_by('timestamp', 'id').values_list('id', flat=True).first()
+        elif group['attendance_type'] == 'check_out':
+            keep = rows.order_by('-timestamp', '-id').values_list('id', flat=True).first()
+        else:
+            keep = group['last_id']
+        rows.exclude(id=keep).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0002_dailyattendancesummary'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_attendance, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='attendance',
+            unique_together={('user', 'date', 'attendance_type')},
+        ),
+        migrations.AddIndex(
+            model_name='attendance',
+            index=models.Index(fields=['date', 'attendance_type'], name='attendance_date_type_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.1 on 2026-10-18 05:19
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0003_attendance_unique_and_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='attendance',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-18 05:24
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0004_attendance_timestamp_default'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='leaverequest',
+            options={'ordering': ['-created_at'], 'permissions': [('can_approve_leave', 'Can approve leave requests')]},
+        ),
+        migrations.AddIndex(
+            model_name='leaverequest',
+            index=models.Index(fields=['status', 'start_date', 'end_date'], name='leave_status_range_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.1 on 2026-10-18 05:27
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0005_leaverequest_status_range_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaveBalance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveSmallIntegerField()),
+                ('leave_type', models.CharField(choices=[('annual', 'Annual Leave'), ('sick', 'Sick Leave'), ('maternity', 'Maternity/Paternity'), ('unpaid', 'Unpaid Leave'), ('other', 'Other')], max_length=20)),
+                ('entitled_days', models.PositiveSmallIntegerField(blank=True, help_text='Working days allowed in the year; leave empty for no limit', null=True)),
+                ('used_days', models.IntegerField(default=0)),
+                ('pending_days', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leave_balances', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-year', 'leave_type'],
+                'unique_together': {('user', 'year', 'leave_type')},
+            },
+        ),
+    ]
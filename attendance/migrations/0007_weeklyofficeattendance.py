@@ -0,0 +1,35 @@
+# Generated by Django 5.2.1 on 2026-10-18 05:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0006_leavebalance'),
+        ('core', '0013_alter_regionalleader_region'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WeeklyOfficeAttendance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('week_start', models.DateField()),
+                ('staff_count', models.PositiveIntegerField(default=0)),
+                ('working_days', models.PositiveSmallIntegerField(default=0)),
+                ('expected_days', models.PositiveIntegerField(default=0)),
+                ('leave_days', models.PositiveIntegerField(default=0)),
+                ('present_days', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('office', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='weekly_attendance', to='core.office')),
+            ],
+            options={
+                'verbose_name_plural': 'Weekly Office Attendance',
+                'ordering': ['-week_start', 'office'],
+                'indexes': [models.Index(fields=['week_start'], name='weekly_office_week_idx')],
+                'unique_together': {('office', 'week_start')},
+            },
+        ),
+    ]
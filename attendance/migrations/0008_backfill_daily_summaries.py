@@ -0,0 +1,57 @@
+# Generated by Django 5.2.1 on 2026-10-18 09:12
+
+from django.db import migrations
+
+from attendance.summaries import summary_rows_from_attendance
+
+BATCH_SIZE = 1000
+
+
+def summary_status(first_check_in, last_check_out):
+    """Frozen copy of DailyAttendanceSummary.refresh_status as of this migration: (status, duration)"""
+    if first_check_in and last_check_out:
+        if last_check_out > first_check_in:
+            return 'present', last_check_out - first_check_in
+        return 'invalid_times', None
+    if first_check_in:
+        return 'checked_in_only', None
+    if last_check_out:
+        return 'checked_out_only', None
+    return 'absent', None
+
+
+def backfill_daily_summaries(apps, schema_editor):
+    """
+    Give every (user, day) with Attendance rows its summary, so the reports
+    that read only DailyAttendanceSummary show the history recorded before
+    the table existed. Days that already have a summary are left alone.
+    """
+    Attendance = apps.get_model('attendance', 'Attendance')
+    DailyAttendanceSummary = apps.get_model('attendance', 'DailyAttendanceSummary')
+
+    batch = []
+    for row in summary_rows_from_attendance(Attendance.objects.all()).iterator(chunk_size=BATCH_SIZE):
+        status, duration = summary_status(row['first_check_in'], row['last_check_out'])
+        batch.append(DailyAttendanceSummary(
+            user_id=row['user_id'],
+            date=row['date'],
+            first_check_in=row['first_check_in'],
+            last_check_out=row['last_check_out'],
+            duration=duration,
+            status=status,
+        ))
+        if len(batch) == BATCH_SIZE:
+            DailyAttendanceSummary.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    DailyAttendanceSummary.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0007_weeklyofficeattendance'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_daily_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.1 on 2026-10-18 09:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0008_backfill_daily_summaries'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='dailyattendancesummary',
+            index=models.Index(fields=['user', 'updated_at', 'id'], name='summary_user_updated_idx'),
+        ),
+    ]
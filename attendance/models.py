@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 
@@ -27,7 +27,8 @@ class Attendance(models.Model):
 
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='attendances')
     date = models.DateField()
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Defaults to now but, unlike auto_now_add, keeps punch times set by imports
+    timestamp = models.DateTimeField(default=timezone.now, editable=False)
     attendance_type = models.CharField(max_length=10, choices=ATTENDANCE_TYPES)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='auto')
     notes = models.TextField(blank=True, null=True)
@@ -37,19 +38,21 @@ class Attendance(models.Model):
                                   related_name='recorded_attendances')
     
     class Meta:
-        ordering = ['-date', '-timestamp']
+        ordering = ['-timestamp']
+        verbose_name_plural = 'Attendance Records'
+        # The unique key doubles as the (user, date, attendance_type) lookup index
         unique_together = ('user', 'date', 'attendance_type')
+        indexes = [
+            models.Index(fields=['date', 'attendance_type'], name='attendance_date_type_idx'),
+        ]
     
     def save(self, *args, **kwargs):
-        # Set the date field to the date part of timestamp if not set
-        if not self.date and self.timestamp:
-            self.date = self.timestamp.date()
+        # Set the date field from the timestamp (or now) if not set, since
+        # every report filters on this column rather than on timestamp__date
+        if not self.date:
+            self.date = (self.timestamp or timezone.now()).date()
         super().save(*args, **kwargs)
 
-    class Meta:
-        ordering = ['-timestamp']
-        verbose_name_plural = 'Attendance Records'
-
     def __str__(self):
         user_identifier = getattr(self.user, 'username', None) or getattr(self.user, 'email', str(self.user.id))
         return f"{user_identifier} - {self.get_attendance_type_display()} at {self.timestamp}"
@@ -102,46 +105,51 @@ class LeaveRequest(models.Model):
         permissions = [
             ('can_approve_leave', 'Can approve leave requests'),
         ]
+        indexes = [
+            # Interval lookups: status = X AND start_date <= end AND end_date >= start
+            models.Index(fields=['status', 'start_date', 'end_date'], name='leave_status_range_idx'),
+        ]
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored status so save() can detect changes without a re-query
+        instance._loaded_status = instance.__dict__.get('status')
+        instance._loaded_balance_state = instance.balance_state()
+        return instance
+
+    def balance_state(self):
+        """The fields that decide how this request counts against leave balances"""
+        return (self.__dict__.get('user_id'), self.__dict__.get('leave_type'), self.__dict__.get('status'),
+                self.__dict__.get('start_date'), self.__dict__.get('end_date'))
+
     def save(self, *args, **kwargs):
+        from .balances import apply_balance_change
+
         # Set reviewed_at timestamp when status changes from pending
-        if self.pk:
-            old_instance = LeaveRequest.objects.get(pk=self.pk)
-            if old_instance.status == 'pending' and self.status != 'pending':
-                self.reviewed_at = timezone.now()
-        super().save(*args, *kwargs)
-        
-        # If approved, mark user as absent for these dates
-        if self.status == 'approved':
-            from django.db.models import Q
-            from datetime import timedelta
-            
-            # Delete any existing absent records for these dates to avoid duplicates
-            Attendance.objects.filter(
-                user=self.user,
-                date__range=[self.start_date, self.end_date],
-                attendance_type=Attendance.ABSENT
-            ).delete()
-            
-            # Create absent records for each day of leave
-            current_date = self.start_date
-            while current_date <= self.end_date:
-                # Skip weekends (optional)
-                if current_date.weekday() < 5:  # 0=Monday, 6=Sunday
-                    Attendance.objects.update_or_create(
-                        user=self.user,
-                        date=current_date,
-                        attendance_type=Attendance.ABSENT,
-                        defaults={
-                            'status': 'manual',
-                            'notes': f'On approved {self.get_leave_type_display()}: {self.reason}',
-                            'recorded_by': self.reviewed_by
-                        }
-                    )
-                current_date += timedelta(days=1)
+        if getattr(self, '_loaded_status', None) == self.PENDING and self.status != self.PENDING:
+            self.reviewed_at = timezone.now()
 
-    class Meta:
-        ordering = ['-created_at']
+        with transaction.atomic():
+            old_state = getattr(self, '_loaded_balance_state', None)
+            if old_state and None in old_state and self.pk:
+                # Loaded with deferred fields; read the stored state instead
+                old_state = LeaveRequest.objects.filter(pk=self.pk).values_list(
+                    'user_id', 'leave_type', 'status', 'start_date', 'end_date').first()
+            super().save(*args, **kwargs)
+            new_state = self.balance_state()
+            if old_state and None in new_state:
+                # Deferred fields were not saved, so they still hold the stored values
+                new_state = tuple(old if value is None else value for value, old in zip(new_state, old_state))
+            apply_balance_change(old_state, new_state)
+
+            # If approved, mark user as absent for the working days of the leave;
+            # in the same transaction, so an approval never commits without them
+            if self.status == self.APPROVED:
+                from .leaves import materialize_leave_absences
+                materialize_leave_absences([self])
+        self._loaded_status = self.status
+        self._loaded_balance_state = new_state
 
     @property
     def duration_days(self):
@@ -167,3 +175,143 @@ class Holiday(models.Model):
 
     def __str__(self):
         return f"{self.name} ({self.date})"
+
+
+class DailyAttendanceSummary(models.Model):
+    """
+    Per-user, per-day attendance rollup kept in step with the raw Attendance rows
+    """
+    PRESENT = 'present'
+    CHECKED_IN_ONLY = 'checked_in_only'
+    CHECKED_OUT_ONLY = 'checked_out_only'
+    INVALID_TIMES = 'invalid_times'
+    ABSENT = 'absent'
+
+    STATUS_CHOICES = [
+        (PRESENT, 'Present'),
+        (CHECKED_IN_ONLY, 'Checked In Only'),
+        (CHECKED_OUT_ONLY, 'Checked Out Only'),
+        (INVALID_TIMES, 'Invalid Times'),
+        (ABSENT, 'Absent'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='daily_attendance')
+    date = models.DateField()
+    first_check_in = models.DateTimeField(null=True, blank=True)
+    last_check_out = models.DateTimeField(null=True, blank=True)
+    duration = models.DurationField(null=True, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=ABSENT)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-date']
+        unique_together = ('user', 'date')
+        indexes = [
+            models.Index(fields=['date', 'status']),
+            models.Index(fields=['user', 'updated_at', 'id'], name='summary_user_updated_idx'),
+        ]
+        verbose_name_plural = 'Daily Attendance Summaries'
+
+    def refresh_status(self):
+        """Derive status and duration from the stored check-in/check-out times"""
+        self.duration = None
+        if self.first_check_in and self.last_check_out:
+            if self.last_check_out > self.first_check_in:
+                self.duration = self.last_check_out - self.first_check_in
+                self.status = self.PRESENT
+            else:
+                self.status = self.INVALID_TIMES
+        elif self.first_check_in:
+            self.status = self.CHECKED_IN_ONLY
+        elif self.last_check_out:
+            self.status = self.CHECKED_OUT_ONLY
+        else:
+            self.status = self.ABSENT
+
+    def __str__(self):
+        user_identifier = getattr(self.user, 'email', None) or str(self.user_id)
+        return f"{user_identifier} - {self.date} ({self.get_status_display()})"
+
+
+class LeaveBalance(models.Model):
+    """
+    Per-user, per-year, per-leave-type balance kept in step with LeaveRequest
+
+    used_days and pending_days count the working days of approved and
+    pending requests falling in the year; they are adjusted in the same
+    transaction as every request change (see attendance.balances).
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='leave_balances')
+    year = models.PositiveSmallIntegerField()
+    leave_type = models.CharField(max_length=20, choices=LeaveRequest.LEAVE_TYPES)
+    entitled_days = models.PositiveSmallIntegerField(
+        null=True, blank=True,
+        help_text="Working days allowed in the year; leave empty for no limit"
+    )
+    used_days = models.IntegerField(default=0)
+    pending_days = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-year', 'leave_type']
+        unique_together = ('user', 'year', 'leave_type')
+
+    @property
+    def remaining_days(self):
+        if self.entitled_days is None:
+            return None
+        return self.entitled_days - self.used_days
+
+    def __str__(self):
+        user_identifier = getattr(self.user, 'email', None) or str(self.user_id)
+        return f"{user_identifier} - {self.get_leave_type_display()} {self.year}: {self.used_days} used"
+
+
+class WeeklyOfficeAttendance(models.Model):
+    """
+    Per-office, per-week attendance rollup behind the office trend chart
+
+    Rebuilt from DailyAttendanceSummary a few weeks at a time (see
+    attendance.office_rollups); weeks start on Monday. expected_days is
+    active staff times working days, before leave is taken off.
+    """
+    office = models.ForeignKey('core.Office', on_delete=models.CASCADE, related_name='weekly_attendance')
+    week_start = models.DateField()
+    staff_count = models.PositiveIntegerField(default=0)
+    working_days = models.PositiveSmallIntegerField(default=0)
+    expected_days = models.PositiveIntegerField(default=0)
+    leave_days = models.PositiveIntegerField(default=0)
+    present_days = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-week_start', 'office']
+        unique_together = ('office', 'week_start')
+        indexes = [
+            models.Index(fields=['week_start'], name='weekly_office_week_idx'),
+        ]
+        verbose_name_plural = 'Weekly Office Attendance'
+
+    @property
+    def attendance_percentage(self):
+        available = self.expected_days - self.leave_days
+        return round(self.present_days / available * 100, 2) if available > 0 else None
+
+    def __str__(self):
+        return f"{self.office} - week of {self.week_start}: {self.present_days}/{self.expected_days}"
+
+
+class AttendanceCounter(models.Model):
+    """
+    Running totals behind the dashboard's presence and staff counts
+
+    See attendance.counters. Increments are a single
+    UPDATE ... SET value = value + 1, which the database applies atomically
+    whatever cache backend is configured.
+    """
+    name = models.CharField(max_length=64, unique=True)
+    value = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name}: {self.value}"
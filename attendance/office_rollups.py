@@ -0,0 +1,146 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from core.models import Office
+
+from .business_calendar import business_calendar
+from .models import DailyAttendanceSummary, LeaveRequest, WeeklyOfficeAttendance
+
+User = get_user_model()
+
+# Weeks recomputed by a routine refresh: the current one and the one before,
+# which still changes through late check-outs, auto-close and imports
+REFRESH_WEEKS = 2
+TREND_WEEKS = 52
+
+
+def week_start(day):
+    """Monday of the week holding ``day``"""
+    return day - timedelta(days=day.weekday())
+
+
+def recent_weeks(count, today=None):
+    """Monday of the ``count`` most recent weeks, oldest first, ending with this week"""
+    current = week_start(today or timezone.now().date())
+    return [current - timedelta(weeks=offset) for offset in range(count - 1, -1, -1)]
+
+
+def rebuild_office_weeks(week_starts, today=None):
+    """
+    Recompute the WeeklyOfficeAttendance rows of the given weeks.
+
+    Presence comes from one query grouping the daily summaries of active
+    staff by (office, day), and leave from one range query over approved
+    requests, so the cost depends on the number of offices and days, not on
+    the number of punches. Headcount is the current active staff of each
+    office and only days up to ``today`` count, so the current week is not
+    diluted by days still to come. Staff without an office are left out.
+    The rows of those weeks are replaced in one transaction. Returns the
+    number of rows written.
+    """
+    today = today or timezone.now().date()
+    week_starts = sorted(set(week_starts))
+    if not week_starts:
+        return 0
+    first_day = week_starts[0]
+    last_day = week_starts[-1] + timedelta(days=6)
+
+    working_by_week = {
+        start: set(business_calendar.working_days(start, min(start + timedelta(days=6), today)))
+        for start in week_starts
+    }
+
+    staff = User.objects.filter(is_staff=True, is_active=True, office__isnull=False)
+    headcount = dict(
+        staff.order_by().values('office_id').annotate(total=Count('pk')).values_list('office_id', 'total')
+    )
+
+    present = defaultdict(int)
+    rows = DailyAttendanceSummary.objects.filter(
+        date__range=[first_day, last_day],
+        first_check_in__isnull=False,
+        user__in=staff,
+    ).order_by().values('user__office_id', 'date').annotate(total=Count('pk')).values_list(
+        'user__office_id', 'date', 'total'
+    )
+    for office_id, day, total in rows:
+        start = week_start(day)
+        if start in working_by_week and day in working_by_week[start]:
+            present[(office_id, start)] += total
+
+    leave = defaultdict(int)
+    leaves = LeaveRequest.objects.filter(
+        status=LeaveRequest.APPROVED,
+        start_date__lte=last_day,
+        end_date__gte=first_day,
+        user__in=staff,
+    ).order_by().values_list('user__office_id', 'start_date', 'end_date')
+    for office_id, leave_start, leave_end in leaves:
+        for start, working in working_by_week.items():
+            days = sum(1 for day in working if leave_start <= day <= leave_end)
+            if days:
+                leave[(office_id, start)] += days
+
+    weekly = []
+    for office_id in Office.objects.order_by('pk').values_list('pk', flat=True):
+        staff_count = headcount.get(office_id, 0)
+        for start in week_starts:
+            if not staff_count and not present[(office_id, start)]:
+                continue
+            working_days = len(working_by_week[start])
+            weekly.append(WeeklyOfficeAttendance(
+                office_id=office_id,
+                week_start=start,
+                staff_count=staff_count,
+                working_days=working_days,
+                expected_days=staff_count * working_days,
+                leave_days=leave[(office_id, start)],
+                present_days=present[(office_id, start)],
+            ))
+
+    with transaction.atomic():
+        WeeklyOfficeAttendance.objects.filter(week_start__in=week_starts).delete()
+        WeeklyOfficeAttendance.objects.bulk_create(weekly, batch_size=1000)
+    return len(weekly)
+
+
+def refresh_office_rollups(weeks=REFRESH_WEEKS, today=None):
+    """Recompute the ``weeks`` most recent weeks; older weeks are left as they are"""
+    return rebuild_office_weeks(recent_weeks(weeks, today), today=today)
+
+
+def office_trend(weeks=TREND_WEEKS, office_id=None, today=None):
+    """
+    Chart data read from the rollup table only: the week labels and, per
+    office, the attendance percentage of each week (None where no row).
+    """
+    starts = recent_weeks(weeks, today)
+    rows = WeeklyOfficeAttendance.objects.filter(
+        week_start__range=[starts[0], starts[-1]]
+    ).select_related('office').only(
+        'office__office_Name', 'week_start', 'expected_days', 'leave_days', 'present_days'
+    )
+    if office_id:
+        rows = rows.filter(office_id=office_id)
+
+    column = {start: index for index, start in enumerate(starts)}
+    offices = {}
+    for row in rows:
+        entry = offices.setdefault(row.office_id, {
+            'id': row.office_id,
+            'name': row.office.office_Name,
+            'percentages': [None] * len(starts),
+            'present_days': [0] * len(starts),
+        })
+        entry['percentages'][column[row.week_start]] = row.attendance_percentage
+        entry['present_days'][column[row.week_start]] = row.present_days
+
+    return {
+        'weeks': [start.isoformat() for start in starts],
+        'offices': sorted(offices.values(), key=lambda entry: entry['name']),
+    }
@@ -0,0 +1,94 @@
+"""
+reportlab rendering of the monthly attendance PDF.
+
+Kept free of Django imports: ``render_staff_pdf`` runs in worker processes
+(see attendance.pdf_reports), which only need this module and reportlab.
+"""
+import io
+from xml.sax.saxutils import escape
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.units import mm
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+HEADER_BACKGROUND = colors.HexColor('#2e2e38')
+HEADER_TEXT = colors.HexColor('#ffe600')
+STRIPE = colors.HexColor('#f4f4f6')
+
+# Day rows are shaded by status so absences stand out when printed
+STATUS_COLOURS = {
+    'Absent': colors.HexColor('#fde2e1'),
+    'Leave': colors.HexColor('#e3f2fd'),
+    'Holiday': colors.HexColor('#e8f5e8'),
+    'Weekend': colors.HexColor('#eeeeee'),
+}
+
+DAY_COLUMNS = ('Date', 'Check In', 'Check Out', 'Hours', 'Status')
+
+
+def _table_style(header=True):
+    commands = [
+        ('FONTSIZE', (0, 0), (-1, -1), 8.5),
+        ('GRID', (0, 0), (-1, -1), 0.25, colors.HexColor('#cccccc')),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        # Tight rows keep a 31-day month on one page
+        ('TOPPADDING', (0, 0), (-1, -1), 2),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 2),
+    ]
+    if header:
+        commands += [
+            ('BACKGROUND', (0, 0), (-1, 0), HEADER_BACKGROUND),
+            ('TEXTCOLOR', (0, 0), (-1, 0), HEADER_TEXT),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ]
+    return commands
+
+
+def render_staff_pdf(report):
+    """
+    Render one staff member's month as PDF bytes.
+
+    ``report`` is the plain dict built by ``attendance.pdf_reports.staff_reports``:
+    name, email, office, period, summary [(label, value)] and days
+    [(date, check in, check out, hours, status)].
+    """
+    output = io.BytesIO()
+    document = SimpleDocTemplate(
+        output,
+        pagesize=A4,
+        leftMargin=15 * mm, rightMargin=15 * mm, topMargin=15 * mm, bottomMargin=15 * mm,
+        title=f"Attendance report {report['period']} - {report['name']}",
+        author=report.get('office') or '',
+        # Same data, same bytes: keeps cached and freshly rendered copies identical
+        invariant=True,
+    )
+    styles = getSampleStyleSheet()
+
+    story = [
+        Paragraph(f"Monthly Attendance Report &mdash; {report['period']}", styles['Title']),
+        Paragraph(f"<b>{escape(report['name'])}</b> &lt;{escape(report['email'])}&gt;", styles['Normal']),
+    ]
+    if report.get('office'):
+        story.append(Paragraph(escape(report['office']), styles['Normal']))
+    story.append(Spacer(1, 6 * mm))
+
+    summary = Table([list(row) for row in report['summary']], colWidths=[60 * mm, 40 * mm], hAlign='LEFT')
+    summary_style = _table_style(header=False)
+    summary_style.append(('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'))
+    summary.setStyle(TableStyle(summary_style))
+    story += [summary, Spacer(1, 6 * mm)]
+
+    rows = [list(DAY_COLUMNS)] + [list(day) for day in report['days']]
+    days = Table(rows, colWidths=[40 * mm, 30 * mm, 30 * mm, 20 * mm, 60 * mm], repeatRows=1, hAlign='LEFT')
+    day_style = _table_style()
+    for index, day in enumerate(report['days'], start=1):
+        background = STATUS_COLOURS.get(day[-1]) or (STRIPE if index % 2 == 0 else None)
+        if background is not None:
+            day_style.append(('BACKGROUND', (0, index), (-1, index), background))
+    days.setStyle(TableStyle(day_style))
+    story.append(days)
+
+    document.build(story)
+    return output.getvalue()
@@ -0,0 +1,261 @@
+import calendar
+import hashlib
+import json
+import logging
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.text import slugify
+
+from .business_calendar import business_calendar
+from .models import DailyAttendanceSummary, LeaveRequest
+from .pdf import render_staff_pdf
+from .rollups import attendance_percentage, rollup_attendance
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+
+def _cache_timeout():
+    return getattr(settings, 'ATTENDANCE_PDF_CACHE_TIMEOUT', 24 * 60 * 60)
+
+
+def default_workers():
+    """Render processes of the attendance_pdf_reports command (ATTENDANCE_PDF_WORKERS, default one per CPU)"""
+    return getattr(settings, 'ATTENDANCE_PDF_WORKERS', None) or os.cpu_count() or 1
+
+
+def max_inline_renders():
+    """PDFs a download may render itself (ATTENDANCE_PDF_MAX_INLINE_RENDERS, default 25); cached ones are free"""
+    return getattr(settings, 'ATTENDANCE_PDF_MAX_INLINE_RENDERS', 25)
+
+
+class TooManyReports(Exception):
+    """Raised when more PDFs would have to be rendered than the caller allows"""
+
+    def __init__(self, count, limit):
+        self.count, self.limit = count, limit
+        super().__init__(f'{count} attendance PDFs would have to be rendered (the limit is {limit}).')
+
+
+def month_range(year, month):
+    return date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1])
+
+
+def parse_month(value, default=None):
+    """'YYYY-MM' to (year, month); raises ValueError on anything else"""
+    if not value:
+        return default
+    year, month = (int(part) for part in value.split('-'))
+    date(year, month, 1)
+    return year, month
+
+
+def staff_for_reports(office_id=None):
+    staff = User.objects.filter(is_staff=True, is_active=True).select_related('office')
+    if office_id:
+        staff = staff.filter(office_id=office_id)
+    return list(staff.only(
+        'id', 'first_name', 'last_name', 'email', 'office__office_Name'
+    ).order_by('first_name', 'last_name', 'id'))
+
+
+def _time(value):
+    return timezone.localtime(value).strftime('%H:%M') if value else '-'
+
+
+def staff_reports(staff, year, month, today=None):
+    """
+    The report data of every member of ``staff`` for one month.
+
+    Uses the rollup totals plus one query for the month's daily summaries
+    and one for approved leave, whatever the number of staff. Returns
+    {user id: report dict} where each report only holds strings and numbers,
+    so it can be hashed for the cache and pickled to a worker process.
+    """
+    today = today or timezone.now().date()
+    start_date, end_date = month_range(year, month)
+    user_ids = [member.pk for member in staff]
+
+    rollup = rollup_attendance(start_date, end_date, staff)
+    working = set(business_calendar.working_days(start_date, end_date))
+    holidays = set(business_calendar.holidays(start_date, end_date))
+
+    summaries = {}
+    rows = DailyAttendanceSummary.objects.filter(
+        user_id__in=user_ids,
+        date__range=[start_date, end_date]
+    ).order_by().values_list('user_id', 'date', 'first_check_in', 'last_check_out', 'duration', 'status')
+    for user_id, day, first_check_in, last_check_out, duration, status in rows.iterator(chunk_size=5000):
+        summaries[(user_id, day)] = (first_check_in, last_check_out, duration, status)
+
+    on_leave = set()
+    leaves = LeaveRequest.objects.filter(
+        user_id__in=user_ids,
+        status=LeaveRequest.APPROVED,
+        start_date__lte=end_date,
+        end_date__gte=start_date,
+    ).order_by().values_list('user_id', 'start_date', 'end_date')
+    for user_id, leave_start, leave_end in leaves:
+        on_leave.update((user_id, day) for day in working if leave_start <= day <= leave_end)
+
+    status_labels = dict(DailyAttendanceSummary.STATUS_CHOICES)
+    period = start_date.strftime('%B %Y')
+    reports = {}
+    for member in staff:
+        days = []
+        leave_days = 0
+        for offset in range((end_date - start_date).days + 1):
+            day = date.fromordinal(start_date.toordinal() + offset)
+            summary = summaries.get((member.pk, day))
+            if summary and (summary[0] or summary[1]):
+                first_check_in, last_check_out, duration, status = summary
+                hours = f'{duration.total_seconds() / 3600:.2f}' if duration else '-'
+                days.append((day.strftime('%a %d %b'), _time(first_check_in), _time(last_check_out),
+                             hours, status_labels.get(status, status)))
+                continue
+            if (member.pk, day) in on_leave:
+                leave_days += 1
+                label = 'Leave'
+            elif day in holidays:
+                label = 'Holiday'
+            elif day not in working:
+                label = 'Weekend'
+            elif day > today:
+                label = '-'
+            else:
+                label = 'Absent'
+            days.append((day.strftime('%a %d %b'), '-', '-', '-', label))
+
+        totals = rollup[member.pk]
+        reports[member.pk] = {
+            'name': member.get_full_name() or member.email,
+            'email': member.email,
+            'office': member.office.office_Name if member.office_id else '',
+            'period': period,
+            'summary': [
+                ('Working days', str(len(working))),
+                ('Days checked in', str(totals['checked_in_days'])),
+                ('Full days (in and out)', str(totals['present_days'])),
+                ('Leave days', str(leave_days)),
+                ('Total hours', f"{totals['total_hours']:.2f}"),
+                ('Attendance', f"{attendance_percentage(totals['checked_in_days'], len(working))}%"),
+            ],
+            'days': days,
+        }
+    return reports
+
+
+def data_version(report):
+    """Digest of a report's content; any change to the month's data changes it"""
+    encoded = json.dumps(report, sort_keys=True, separators=(',', ':')).encode('utf-8')
+    return hashlib.sha1(encoded).hexdigest()
+
+
+def cache_key(user_id, year, month, report):
+    return f'attendance:pdf:{user_id}:{year:04d}-{month:02d}:{data_version(report)}'
+
+
+def report_filename(member, year, month):
+    name = slugify(member.get_full_name() or member.email.split('@')[0]) or 'staff'
+    return f'{name}-{member.pk}_{year:04d}-{month:02d}.pdf'
+
+
+def _render_all(jobs, workers):
+    """Yield (member, pdf bytes) as each render finishes"""
+    if len(jobs) < 2 or workers < 2:
+        for member, report in jobs:
+            yield member, render_staff_pdf(report)
+        return
+
+    pool = ProcessPoolExecutor(max_workers=min(workers, len(jobs)))
+    try:
+        futures = {pool.submit(render_staff_pdf, report): member for member, report in jobs}
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+    finally:
+        # Also reached when a download is abandoned half way
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def monthly_report_pdfs(staff, year, month, workers=1, max_renders=None):
+    """
+    Iterator of (filename, pdf bytes) for every member of ``staff``.
+
+    Finished PDFs are cached under (user, month, data version), where the
+    version is a digest of the report data, so a cached PDF is served until
+    the month's attendance or leave actually changes and never needs an
+    explicit invalidation. Cached PDFs come first; the rest are rendered in
+    this process, or with ``workers`` > 1 in a ProcessPoolExecutor of that
+    many processes, and yielded as they finish. Only the management command
+    uses a pool; web workers render inline rather than fork per download.
+
+    The cache is checked before this returns, so TooManyReports is raised
+    here, not half way through a download, when more than ``max_renders``
+    PDFs are missing from it.
+    """
+    reports = staff_reports(staff, year, month)
+    keys = {member.pk: cache_key(member.pk, year, month, reports[member.pk]) for member in staff}
+    cached = cache.get_many(keys.values())
+
+    jobs = [(member, reports[member.pk]) for member in staff if keys[member.pk] not in cached]
+    if max_renders is not None and len(jobs) > max_renders:
+        raise TooManyReports(len(jobs), max_renders)
+    logger.info(f'Attendance PDFs {year:04d}-{month:02d}: {len(staff) - len(jobs)} cached, {len(jobs)} to render')
+    return _report_pdfs(staff, year, month, keys, cached, jobs, workers)
+
+
+def _report_pdfs(staff, year, month, keys, cached, jobs, workers):
+    for member in staff:
+        if keys[member.pk] in cached:
+            yield report_filename(member, year, month), cached[keys[member.pk]]
+    for member, pdf in _render_all(jobs, workers):
+        cache.set(keys[member.pk], pdf, _cache_timeout())
+        yield report_filename(member, year, month), pdf
+
+
+class _ZipStream:
+    """Non-seekable sink that zipfile writes into; the bytes are collected with take()"""
+
+    def __init__(self):
+        self.chunks = []
+        self.offset = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.offset += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.offset
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def stream_zip(files):
+    """
+    Zip an iterable of (filename, bytes) on the fly.
+
+    Each member is yielded as soon as it is written, so a StreamingHttpResponse
+    starts sending while later PDFs are still rendering. PDFs are already
+    compressed, so members are stored as they are.
+    """
+    sink = _ZipStream()
+    with zipfile.ZipFile(sink, mode='w', compression=zipfile.ZIP_STORED) as archive:
+        for filename, content in files:
+            archive.writestr(filename, content)
+            yield sink.take()
+    yield sink.take()
@@ -0,0 +1,83 @@
+from django.db.models import Count, Max, Q, Sum
+
+from .models import Attendance, DailyAttendanceSummary
+
+
+def summary_totals(start_date, end_date, user_ids=None):
+    """
+    Return one row per user with day counts and total duration over the
+    range, read from DailyAttendanceSummary.
+
+    Runs as a single grouped query regardless of how many users are involved.
+    """
+    queryset = DailyAttendanceSummary.objects.filter(date__range=[start_date, end_date])
+    if user_ids is not None:
+        queryset = queryset.filter(user_id__in=list(user_ids))
+
+    return (
+        queryset
+        .values('user_id')
+        .annotate(
+            checked_in_days=Count('pk', filter=Q(first_check_in__isnull=False)),
+            present_days=Count('pk', filter=Q(first_check_in__isnull=False, last_check_out__isnull=False)),
+            total_duration=Sum('duration'),
+        )
+        .order_by()
+    )
+
+
+def last_activity(start_date, end_date, user_ids):
+    """{user id: latest Attendance timestamp in the range}, of any type including absences; one grouped query"""
+    return dict(
+        Attendance.objects.filter(date__range=[start_date, end_date], user_id__in=list(user_ids))
+        .values('user_id').annotate(latest=Max('timestamp')).order_by()
+        .values_list('user_id', 'latest')
+    )
+
+
+def _empty_rollup(total_days):
+    return {
+        'checked_in_days': 0,
+        'present_days': 0,
+        'total_days': total_days,
+        'total_hours': 0,
+        'last_activity': None,
+    }
+
+
+def rollup_attendance(start_date, end_date, users):
+    """
+    Compute per-user attendance totals for a date range.
+
+    Returns a dict keyed by user id with:
+        checked_in_days -- days with at least one check-in
+        present_days    -- days with both a check-in and a check-out, including
+                           days where the check-out is recorded before the check-in
+        total_days      -- calendar days in the range (inclusive)
+        total_hours     -- sum of check-out minus check-in over the days where
+                           the check-out is the later one
+        last_activity   -- most recent attendance record in the range, absences included
+
+    Every user in ``users`` gets an entry, even without any records. Two
+    grouped queries cover all users.
+    """
+    user_ids = [user.pk for user in users]
+    total_days = (end_date - start_date).days + 1
+    rollup = {user_id: _empty_rollup(total_days) for user_id in user_ids}
+
+    for row in summary_totals(start_date, end_date, user_ids):
+        summary = rollup[row['user_id']]
+        summary['checked_in_days'] = row['checked_in_days']
+        summary['present_days'] = row['present_days']
+        if row['total_duration']:
+            summary['total_hours'] = row['total_duration'].total_seconds() / 3600
+
+    for user_id, latest in last_activity(start_date, end_date, user_ids).items():
+        rollup[user_id]['last_activity'] = latest
+
+    return rollup
+
+
+def attendance_percentage(days, total_days):
+    """Percentage of ``days`` over ``total_days`` rounded to two decimals."""
+    return round((days / total_days * 100), 2) if total_days > 0 else 0
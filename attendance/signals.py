@@ -0,0 +1,50 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import counters
+from .balances import apply_balance_change
+from .business_calendar import business_calendar
+from .dashboard import invalidate_dashboard
+from .models import Attendance, Holiday, LeaveRequest
+
+User = get_user_model()
+
+
+@receiver([post_save, post_delete], sender=Holiday)
+def invalidate_business_calendar(sender, **kwargs):
+    """Holidays feed the working-day bitmaps, so rebuild them on any change"""
+    business_calendar.invalidate()
+
+
+@receiver([post_save, post_delete], sender=Attendance)
+@receiver([post_save, post_delete], sender=LeaveRequest)
+@receiver([post_save, post_delete], sender=Holiday)
+def invalidate_admin_dashboard(sender, **kwargs):
+    """Every dashboard aggregate is derived from these three tables"""
+    invalidate_dashboard()
+
+
+@receiver(post_delete, sender=LeaveRequest)
+def release_leave_balance(sender, instance, **kwargs):
+    """Give the days back for deleted requests, including QuerySet.delete()"""
+    apply_balance_change(getattr(instance, '_loaded_balance_state', None) or instance.balance_state(), None)
+
+
+@receiver([post_save, post_delete], sender=Attendance)
+def refresh_present_counter(sender, instance, created=False, **kwargs):
+    """
+    Check-ins recorded by the clock-in service are counted there; any other
+    change to a check-in drops the day's counter so it is recounted.
+    """
+    if created and getattr(instance, '_counted', False):
+        return
+    if instance.attendance_type == Attendance.CHECK_IN or not created:
+        counters.forget_present(instance.date)
+
+
+@receiver([post_save, post_delete], sender=User)
+def refresh_staff_counter(sender, update_fields=None, **kwargs):
+    # Logins save last_login alone, which never changes the count
+    if update_fields is None or 'is_staff' in update_fields:
+        counters.forget_total_staff()
@@ -0,0 +1,212 @@
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Max, Min, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime, parse_duration
+
+from core.archive import ARCHIVE_SPECS, read_archive
+
+from .dashboard import invalidate_dashboard
+from .models import Attendance, DailyAttendanceSummary
+
+
+def record_attendance(attendance):
+    """
+    Fold a freshly written Attendance row into the user's summary for that day.
+
+    Only the summary row for (user, date) is touched, so a clock-in or
+    clock-out costs one locked read and one write on top of the insert.
+    """
+    with transaction.atomic():
+        summary, _ = DailyAttendanceSummary.objects.select_for_update().get_or_create(
+            user_id=attendance.user_id,
+            date=attendance.date,
+        )
+
+        if attendance.attendance_type == Attendance.CHECK_IN:
+            if summary.first_check_in is None or attendance.timestamp < summary.first_check_in:
+                summary.first_check_in = attendance.timestamp
+        elif attendance.attendance_type == Attendance.CHECK_OUT:
+            if summary.last_check_out is None or attendance.timestamp > summary.last_check_out:
+                summary.last_check_out = attendance.timestamp
+
+        summary.refresh_status()
+        summary.save()
+    return summary
+
+
+def mark_absent_days(user, dates):
+    """
+    Make sure every date in ``dates`` has a summary row for ``user``.
+
+    Days that already carry check-in/check-out times keep their status; new
+    rows are inserted in a single ``bulk_create``.
+    """
+    return mark_absent_pairs((user.pk, day) for day in dates)
+
+
+def mark_absent_pairs(pairs):
+    """
+    Same as ``mark_absent_days`` for any number of (user_id, date) pairs,
+    in one read and one ``bulk_create``.
+    """
+    pairs = set(pairs)
+    if not pairs:
+        return 0
+
+    user_ids = {user_id for user_id, _ in pairs}
+    dates = [day for _, day in pairs]
+    existing = set(
+        DailyAttendanceSummary.objects.filter(
+            user_id__in=user_ids,
+            date__range=[min(dates), max(dates)]
+        ).values_list('user_id', 'date')
+    )
+    missing = sorted(pairs - existing)
+    DailyAttendanceSummary.objects.bulk_create([
+        DailyAttendanceSummary(user_id=user_id, date=day, status=DailyAttendanceSummary.ABSENT)
+        for user_id, day in missing
+    ])
+    return len(missing)
+
+
+def summary_rows_from_attendance(queryset):
+    """Group raw Attendance rows into one row per (user, date)"""
+    return (
+        queryset
+        .values('user_id', 'date')
+        .annotate(
+            first_check_in=Min('timestamp', filter=Q(attendance_type=Attendance.CHECK_IN)),
+            last_check_out=Max('timestamp', filter=Q(attendance_type=Attendance.CHECK_OUT)),
+        )
+        .order_by()
+    )
+
+
+def resync_daily_summaries(pairs):
+    """
+    Recompute the summaries of the given (user_id, date) pairs from their
+    Attendance rows, after punches were edited or deleted outside the
+    clock-in service. A day left without punches keeps an absent row.
+    Returns the number of summaries written.
+    """
+    pairs = set(pairs)
+    if not pairs:
+        return 0
+
+    user_ids = {user_id for user_id, _ in pairs}
+    dates = [day for _, day in pairs]
+    times = {
+        (row['user_id'], row['date']): row
+        for row in summary_rows_from_attendance(
+            Attendance.objects.filter(user_id__in=user_ids, date__range=[min(dates), max(dates)])
+        )
+    }
+
+    with transaction.atomic():
+        existing = {
+            (summary.user_id, summary.date): summary
+            for summary in DailyAttendanceSummary.objects.select_for_update().filter(
+                user_id__in=user_ids, date__range=[min(dates), max(dates)]
+            )
+        }
+        changed, created = [], []
+        now = timezone.now()
+        for user_id, day in sorted(pairs):
+            row = times.get((user_id, day), {})
+            summary = existing.get((user_id, day)) or DailyAttendanceSummary(user_id=user_id, date=day)
+            summary.first_check_in = row.get('first_check_in')
+            summary.last_check_out = row.get('last_check_out')
+            summary.refresh_status()
+            if summary.pk:
+                # bulk_update() skips auto_now
+                summary.updated_at = now
+                changed.append(summary)
+            else:
+                created.append(summary)
+        DailyAttendanceSummary.objects.bulk_update(
+            changed, ['first_check_in', 'last_check_out', 'duration', 'status', 'updated_at']
+        )
+        DailyAttendanceSummary.objects.bulk_create(created)
+    return len(pairs)
+
+
+def rebuild_daily_summaries(start_date=None, end_date=None, user_ids=None, batch_size=1000):
+    """
+    Recompute DailyAttendanceSummary rows from the raw Attendance table.
+
+    Existing summaries inside the requested scope are replaced in a single
+    transaction. Returns the number of summary rows written.
+    """
+    attendance = Attendance.objects.all()
+    summaries = DailyAttendanceSummary.objects.all()
+    if start_date:
+        attendance = attendance.filter(date__gte=start_date)
+        summaries = summaries.filter(date__gte=start_date)
+    if end_date:
+        attendance = attendance.filter(date__lte=end_date)
+        summaries = summaries.filter(date__lte=end_date)
+    if user_ids is not None:
+        attendance = attendance.filter(user_id__in=list(user_ids))
+        summaries = summaries.filter(user_id__in=list(user_ids))
+
+    rows = []
+    for row in summary_rows_from_attendance(attendance).iterator(chunk_size=batch_size):
+        summary = DailyAttendanceSummary(
+            user_id=row['user_id'],
+            date=row['date'],
+            first_check_in=row['first_check_in'],
+            last_check_out=row['last_check_out'],
+        )
+        summary.refresh_status()
+        rows.append(summary)
+
+    with transaction.atomic():
+        summaries.delete()
+        DailyAttendanceSummary.objects.bulk_create(rows, batch_size=batch_size)
+        invalidate_dashboard()
+    return len(rows)
+
+
+def format_duration(duration, pad_minutes=False):
+    """Render a timedelta as '8h 5m' (or '8h 05m' with ``pad_minutes``)"""
+    if duration is None:
+        return None
+    hours, remainder = divmod(duration.total_seconds(), 3600)
+    minutes, _ = divmod(remainder, 60)
+    if pad_minutes:
+        return f"{int(hours)}h {int(minutes):02d}m"
+    return f"{int(hours)}h {int(minutes)}m"
+
+
+def archived_daily_summaries(user, start_date, end_date):
+    """
+    Daily summaries of ``user`` that were moved to the archive, as unsaved
+    DailyAttendanceSummary instances ordered newest first.
+
+    Only days before the retention cutoff can have been archived, so a
+    range inside the retention window does not touch the archive files.
+    """
+    cutoff = ARCHIVE_SPECS['attendance_summary'].cutoff()
+    if start_date >= cutoff:
+        return []
+    end_date = min(end_date, cutoff - timedelta(days=1))
+
+    rows = read_archive(
+        'attendance_summary', start_date, end_date,
+        predicate=lambda row: row['user_id'] == user.pk
+    )
+    summaries = [
+        DailyAttendanceSummary(
+            id=row['id'],
+            user_id=row['user_id'],
+            date=parse_date(row['date']),
+            first_check_in=parse_datetime(row['first_check_in']) if row['first_check_in'] else None,
+            last_check_out=parse_datetime(row['last_check_out']) if row['last_check_out'] else None,
+            duration=parse_duration(row['duration']) if row['duration'] else None,
+            status=row['status'],
+        )
+        for row in rows
+    ]
+    return sorted(summaries, key=lambda summary: summary.date, reverse=True)
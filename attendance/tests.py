@@ -1,3 +1,1400 @@
-from django.test import TestCase
+import csv
+import json
+import os
+import tempfile
+import threading
+import time
+import zipfile
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from importlib import import_module
+from io import BytesIO, StringIO
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
 
-# Create your tests here.
+from django.apps import apps as django_apps
+from django.contrib import admin
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection, connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from core.models import Office, User
+from . import counters, exports, heatmap, kiosk, live, pdf_reports
+from .autoclose import close_open_check_ins
+from .business_calendar import BusinessCalendar, business_calendar, numpy
+from .clocking import clock_in_out, next_action
+from .dashboard import get_admin_dashboard
+from .leaves import materialize_leave_absences, review_leave_requests
+from .models import (
+    Attendance, AttendanceCounter, DailyAttendanceSummary, Holiday, LeaveBalance, LeaveRequest, WeeklyOfficeAttendance,
+)
+from .office_rollups import rebuild_office_weeks, refresh_office_rollups
+from .rollups import rollup_attendance
+from .summaries import mark_absent_pairs, rebuild_daily_summaries, record_attendance
+
+
+class AttendanceQueryPlanTests(TestCase):
+    """The report queries must be answerable from the composite indexes"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(
+            email='staff@example.com', password='pass', first_name='Staff', last_name='Member', role='staff'
+        )
+        today = timezone.now().date()
+        Attendance.objects.bulk_create([
+            Attendance(user=cls.staff, date=today - timedelta(days=offset), attendance_type=attendance_type)
+            for offset in range(30)
+            for attendance_type in (Attendance.CHECK_IN, Attendance.CHECK_OUT)
+        ])
+
+    def composite_indexes(self):
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, Attendance._meta.db_table)
+        return {
+            name for name, info in constraints.items()
+            if info['index'] and info['columns'][:2] in (['user_id', 'date'], ['date', 'attendance_type'])
+        }
+
+    def assertUsesCompositeIndex(self, queryset):
+        plan = queryset.explain()
+        self.assertTrue(
+            any(name in plan for name in self.composite_indexes()),
+            f"Expected a composite attendance index in the query plan, got:\n{plan}"
+        )
+
+    def test_unique_key_is_restored(self):
+        self.assertIn(('user', 'date', 'attendance_type'), Attendance._meta.unique_together)
+        self.assertEqual(len(self.composite_indexes()), 2)
+
+    def test_user_day_lookup_uses_index(self):
+        today = timezone.now().date()
+        self.assertUsesCompositeIndex(
+            Attendance.objects.filter(user=self.staff, date=today, attendance_type=Attendance.CHECK_IN)
+        )
+
+    def test_user_date_range_uses_index(self):
+        today = timezone.now().date()
+        self.assertUsesCompositeIndex(
+            Attendance.objects.filter(user=self.staff, date__range=[today - timedelta(days=7), today])
+        )
+
+    def test_daily_check_in_count_uses_index(self):
+        today = timezone.now().date()
+        self.assertUsesCompositeIndex(
+            Attendance.objects.filter(date=today, attendance_type=Attendance.CHECK_IN).order_by().values('user').distinct()
+        )
+
+    def test_date_range_filter_is_not_wrapped_in_a_function(self):
+        today = timezone.now().date()
+        sql = str(Attendance.objects.filter(date__range=[today - timedelta(days=7), today]).query).lower()
+        self.assertNotIn('django_datetime_cast_date', sql)
+        self.assertNotIn('date(', sql.split('where', 1)[1])
+
+
+class ClockInOutServiceTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(
+            email='clock@example.com', password='pass', first_name='Clock', last_name='User', role='staff'
+        )
+
+    def test_repeated_submits_do_nothing(self):
+        early_check_out = clock_in_out(self.staff, Attendance.CHECK_OUT)
+        first = clock_in_out(self.staff, Attendance.CHECK_IN)
+        repeated = clock_in_out(self.staff, Attendance.CHECK_IN)
+
+        self.assertEqual((early_check_out['action'], early_check_out['message']),
+                         (None, 'You have not checked in today.'))
+        self.assertEqual(first['action'], Attendance.CHECK_IN)
+        self.assertEqual(first['current_status'], 'Checked In')
+        self.assertEqual((repeated['action'], repeated['level']), (None, 'warning'))
+        self.assertEqual(repeated['current_status'], 'Checked In')
+
+        second = clock_in_out(self.staff, Attendance.CHECK_OUT)
+        self.assertEqual(second['action'], Attendance.CHECK_OUT)
+        self.assertEqual(second['current_status'], 'Checked Out')
+        self.assertIsNone(clock_in_out(self.staff, Attendance.CHECK_OUT)['action'])
+        self.assertIsNone(next_action(self.staff))
+        self.assertEqual(Attendance.objects.filter(user=self.staff).count(), 2)
+        self.assertEqual(
+            DailyAttendanceSummary.objects.get(user=self.staff).status, DailyAttendanceSummary.PRESENT
+        )
+
+    def test_ajax_request_returns_new_state(self):
+        self.client.force_login(self.staff)
+        response = self.client.post(
+            reverse('attendance:clock_in_out'), HTTP_X_REQUESTED_WITH='XMLHttpRequest', secure=True
+        )
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(
+            reverse('attendance:clock_in_out'), {'action': Attendance.CHECK_IN},
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest', secure=True
+        )
+
+        self.assertEqual(response.status_code, 200)
+        payload = response.json()
+        self.assertTrue(payload['success'])
+        self.assertEqual(payload['action'], Attendance.CHECK_IN)
+        self.assertEqual(payload['current_status'], 'Checked In')
+        self.assertIsNotNone(payload['check_in'])
+
+
+class ClockInOutConcurrencyTests(TransactionTestCase):
+    """Parallel identical clock-ins (double-clicks, several tabs) must record a single punch"""
+
+    workers = 8
+
+    def setUp(self):
+        self.staff = User.objects.create_user(
+            email='burst@example.com', password='pass', first_name='Burst', last_name='User', role='staff'
+        )
+
+    def punch(self):
+        """
+        One clock-in request. SQLite has no row locks and its shared in-memory
+        test database fails a locked write instead of waiting; the punch then
+        rolled back without writing, so it is sent again like a second click.
+        """
+        for attempt in range(100):
+            try:
+                return clock_in_out(self.staff, Attendance.CHECK_IN)['action']
+            except OperationalError:
+                if connection.vendor != 'sqlite' or attempt == 99:
+                    raise
+                time.sleep(0.01)
+
+    def test_parallel_clock_ins_create_one_check_in(self):
+        barrier = threading.Barrier(self.workers)
+        results, errors = [], []
+
+        def punch():
+            try:
+                barrier.wait()
+                results.append(self.punch())
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=punch) for _ in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        # One request checks in and every other one is told it already did
+        self.assertEqual(results.count(Attendance.CHECK_IN), 1)
+        self.assertEqual(results.count(None), self.workers - 1)
+        self.assertEqual(
+            list(Attendance.objects.filter(user=self.staff).values_list('date', 'attendance_type')),
+            [(timezone.now().date(), Attendance.CHECK_IN)],
+        )
+
+
+@override_settings(ATTENDANCE_KIOSK_TOKEN_SECONDS=30, ATTENDANCE_KIOSK_GRACE_WINDOWS=1)
+class KioskTokenTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.office = Office.objects.create(office_Name='Head Office', office_location='Accra', office_purpose='HQ')
+        cls.other_office = Office.objects.create(office_Name='Branch', office_location='Kumasi', office_purpose='Branch')
+        cls.staff = [
+            User.objects.create_user(
+                email=f'kiosk{index}@example.com', password='pass', first_name='Kiosk', last_name=str(index),
+                role='staff', office=cls.office
+            )
+            for index in range(20)
+        ]
+
+    def test_token_round_trip_and_expiry(self):
+        now = time.time()
+        token = kiosk.make_token(self.office.pk, kiosk.current_window(now))
+
+        self.assertEqual(kiosk.verify_token(token, now=now), self.office.pk)
+        self.assertEqual(kiosk.verify_token(token, now=now + 30), self.office.pk)
+        with self.assertRaises(kiosk.InvalidKioskToken):
+            kiosk.verify_token(token, now=now + 60)
+        with self.assertRaises(kiosk.InvalidKioskToken):
+            kiosk.verify_token(token, now=now - 30)
+
+    def test_forged_tokens_are_rejected(self):
+        office_id, window, signature = kiosk.make_token(self.office.pk).split('.')
+        for token in (
+            f'{self.other_office.pk}.{window}.{signature}',
+            f'{office_id}.{int(window) + 1}.{signature}',
+            f"{office_id}.{window}.{signature[:-1]}{'B' if signature.endswith('A') else 'A'}",
+            'not-a-token',
+            '',
+        ):
+            with self.subTest(token=token), self.assertRaises(kiosk.InvalidKioskToken):
+                kiosk.verify_token(token)
+
+    def test_scan_requires_own_office(self):
+        self.client.force_login(self.staff[0])
+        response = self.client.get(
+            reverse('attendance:kiosk_scan'), {'t': kiosk.make_token(self.other_office.pk)}, secure=True
+        )
+        self.assertEqual(response.status_code, 403)
+        response = self.client.post(
+            reverse('attendance:kiosk_scan'), {'c': kiosk.make_confirmation(self.other_office.pk)}, secure=True
+        )
+
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(Attendance.objects.filter(user=self.staff[0]).exists())
+
+    def test_scan_outlasts_the_code_through_login_and_confirmation(self):
+        scanned_at = time.time()
+        response = self.client.get(reverse('attendance:kiosk_scan'),
+                                   {'t': kiosk.make_token(self.office.pk, kiosk.current_window(scanned_at))},
+                                   secure=True)
+        self.assertEqual(response.status_code, 302)
+        next_url = parse_qs(urlparse(response['Location']).query)['next'][0]
+        confirmation = parse_qs(urlparse(next_url).query)['c'][0]
+
+        # Logging in and reading the page take longer than the code stays valid
+        self.client.force_login(self.staff[0])
+        with mock.patch('time.time', return_value=scanned_at + 240):
+            response = self.client.get(next_url, secure=True)
+            self.assertEqual(response.status_code, 200)
+            self.assertContains(response, f'value="{confirmation}"')
+            self.assertContains(response, f'value="{Attendance.CHECK_IN}"')
+            response = self.client.post(reverse('attendance:kiosk_scan'),
+                                        {'c': confirmation, 'action': Attendance.CHECK_IN}, secure=True)
+        self.assertEqual(response.context['result']['action'], Attendance.CHECK_IN)
+
+        with mock.patch('time.time', return_value=scanned_at + 301):
+            response = self.client.post(reverse('attendance:kiosk_scan'),
+                                        {'c': confirmation, 'action': Attendance.CHECK_OUT}, secure=True)
+        self.assertEqual(response.status_code, 400)
+
+        # The raw code is only good for starting a scan
+        response = self.client.post(reverse('attendance:kiosk_scan'), {'t': kiosk.make_token(self.office.pk)},
+                                    secure=True)
+        self.assertEqual(response.status_code, 400)
+
+    def test_verification_load(self):
+        """Verification is pure CPU: no queries, and thousands of scans per second per core"""
+        now = time.time()
+        window = kiosk.current_window(now)
+        tokens = [kiosk.make_token(office_id, window) for office_id in range(1, 201)] * 50
+
+        with self.assertNumQueries(0):
+            started = time.perf_counter()
+            for token in tokens:
+                kiosk.verify_token(token, now=now)
+            elapsed = time.perf_counter() - started
+
+        self.assertGreater(len(tokens) / elapsed, 1000, f'{len(tokens)} tokens took {elapsed:.3f}s')
+
+    def test_morning_burst_writes_one_check_in_per_employee(self):
+        confirmation = kiosk.make_confirmation(self.office.pk)
+        for member in self.staff:
+            self.client.force_login(member)
+            response = self.client.post(reverse('attendance:kiosk_scan'),
+                                        {'c': confirmation, 'action': Attendance.CHECK_IN}, secure=True)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.context['result']['action'], Attendance.CHECK_IN)
+
+        self.assertEqual(
+            Attendance.objects.filter(user__in=self.staff, attendance_type=Attendance.CHECK_IN).count(),
+            len(self.staff)
+        )
+
+
+class AttendanceCounterTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = [
+            User.objects.create_user(
+                email=f'counter{index}@example.com', password='pass', first_name='Counter', last_name=str(index),
+                role='staff', is_staff=True
+            )
+            for index in range(3)
+        ]
+
+    def setUp(self):
+        self.today = timezone.now().date()
+
+    def stored(self, key):
+        return AttendanceCounter.objects.filter(name=key).values_list('value', flat=True).first()
+
+    def test_counters_are_seeded_then_follow_check_ins(self):
+        Attendance.objects.create(user=self.staff[0], date=self.today, attendance_type=Attendance.CHECK_IN)
+        self.assertEqual((counters.present_today(), counters.total_staff()), (1, 3))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            clock_in_out(self.staff[1], Attendance.CHECK_IN)
+        with self.captureOnCommitCallbacks(execute=True):
+            clock_in_out(self.staff[1], Attendance.CHECK_OUT)
+        self.assertEqual(counters.present_today(), 2)
+        self.assertEqual(self.stored(counters._present_key(self.today)), 2)
+
+    def test_other_changes_drop_the_counters(self):
+        check_in = Attendance.objects.create(user=self.staff[0], date=self.today, attendance_type=Attendance.CHECK_IN)
+        self.assertEqual((counters.present_today(), counters.total_staff()), (1, 3))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            check_in.delete()
+            self.staff[2].is_staff = False
+            self.staff[2].save(update_fields=['is_staff'])
+        self.assertIsNone(self.stored(counters._present_key(self.today)))
+        self.assertEqual((counters.present_today(), counters.total_staff()), (0, 2))
+
+    def test_reconcile_corrects_drift(self):
+        Attendance.objects.create(user=self.staff[0], date=self.today, attendance_type=Attendance.CHECK_IN)
+        AttendanceCounter.objects.create(name=counters._present_key(self.today), value=5)
+        stale = AttendanceCounter.objects.create(name=counters._present_key(self.today - timedelta(days=5)), value=9)
+        AttendanceCounter.objects.filter(pk=stale.pk).update(updated_at=timezone.now() - timedelta(days=5))
+
+        with self.assertLogs('attendance.counters', 'WARNING'):
+            report = counters.reconcile_counters()
+        self.assertEqual(report, {'present_today': (5, 1), 'total_staff': (None, 3)})
+        self.assertEqual(counters.present_today(), 1)
+        self.assertFalse(AttendanceCounter.objects.filter(pk=stale.pk).exists())
+
+        AttendanceCounter.objects.filter(name=counters.TOTAL_STAFF_KEY).update(value=7)
+        out = StringIO()
+        with self.assertLogs('attendance.counters', 'WARNING'):
+            call_command('reconcile_attendance_counters', stdout=out)
+        self.assertIn('total_staff: cached 7, corrected to 3', out.getvalue())
+        self.assertEqual(counters.total_staff(), 3)
+
+
+    def test_increments_add_up_in_the_database(self):
+        self.assertEqual(counters.present_today(), 0)
+
+        # Each increment is one UPDATE ... value + 1, not a read and a write
+        with self.assertNumQueries(1):
+            counters._incr(counters._present_key(self.today))
+        counters._incr(counters._present_key(self.today))
+        self.assertEqual(counters.present_today(), 2)
+
+        # An unseeded counter is not created by an increment; the next read counts
+        counters._incr(counters._present_key(self.today - timedelta(days=1)))
+        self.assertIsNone(self.stored(counters._present_key(self.today - timedelta(days=1))))
+
+
+class BusinessCalendarTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        # Holidays are rolled back without a post_delete, so drop the shared calendar's bitmaps afterwards
+        cls.addClassCleanup(business_calendar.invalidate)
+        Holiday.objects.create(name='New Year', date=date(2023, 1, 1), is_recurring=True)
+        Holiday.objects.create(name='Leap Day Off', date=date(2024, 2, 29), is_recurring=True)
+        Holiday.objects.create(name='Founders Day', date=date(2024, 8, 5))
+        Holiday.objects.create(name='Christmas', date=date(2024, 12, 25), is_recurring=True)
+        cls.holidays = {
+            date(year, 1, 1) for year in (2023, 2024, 2025)
+        } | {date(2024, 2, 29), date(2024, 8, 5), date(2023, 12, 25), date(2024, 12, 25), date(2025, 12, 25)}
+
+    def setUp(self):
+        self.calendar = BusinessCalendar()
+
+    def expected_working_days(self, start_date, end_date):
+        days = (start_date + timedelta(days=offset) for offset in range((end_date - start_date).days + 1))
+        return [day for day in days if day.weekday() < 5 and day not in self.holidays]
+
+    def test_ranges_match_a_day_by_day_count(self):
+        for start_date, end_date in (
+            (date(2024, 1, 1), date(2024, 12, 31)),
+            (date(2023, 12, 20), date(2024, 1, 10)),
+            (date(2023, 3, 1), date(2025, 3, 1)),
+            (date(2024, 2, 28), date(2024, 3, 1)),
+            (date(2025, 2, 28), date(2025, 3, 1)),
+            (date(2024, 8, 5), date(2024, 8, 5)),
+            (date(2024, 8, 6), date(2024, 8, 6)),
+        ):
+            with self.subTest(start_date=start_date, end_date=end_date):
+                expected = self.expected_working_days(start_date, end_date)
+                self.assertEqual(self.calendar.working_days(start_date, end_date), expected)
+                self.assertEqual(self.calendar.count_working_days(start_date, end_date), len(expected))
+        self.assertEqual(self.calendar.count_working_days(date(2024, 3, 1), date(2024, 2, 1)), 0)
+        self.assertFalse(self.calendar.is_working_day(date(2025, 12, 25)))
+        self.assertTrue(self.calendar.is_working_day(date(2025, 12, 24)))
+
+    @override_settings(ATTENDANCE_CALENDAR_BACKEND='numpy')
+    def test_numpy_backend_agrees(self):
+        if numpy is None:
+            self.skipTest('NumPy is not installed')
+        start_date, end_date = date(2023, 3, 1), date(2025, 3, 1)
+        self.assertEqual(self.calendar.count_working_days(start_date, end_date),
+                         len(self.expected_working_days(start_date, end_date)))
+
+    def test_version_key_is_read_once_per_interval(self):
+        self.calendar.count_working_days(date(2024, 1, 1), date(2024, 12, 31))
+        with self.assertNumQueries(0):
+            for month in range(1, 13):
+                self.calendar.is_working_day(date(2024, month, 1))
+
+    @override_settings(ATTENDANCE_CALENDAR_CHECK_SECONDS=0)
+    def test_other_process_invalidation_is_picked_up(self):
+        self.assertTrue(self.calendar.is_working_day(date(2024, 8, 6)))
+        # Written without signals, then announced by another process
+        Holiday.objects.bulk_create([Holiday(name='Extra', date=date(2024, 8, 6))])
+        self.assertTrue(self.calendar.is_working_day(date(2024, 8, 6)))
+
+        BusinessCalendar().invalidate()
+        self.assertFalse(self.calendar.is_working_day(date(2024, 8, 6)))
+
+    def test_years_expire_after_the_ttl(self):
+        self.assertTrue(self.calendar.is_working_day(date(2024, 8, 6)))
+        Holiday.objects.bulk_create([Holiday(name='Extra', date=date(2024, 8, 6))])
+
+        with override_settings(ATTENDANCE_CALENDAR_TTL=0):
+            self.assertFalse(self.calendar.is_working_day(date(2024, 8, 6)))
+
+
+class AttendancePdfReportTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.office = Office.objects.create(office_Name='Head Office', office_location='Accra', office_purpose='HQ')
+        cls.admin = User.objects.create_superuser(
+            email='pdfadmin@example.com', password='pass', first_name='Pdf', last_name='Admin'
+        )
+        cls.staff = [
+            User.objects.create_user(
+                email=f'pdf{index}@example.com', password='pass', first_name='Pdf', last_name=str(index),
+                role='staff', is_staff=True, office=cls.office
+            )
+            for index in range(2)
+        ]
+        Attendance.objects.create(user=cls.staff[0], date=date(2024, 3, 4), attendance_type=Attendance.CHECK_IN)
+
+    def setUp(self):
+        # Rendered PDFs outlive the test's transaction in a cache that is not database-backed
+        reports = pdf_reports.staff_reports(self.staff, 2024, 3)
+        cache.delete_many([pdf_reports.cache_key(member.pk, 2024, 3, reports[member.pk]) for member in self.staff])
+
+    def download(self, status_code=200):
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('attendance:attendance_report_pdf'),
+                                   {'month': '2024-03', 'office': self.office.pk}, secure=True)
+        self.assertEqual(response.status_code, status_code)
+        if status_code != 200:
+            return response.content.decode()
+        with zipfile.ZipFile(BytesIO(b''.join(response.streaming_content))) as archive:
+            return {name: archive.read(name) for name in archive.namelist()}
+
+    def test_office_zip_renders_inline_then_from_cache(self):
+        with mock.patch('attendance.pdf_reports.ProcessPoolExecutor', side_effect=AssertionError('pool in a view')), \
+                mock.patch('attendance.pdf_reports.render_staff_pdf', wraps=pdf_reports.render_staff_pdf) as render:
+            files = self.download()
+            self.assertEqual(render.call_count, 2)
+            self.assertEqual(self.download(), files)
+            self.assertEqual(render.call_count, 2)
+
+        self.assertEqual(sorted(files), sorted(pdf_reports.report_filename(member, 2024, 3) for member in self.staff))
+        self.assertTrue(all(pdf.startswith(b'%PDF') for pdf in files.values()))
+
+    def test_download_only_renders_a_few_pdfs_itself(self):
+        with override_settings(ATTENDANCE_PDF_MAX_INLINE_RENDERS=1):
+            self.assertIn('attendance_pdf_reports --month 2024-03', self.download(status_code=400))
+
+            # Once the command has filled the cache the download is served from it
+            with tempfile.TemporaryDirectory() as output:
+                call_command('attendance_pdf_reports', month='2024-03', output=output, workers=1, stdout=StringIO())
+            self.assertEqual(len(self.download()), 2)
+
+    def test_command_renders_with_a_process_pool(self):
+        with tempfile.TemporaryDirectory() as output:
+            call_command('attendance_pdf_reports', month='2024-03', office=self.office.pk, output=output,
+                         workers=2, stdout=StringIO())
+            self.assertEqual(sorted(os.listdir(output)),
+                             sorted(pdf_reports.report_filename(member, 2024, 3) for member in self.staff))
+
+
+class AttendanceExportTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = [
+            User.objects.create_user(
+                email=f'export{index}@example.com', password='pass', first_name='Export', last_name=name,
+                role='staff', is_staff=True
+            )
+            for index, name in enumerate(('Cole', 'Able', 'Baker'))
+        ]
+        cls.leaves = [
+            LeaveRequest.objects.create(user=cls.staff[0], start_date=date(2024, 5, day), end_date=date(2024, 5, day),
+                                        reason=reason, response_notes=notes)
+            for day, reason, notes in (
+                (6, 'Family event', None),
+                (7, '=HYPERLINK("https://example.com","x")', '-2+3'),
+                (8, '@SUM(A1:A9)', '+1'),
+                (9, 'Doctor', 'Fine'),
+                (10, 'Trip', ''),
+            )
+        ]
+        for member in cls.staff:
+            for day in (1, 2):
+                DailyAttendanceSummary.objects.create(user=member, date=date(2024, 5, day),
+                                                      status=DailyAttendanceSummary.ABSENT)
+
+    def csv_rows(self, response):
+        return list(csv.reader(line.decode('utf-8') for line in response.streaming_content))
+
+    def test_leave_export_pages_newest_first_and_escapes_formulas(self):
+        self.client.force_login(self.staff[0])
+        with mock.patch('attendance.exports.EXPORT_CHUNK_SIZE', 2):
+            response = self.client.get(reverse('attendance:my_leave_requests'), {'export': 'csv'}, secure=True)
+        rows = self.csv_rows(response)
+
+        self.assertEqual(rows[0][0], 'Staff')
+        self.assertEqual([row[3] for row in rows[1:]], [f'2024-05-{day:02d}' for day in (10, 9, 8, 7, 6)])
+        self.assertEqual(rows[3][7], "'@SUM(A1:A9)")
+        self.assertEqual(rows[3][11], "'+1")
+        self.assertEqual(rows[4][7], '\'=HYPERLINK("https://example.com","x")')
+        self.assertEqual(rows[4][11], "'-2+3")
+        self.assertEqual(rows[2][7], 'Doctor')
+
+    def test_daily_export_keeps_the_staff_order_across_pages(self):
+        order = [self.staff[1], self.staff[2], self.staff[0]]
+        with mock.patch('attendance.exports.EXPORT_CHUNK_SIZE', 2), self.assertNumQueries(3):
+            rows = list(exports.daily_attendance_rows(date(2024, 5, 1), date(2024, 5, 2), order))
+
+        self.assertEqual([(row[2], row[0]) for row in rows[1:]], [
+            (member.email, f'2024-05-0{day}') for member in order for day in (1, 2)
+        ])
+
+
+class AttendanceHistoryArchiveTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(
+            email='history@example.com', password='pass', first_name='History', last_name='User', role='staff'
+        )
+
+    def history(self, start_date, end_date):
+        self.client.force_login(self.staff)
+        return self.client.get(reverse('attendance:history'),
+                               {'start_date': start_date.isoformat(), 'end_date': end_date.isoformat()}, secure=True)
+
+    @override_settings(ARCHIVE_RETENTION={'attendance_summary': 365})
+    def test_archive_is_read_only_past_the_retention_window(self):
+        today = timezone.now().date()
+        with mock.patch('attendance.summaries.read_archive', return_value=iter(())) as read_archive:
+            self.assertEqual(self.history(today - timedelta(days=30), today).status_code, 200)
+            read_archive.assert_not_called()
+
+            self.assertEqual(self.history(today - timedelta(days=500), today - timedelta(days=200)).status_code, 200)
+            read_archive.assert_called_once()
+            self.assertEqual(read_archive.call_args.args[1:],
+                             (today - timedelta(days=500), today - timedelta(days=366)))
+
+
+class AttendanceHistoryApiTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(
+            email='sync@example.com', password='pass', first_name='Sync', last_name='User', role='staff'
+        )
+
+    def setUp(self):
+        self.client.force_login(self.staff)
+
+    def sync(self, cursor):
+        response = self.client.get(reverse('attendance:history_api'), {'after': cursor, 'limit': 2}, secure=True)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def punch(self, day, hour, attendance_type):
+        record_attendance(Attendance.objects.create(
+            user=self.staff, date=date(2024, 5, day), attendance_type=attendance_type,
+            timestamp=datetime(2024, 5, day, hour, tzinfo=dt_timezone.utc),
+        ))
+
+    def test_sync_sends_days_again_once_they_change(self):
+        for day in (6, 7, 8):
+            self.punch(day, 9, Attendance.CHECK_IN)
+
+        page = self.sync('0')
+        self.assertEqual([day['date'] for day in page['days']], ['2024-05-06', '2024-05-07'])
+        self.assertTrue(page['has_more'])
+        page = self.sync(page['next_cursor'])
+        self.assertEqual([day['date'] for day in page['days']], ['2024-05-08'])
+        cursor = page['next_cursor']
+        page = self.sync(cursor)
+        self.assertEqual((page['days'], page['next_cursor']), ([], cursor))
+
+        # The check-out of the last synced day and a day filled in later both come through
+        self.punch(8, 17, Attendance.CHECK_OUT)
+        self.punch(3, 9, Attendance.CHECK_IN)
+        page = self.sync(cursor)
+        self.assertEqual([(day['date'], day['status']) for day in page['days']], [
+            ('2024-05-08', DailyAttendanceSummary.PRESENT), ('2024-05-03', DailyAttendanceSummary.CHECKED_IN_ONLY),
+        ])
+
+    def test_paging_back_by_date_and_bad_cursors(self):
+        for day in (6, 7, 8):
+            self.punch(day, 9, Attendance.CHECK_IN)
+
+        page = self.client.get(reverse('attendance:history_api'), {'before': '2024-05-08', 'limit': 1},
+                               secure=True).json()
+        self.assertEqual(([day['date'] for day in page['days']], page['next_cursor']), (['2024-05-07'], '2024-05-07'))
+
+        for params in ({'after': '2024-05-06'}, {'after': 'x'}, {'before': '05/06/2024'}):
+            with self.subTest(params=params):
+                response = self.client.get(reverse('attendance:history_api'), params, secure=True)
+                self.assertEqual(response.status_code, 400)
+
+class LeaveBalanceTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reviewer = User.objects.create_user(
+            email='reviewer@example.com', password='pass', first_name='Leave', last_name='Reviewer', is_staff=True
+        )
+        cls.staff = [
+            User.objects.create_user(
+                email=f'leave{index}@example.com', password='pass', first_name='Leave', last_name=str(index),
+                role='staff'
+            )
+            for index in range(3)
+        ]
+
+    def balance(self, user, year=2024, leave_type='annual'):
+        return tuple(LeaveBalance.objects.filter(user=user, year=year, leave_type=leave_type)
+                     .values_list('used_days', 'pending_days').get())
+
+    def request_leave(self, user, start_date=date(2024, 5, 6), end_date=date(2024, 5, 10), **fields):
+        return LeaveRequest.objects.create(user=user, start_date=start_date, end_date=end_date,
+                                           reason='Rest', **fields)
+
+    def test_balances_follow_request_changes(self):
+        leave = self.request_leave(self.staff[0])
+        self.assertEqual(self.balance(self.staff[0]), (0, 5))
+
+        leave.status = LeaveRequest.APPROVED
+        leave.save()
+        self.assertEqual(self.balance(self.staff[0]), (5, 0))
+
+        leave.end_date = date(2024, 5, 7)
+        leave.save()
+        self.assertEqual(self.balance(self.staff[0]), (2, 0))
+
+        leave.delete()
+        self.assertEqual(self.balance(self.staff[0]), (0, 0))
+
+    def test_request_spanning_new_year_counts_in_both_years(self):
+        self.request_leave(self.staff[0], date(2024, 12, 30), date(2025, 1, 3), status=LeaveRequest.APPROVED)
+
+        self.assertEqual(self.balance(self.staff[0], 2024), (2, 0))
+        self.assertEqual(self.balance(self.staff[0], 2025), (3, 0))
+
+    def test_bulk_review_runs_the_same_queries_for_any_batch(self):
+        def review(users):
+            leaves = [self.request_leave(user, leave_type=leave_type)
+                      for user in users for leave_type in ('annual', 'sick')]
+            with CaptureQueriesContext(connection) as queries:
+                reviewed = review_leave_requests(LeaveRequest.objects.filter(pk__in=[leave.pk for leave in leaves]),
+                                                 LeaveRequest.APPROVED, self.reviewer)
+            self.assertEqual(reviewed, len(leaves))
+            return len(queries)
+
+        self.assertEqual(review(self.staff[:1]), review(self.staff[1:]))
+        for user in self.staff:
+            self.assertEqual(self.balance(user), (5, 0))
+            self.assertEqual(self.balance(user, leave_type='sick'), (5, 0))
+
+    def test_second_review_of_the_same_requests_changes_nothing(self):
+        leave = self.request_leave(self.staff[0])
+        selected = LeaveRequest.objects.filter(pk=leave.pk)
+
+        self.assertEqual(review_leave_requests(selected, LeaveRequest.APPROVED, self.reviewer), 1)
+        self.assertEqual(review_leave_requests(selected, LeaveRequest.APPROVED, self.reviewer), 0)
+        self.assertEqual(review_leave_requests(selected, LeaveRequest.REJECTED, self.reviewer), 0)
+
+        self.assertEqual(self.balance(self.staff[0]), (5, 0))
+        self.assertEqual(Attendance.objects.filter(user=self.staff[0], attendance_type=Attendance.ABSENT).count(), 5)
+
+    def test_rebuild_restores_drifted_balances(self):
+        self.request_leave(self.staff[0], status=LeaveRequest.APPROVED)
+        self.request_leave(self.staff[1])
+        LeaveBalance.objects.filter(user=self.staff[0]).update(used_days=11, entitled_days=25)
+        LeaveBalance.objects.filter(user=self.staff[1]).delete()
+        LeaveBalance.objects.create(user=self.staff[2], year=2024, leave_type='annual', used_days=3)
+
+        out = StringIO()
+        call_command('rebuild_leave_balances', stdout=out)
+
+        self.assertIn('Rebuilt 2 leave balances.', out.getvalue())
+        self.assertEqual(self.balance(self.staff[0]), (5, 0))
+        self.assertEqual(LeaveBalance.objects.get(user=self.staff[0]).entitled_days, 25)
+        self.assertEqual(self.balance(self.staff[1]), (0, 5))
+        self.assertEqual(self.balance(self.staff[2]), (0, 0))
+
+
+    def test_cancelling_a_request_the_ledger_never_counted(self):
+        leave = self.request_leave(self.staff[0], status=LeaveRequest.APPROVED)
+        LeaveBalance.objects.all().delete()
+
+        leave.status = LeaveRequest.CANCELLED
+        leave.save()
+
+        self.assertEqual(self.balance(self.staff[0]), (0, 0))
+
+    def test_seeding_only_runs_on_an_empty_ledger(self):
+        self.request_leave(self.staff[0], status=LeaveRequest.APPROVED)
+        LeaveBalance.objects.all().delete()
+
+        call_command('rebuild_leave_balances', if_empty=True, stdout=StringIO())
+        self.assertEqual(self.balance(self.staff[0]), (5, 0))
+
+        LeaveBalance.objects.update(used_days=11)
+        out = StringIO()
+        call_command('rebuild_leave_balances', if_empty=True, stdout=out)
+        self.assertIn('nothing to seed', out.getvalue())
+        self.assertEqual(self.balance(self.staff[0]), (11, 0))
+
+class PunchImportTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.first = User.objects.create_user(
+            email='import1@example.com', password='pass', first_name='Import', last_name='One', role='staff'
+        )
+        cls.second = User.objects.create_user(
+            email='import2@example.com', password='pass', first_name='Import', last_name='Two', role='staff'
+        )
+        Attendance.objects.create(user=cls.first, date=date(2024, 5, 6), attendance_type=Attendance.CHECK_IN,
+                                  timestamp=datetime(2024, 5, 6, 8, 30, tzinfo=dt_timezone.utc))
+
+    def run_import(self, *args):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as csv_file:
+            csv_file.write('email,timestamp,type\n'
+                           'import1@example.com,2024-05-06 08:00,in\n'
+                           'IMPORT1@example.com,2024-05-06 07:55,check_in\n'
+                           'import1@example.com,2024-05-06 17:00,out\n'
+                           'import2@example.com,2024-05-06 09:00,in\n'
+                           'import2@example.com,2024-05-06 09:10,in\n'
+                           'nobody@example.com,2024-05-06 09:00,in\n')
+        self.addCleanup(os.remove, csv_file.name)
+        out, err = StringIO(), StringIO()
+        call_command('import_attendance_csv', csv_file.name, '--timezone', 'UTC', *args, stdout=out, stderr=err)
+        self.assertIn('Line 7: unknown user', err.getvalue())
+        return out.getvalue()
+
+    def first_check_in(self):
+        return Attendance.objects.get(user=self.first, attendance_type=Attendance.CHECK_IN).timestamp
+
+    def test_existing_punches_are_kept_and_not_counted_as_written(self):
+        output = self.run_import()
+
+        self.assertIn('2 punches written, 0 replaced, 1 already recorded and kept, 2 duplicates merged, 1 rejected',
+                      output)
+        self.assertEqual(self.first_check_in(), datetime(2024, 5, 6, 8, 30, tzinfo=dt_timezone.utc))
+        self.assertEqual(Attendance.objects.count(), 3)
+        self.assertEqual(DailyAttendanceSummary.objects.get(user=self.first).status, DailyAttendanceSummary.PRESENT)
+
+    def test_replace_overwrites_existing_punches(self):
+        self.assertIn('2 punches written, 1 replaced, 0 already recorded', self.run_import('--replace', '--dry-run'))
+        self.assertEqual(Attendance.objects.count(), 1)
+
+        self.assertIn('2 punches written, 1 replaced, 0 already recorded', self.run_import('--replace'))
+        self.assertEqual(self.first_check_in(), datetime(2024, 5, 6, 7, 55, tzinfo=dt_timezone.utc))
+
+        self.assertIn('0 punches written, 3 replaced', self.run_import('--replace'))
+        self.assertEqual(Attendance.objects.count(), 3)
+
+
+class LeaveAbsenceTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reviewer = User.objects.create_user(
+            email='absence-reviewer@example.com', password='pass', first_name='Absence', last_name='Reviewer',
+            is_staff=True
+        )
+        cls.staff = User.objects.create_user(
+            email='absence@example.com', password='pass', first_name='Absence', last_name='Staff', role='staff'
+        )
+
+    def request_leave(self, start_date, end_date, **fields):
+        return LeaveRequest.objects.create(user=self.staff, start_date=start_date, end_date=end_date,
+                                           reason='Rest', **fields)
+
+    def absences(self):
+        return list(Attendance.objects.filter(user=self.staff, attendance_type=Attendance.ABSENT)
+                    .order_by('date').values_list('date', 'notes'))
+
+    def test_batch_writes_working_days_and_later_requests_win(self):
+        Attendance.objects.create(user=self.staff, date=date(2024, 5, 9), attendance_type=Attendance.ABSENT,
+                                  notes='Stale')
+        # bulk_create() skips save(), which would materialize each request on its own
+        first, second = LeaveRequest.objects.bulk_create([
+            LeaveRequest(user=self.staff, start_date=date(2024, 5, 9), end_date=date(2024, 5, 13),
+                         status=LeaveRequest.APPROVED, leave_type='annual', reason='Rest'),
+            LeaveRequest(user=self.staff, start_date=date(2024, 5, 13), end_date=date(2024, 5, 14),
+                         status=LeaveRequest.APPROVED, leave_type='sick', reason='Rest'),
+        ])
+
+        with self.assertNumQueries(7):
+            self.assertEqual(materialize_leave_absences([first, second]), 4)
+
+        self.assertEqual(self.absences(), [
+            (date(2024, 5, 9), 'On approved Annual Leave: Rest'),
+            (date(2024, 5, 10), 'On approved Annual Leave: Rest'),
+            (date(2024, 5, 13), 'On approved Sick Leave: Rest'),
+            (date(2024, 5, 14), 'On approved Sick Leave: Rest'),
+        ])
+        self.assertEqual(
+            set(DailyAttendanceSummary.objects.filter(user=self.staff).values_list('date', 'status')),
+            {(day, DailyAttendanceSummary.ABSENT) for day, _ in self.absences()},
+        )
+
+    def test_approval_and_absences_commit_together(self):
+        leave = self.request_leave(date(2024, 5, 6), date(2024, 5, 10))
+        leave.status = LeaveRequest.APPROVED
+
+        with mock.patch('attendance.leaves.mark_absent_pairs', side_effect=RuntimeError('summary write failed')):
+            with self.assertRaises(RuntimeError):
+                leave.save()
+
+        self.assertEqual(LeaveRequest.objects.get(pk=leave.pk).status, LeaveRequest.PENDING)
+        self.assertEqual(self.absences(), [])
+        self.assertEqual(LeaveBalance.objects.values_list('used_days', 'pending_days').get(), (0, 5))
+
+    def test_status_change_is_detected_from_the_loaded_row(self):
+        created = self.request_leave(date(2024, 5, 6), date(2024, 5, 10), status=LeaveRequest.APPROVED)
+        self.assertIsNone(created.reviewed_at)
+
+        leave = LeaveRequest.objects.get(pk=self.request_leave(date(2024, 6, 3), date(2024, 6, 4)).pk)
+        self.assertEqual(leave._loaded_status, LeaveRequest.PENDING)
+        leave.response_notes = 'Noted'
+        leave.save()
+        self.assertIsNone(leave.reviewed_at)
+
+        leave.status = LeaveRequest.REJECTED
+        leave.save()
+        self.assertIsNotNone(LeaveRequest.objects.get(pk=leave.pk).reviewed_at)
+        self.assertEqual(LeaveBalance.objects.values_list('used_days', 'pending_days').get(), (5, 0))
+
+    def test_deferred_load_still_moves_the_balance(self):
+        pk = self.request_leave(date(2024, 5, 6), date(2024, 5, 10)).pk
+
+        leave = LeaveRequest.objects.only('pk', 'status').get(pk=pk)
+        leave.status = LeaveRequest.APPROVED
+        leave.save()
+
+        self.assertEqual(LeaveBalance.objects.values_list('used_days', 'pending_days').get(), (5, 0))
+        self.assertEqual(len(self.absences()), 5)
+
+
+def per_record_rollup(user, start_date, end_date):
+    """The per-user Attendance loops the rollup replaced, kept as the reference"""
+    records = Attendance.objects.filter(user=user, timestamp__date__range=[start_date, end_date]).order_by('timestamp')
+    daily_hours = {}
+    for record in records:
+        times = daily_hours.setdefault(record.timestamp.date(), {'check_in': None, 'check_out': None})
+        if record.attendance_type in times:
+            times[record.attendance_type] = record.timestamp
+    pairs = [times for times in daily_hours.values() if times['check_in'] and times['check_out']]
+    return {
+        'checked_in_days': records.filter(attendance_type='check_in').values('timestamp__date').distinct().count(),
+        'present_days': len(pairs),
+        'hours_per_day': [(times['check_out'] - times['check_in']).total_seconds() / 3600 for times in pairs],
+        'last_activity': records.last().timestamp if records.exists() else None,
+    }
+
+
+class AttendanceRollupTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = [
+            User.objects.create_user(
+                email=f'rollup{index}@example.com', password='pass', first_name='Rollup', last_name=str(index),
+                role='staff', is_staff=True
+            )
+            for index in range(2)
+        ]
+
+        def at(day, hour):
+            return datetime(2024, 5, day, hour, tzinfo=dt_timezone.utc)
+
+        Attendance.objects.bulk_create([
+            Attendance(user=cls.staff[0], date=at(day, hour).date(), timestamp=at(day, hour), attendance_type=kind)
+            for day, hour, kind in (
+                (6, 9, Attendance.CHECK_IN), (6, 17, Attendance.CHECK_OUT),
+                # Check-out recorded before the check-in
+                (7, 12, Attendance.CHECK_IN), (7, 10, Attendance.CHECK_OUT),
+                (8, 9, Attendance.CHECK_IN),
+                (9, 17, Attendance.CHECK_OUT),
+                (10, 12, Attendance.ABSENT),
+            )
+        ])
+        rebuild_daily_summaries()
+
+    def test_matches_the_per_record_computation(self):
+        start_date, end_date = date(2024, 5, 1), date(2024, 5, 31)
+        rollup = rollup_attendance(start_date, end_date, self.staff)
+
+        for member in self.staff:
+            with self.subTest(member=member.email):
+                reference = per_record_rollup(member, start_date, end_date)
+                totals = rollup[member.pk]
+                self.assertEqual(totals['checked_in_days'], reference['checked_in_days'])
+                self.assertEqual(totals['present_days'], reference['present_days'])
+                self.assertEqual(totals['last_activity'], reference['last_activity'])
+                self.assertEqual(totals['total_days'], 31)
+                # Days with the check-out before the check-in no longer subtract hours
+                self.assertEqual(totals['total_hours'], sum(hours for hours in reference['hours_per_day'] if hours > 0))
+
+        self.assertEqual((rollup[self.staff[0].pk]['present_days'], rollup[self.staff[0].pk]['total_hours']), (2, 8))
+        self.assertEqual(rollup[self.staff[0].pk]['last_activity'], datetime(2024, 5, 10, 12, tzinfo=dt_timezone.utc))
+
+
+class DailySummaryTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = [
+            User.objects.create_user(
+                email=f'summary{index}@example.com', password='pass', first_name='Summary', last_name=str(index),
+                role='staff'
+            )
+            for index in range(2)
+        ]
+
+    @staticmethod
+    def at(day, hour):
+        return datetime(2024, 5, day, hour, tzinfo=dt_timezone.utc)
+
+    def punch(self, user, day, hour, attendance_type):
+        return Attendance.objects.create(user=user, date=date(2024, 5, day), timestamp=self.at(day, hour),
+                                         attendance_type=attendance_type)
+
+    def test_record_attendance_folds_punches_into_the_day(self):
+        summary = record_attendance(self.punch(self.staff[0], 6, 9, Attendance.CHECK_IN))
+        self.assertEqual((summary.status, summary.duration), (DailyAttendanceSummary.CHECKED_IN_ONLY, None))
+
+        summary = record_attendance(self.punch(self.staff[0], 6, 17, Attendance.CHECK_OUT))
+        self.assertEqual((summary.status, summary.duration), (DailyAttendanceSummary.PRESENT, timedelta(hours=8)))
+
+        summary = record_attendance(self.punch(self.staff[1], 6, 10, Attendance.CHECK_OUT))
+        self.assertEqual(summary.status, DailyAttendanceSummary.CHECKED_OUT_ONLY)
+        summary = record_attendance(self.punch(self.staff[1], 6, 12, Attendance.CHECK_IN))
+        self.assertEqual((summary.status, summary.duration), (DailyAttendanceSummary.INVALID_TIMES, None))
+        self.assertEqual(DailyAttendanceSummary.objects.count(), 2)
+
+    def test_record_attendance_keeps_the_earliest_check_in_and_latest_check_out(self):
+        summary = record_attendance(self.punch(self.staff[0], 6, 9, Attendance.CHECK_IN))
+        summary = record_attendance(self.punch(self.staff[0], 6, 18, Attendance.CHECK_OUT))
+        # Rows arriving late (imports, manual fixes) only widen the day
+        for hour, attendance_type in ((10, Attendance.CHECK_IN), (17, Attendance.CHECK_OUT)):
+            summary = record_attendance(Attendance(user=self.staff[0], date=date(2024, 5, 6),
+                                                   timestamp=self.at(6, hour), attendance_type=attendance_type))
+
+        self.assertEqual((summary.first_check_in, summary.last_check_out), (self.at(6, 9), self.at(6, 18)))
+        self.assertEqual(summary.duration, timedelta(hours=9))
+
+    def test_mark_absent_pairs_only_adds_missing_days(self):
+        record_attendance(self.punch(self.staff[0], 6, 9, Attendance.CHECK_IN))
+        pairs = [(member.pk, date(2024, 5, day)) for member in self.staff for day in (6, 7)]
+
+        with self.assertNumQueries(2):
+            self.assertEqual(mark_absent_pairs(pairs + pairs), 3)
+
+        self.assertEqual(mark_absent_pairs(pairs), 0)
+        statuses = dict(DailyAttendanceSummary.objects.filter(user=self.staff[0]).values_list('date', 'status'))
+        self.assertEqual(statuses, {date(2024, 5, 6): DailyAttendanceSummary.CHECKED_IN_ONLY,
+                                    date(2024, 5, 7): DailyAttendanceSummary.ABSENT})
+
+    def test_rebuild_replaces_the_summaries_in_scope(self):
+        for member in self.staff:
+            self.punch(member, 6, 9, Attendance.CHECK_IN)
+            self.punch(member, 6, 17, Attendance.CHECK_OUT)
+            self.punch(member, 7, 9, Attendance.CHECK_IN)
+        DailyAttendanceSummary.objects.all().delete()
+        DailyAttendanceSummary.objects.create(user=self.staff[0], date=date(2024, 5, 6),
+                                              status=DailyAttendanceSummary.ABSENT)
+        DailyAttendanceSummary.objects.create(user=self.staff[0], date=date(2024, 5, 8),
+                                              status=DailyAttendanceSummary.PRESENT)
+
+        out = StringIO()
+        call_command('rebuild_attendance_summaries', '--start-date', '2024-05-06', '--end-date', '2024-05-08',
+                     '--user', str(self.staff[0].pk), stdout=out)
+
+        self.assertIn('Rebuilt 2 daily attendance summaries.', out.getvalue())
+        self.assertEqual(
+            sorted(DailyAttendanceSummary.objects.values_list('user_id', 'date', 'status', 'duration')),
+            [(self.staff[0].pk, date(2024, 5, 6), DailyAttendanceSummary.PRESENT, timedelta(hours=8)),
+             (self.staff[0].pk, date(2024, 5, 7), DailyAttendanceSummary.CHECKED_IN_ONLY, None)],
+        )
+
+        self.assertEqual(rebuild_daily_summaries(), 4)
+        self.assertEqual(DailyAttendanceSummary.objects.filter(user=self.staff[1]).count(), 2)
+
+    def test_migration_backfills_days_without_a_summary(self):
+        self.punch(self.staff[0], 6, 9, Attendance.CHECK_IN)
+        self.punch(self.staff[0], 6, 17, Attendance.CHECK_OUT)
+        self.punch(self.staff[1], 6, 9, Attendance.CHECK_IN)
+        DailyAttendanceSummary.objects.all().delete()
+        DailyAttendanceSummary.objects.create(user=self.staff[1], date=date(2024, 5, 6),
+                                              status=DailyAttendanceSummary.ABSENT)
+
+        migration = import_module('attendance.migrations.0008_backfill_daily_summaries')
+        migration.backfill_daily_summaries(django_apps, None)
+
+        self.assertEqual(
+            sorted(DailyAttendanceSummary.objects.values_list('user_id', 'status', 'duration')),
+            [(self.staff[0].pk, DailyAttendanceSummary.PRESENT, timedelta(hours=8)),
+             (self.staff[1].pk, DailyAttendanceSummary.ABSENT, None)],
+        )
+
+    def test_admin_changes_resync_the_day(self):
+        model_admin = admin.site._registry[Attendance]
+        check_in = self.punch(self.staff[0], 6, 9, Attendance.CHECK_IN)
+        check_out = self.punch(self.staff[0], 6, 17, Attendance.CHECK_OUT)
+        record_attendance(check_in)
+        record_attendance(check_out)
+
+        check_out.timestamp = self.at(6, 15)
+        model_admin.save_model(None, check_out, None, change=True)
+        summary = DailyAttendanceSummary.objects.get(user=self.staff[0], date=date(2024, 5, 6))
+        self.assertEqual((summary.status, summary.duration), (DailyAttendanceSummary.PRESENT, timedelta(hours=6)))
+
+        # Moving the punch to another day fixes both days
+        check_out.date = date(2024, 5, 7)
+        model_admin.save_model(None, check_out, None, change=True)
+        self.assertEqual(
+            sorted(DailyAttendanceSummary.objects.values_list('date', 'status')),
+            [(date(2024, 5, 6), DailyAttendanceSummary.CHECKED_IN_ONLY),
+             (date(2024, 5, 7), DailyAttendanceSummary.CHECKED_OUT_ONLY)],
+        )
+
+        model_admin.delete_queryset(None, Attendance.objects.filter(user=self.staff[0]))
+        self.assertEqual(set(DailyAttendanceSummary.objects.values_list('status', 'first_check_in', 'last_check_out')),
+                         {(DailyAttendanceSummary.ABSENT, None, None)})
+
+    def test_rebuild_command_rejects_bad_dates(self):
+        for args in (['--start-date', '2024-13-01'], ['--start-date', '2024-05-08', '--end-date', '2024-05-01']):
+            with self.subTest(args=args), self.assertRaises(CommandError):
+                call_command('rebuild_attendance_summaries', *args, stdout=StringIO())
+
+
+# Query counts below are about the model queries, not a database-backed cache
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class AdminDashboardCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(
+            email='dashboard@example.com', password='pass', first_name='Dash', last_name='Board',
+            role='staff', is_staff=True
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.today = timezone.now().date()
+
+    def test_served_from_cache_until_a_change_commits(self):
+        data = get_admin_dashboard(self.today)
+        self.assertEqual((data['today_attendance_count'], data['total_staff']), (0, 1))
+        with self.assertNumQueries(0):
+            get_admin_dashboard(self.today)
+
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            Attendance.objects.create(user=self.staff, date=self.today, attendance_type=Attendance.CHECK_IN)
+        # Not committed yet: the cached entry is still served
+        self.assertEqual(get_admin_dashboard(self.today)['today_attendance_count'], 0)
+
+        for callback in callbacks:
+            callback()
+        data = get_admin_dashboard(self.today)
+        self.assertEqual(data['today_attendance_count'], 1)
+        self.assertEqual([checkin.user_id for checkin in data['recent_checkins']], [self.staff.pk])
+        self.assertEqual(data['staff_attendance'][0]['last_check_in'], data['recent_checkins'][0].timestamp)
+
+    def test_leave_and_holiday_changes_refresh_the_entry(self):
+        get_admin_dashboard(self.today)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            leave = LeaveRequest.objects.create(user=self.staff, start_date=self.today + timedelta(days=7),
+                                                end_date=self.today + timedelta(days=7), reason='Rest')
+            Holiday.objects.create(name='Founders Day', date=self.today + timedelta(days=3))
+        data = get_admin_dashboard(self.today)
+        self.assertEqual([request.pk for request in data['pending_requests']], [leave.pk])
+        self.assertEqual([holiday.name for holiday in data['upcoming_holidays']], ['Founders Day'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Holiday.objects.all().delete()
+        self.assertEqual(get_admin_dashboard(self.today)['upcoming_holidays'], [])
+
+    def test_new_day_gets_a_new_entry(self):
+        get_admin_dashboard(self.today)
+        tomorrow = get_admin_dashboard(self.today + timedelta(days=1))
+        self.assertEqual(tomorrow['today'], self.today + timedelta(days=1))
+        self.assertEqual(tomorrow['start_of_week'], tomorrow['today'] - timedelta(days=tomorrow['today'].weekday()))
+
+
+class AttendanceHeatmapTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.addClassCleanup(business_calendar.invalidate)
+        Holiday.objects.create(name='Founders Day', date=date(2024, 5, 8))
+        cls.staff = [
+            User.objects.create_user(
+                email=f'heatmap{index}@example.com', password='pass', first_name='Heatmap', last_name=str(index),
+                role='staff', is_staff=True
+            )
+            for index in range(2)
+        ]
+        for day, status in ((6, DailyAttendanceSummary.PRESENT), (7, DailyAttendanceSummary.CHECKED_IN_ONLY),
+                            (8, DailyAttendanceSummary.PRESENT)):
+            DailyAttendanceSummary.objects.create(user=cls.staff[0], date=date(2024, 5, day), status=status)
+        LeaveRequest.objects.create(user=cls.staff[1], start_date=date(2024, 5, 6), end_date=date(2024, 5, 7),
+                                    reason='Rest', status=LeaveRequest.APPROVED)
+
+    def matrix(self, backend):
+        with override_settings(ATTENDANCE_HEATMAP_BACKEND=backend):
+            grid = heatmap.build_heatmap(date(2024, 5, 6), date(2024, 5, 13), self.staff, today=date(2024, 5, 10))
+        return type(grid), grid.tolist()
+
+    def test_cell_codes_on_both_backends(self):
+        expected = [
+            [heatmap.PRESENT, heatmap.PARTIAL, heatmap.PRESENT, heatmap.ABSENT, heatmap.ABSENT,
+             heatmap.WEEKEND, heatmap.WEEKEND, heatmap.FUTURE],
+            [heatmap.LEAVE, heatmap.LEAVE, heatmap.HOLIDAY, heatmap.ABSENT, heatmap.ABSENT,
+             heatmap.WEEKEND, heatmap.WEEKEND, heatmap.FUTURE],
+        ]
+        self.assertEqual(self.matrix('array'), (heatmap._ArrayGrid, expected))
+        if heatmap.numpy is None:
+            self.skipTest('NumPy is not installed')
+        self.assertEqual(self.matrix('numpy'), (heatmap._NumpyGrid, expected))
+
+    def test_payload_labels_the_matrix(self):
+        payload = heatmap.heatmap_payload(date(2024, 5, 6), date(2024, 5, 7), self.staff)
+
+        self.assertEqual(payload['days'], ['2024-05-06', '2024-05-07'])
+        self.assertEqual([member['name'] for member in payload['staff']], ['Heatmap 0', 'Heatmap 1'])
+        self.assertEqual(payload['legend'][heatmap.LEAVE], 'leave')
+        self.assertEqual(payload['matrix'], [[heatmap.PRESENT, heatmap.PARTIAL], [heatmap.LEAVE, heatmap.LEAVE]])
+
+
+@override_settings(ATTENDANCE_AUTO_CHECKOUT_TIME='18:00')
+class AutoCloseTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.office = Office.objects.create(office_Name='Berlin', office_location='Berlin', office_purpose='Branch')
+        cls.staff = [
+            User.objects.create_user(
+                email=f'autoclose{index}@example.com', password='pass', first_name='Auto', last_name=str(index),
+                role='staff', office=cls.office if index == 1 else None
+            )
+            for index in range(4)
+        ]
+
+        def punch(member, hour, attendance_type):
+            record_attendance(Attendance.objects.create(
+                user=member, date=date(2024, 5, 6), attendance_type=attendance_type,
+                timestamp=datetime(2024, 5, 6, hour, tzinfo=dt_timezone.utc),
+            ))
+
+        punch(cls.staff[0], 9, Attendance.CHECK_IN)
+        punch(cls.staff[1], 9, Attendance.CHECK_IN)
+        punch(cls.staff[2], 19, Attendance.CHECK_IN)
+        punch(cls.staff[3], 9, Attendance.CHECK_IN)
+        punch(cls.staff[3], 16, Attendance.CHECK_OUT)
+
+    def check_outs(self):
+        return dict(Attendance.objects.filter(attendance_type=Attendance.CHECK_OUT).values_list('user_id', 'timestamp'))
+
+    def test_closes_each_open_day_once(self):
+        office_rules = {self.office.pk: {'time': '17:00', 'timezone': 'Europe/Berlin'}}
+        with override_settings(ATTENDANCE_OFFICE_CHECKOUT=office_rules):
+            out = StringIO()
+            call_command('auto_close_attendance', '--date', '2024-05-06', stdout=out)
+            self.assertIn('2024-05-06: 3 open check-ins, 3 closed', out.getvalue())
+
+            out = StringIO()
+            call_command('auto_close_attendance', '--date', '2024-05-06', '--days', '2', stdout=out)
+            self.assertIn('2024-05-06: 0 open check-ins, 0 closed', out.getvalue())
+
+        self.assertEqual(self.check_outs(), {
+            self.staff[0].pk: datetime(2024, 5, 6, 18, tzinfo=dt_timezone.utc),
+            # 17:00 in Berlin (UTC+2 in May)
+            self.staff[1].pk: datetime(2024, 5, 6, 15, tzinfo=dt_timezone.utc),
+            # Checked in after the cut-off: closed at the end of the day
+            self.staff[2].pk: datetime(2024, 5, 6, 23, 59, 59, tzinfo=dt_timezone.utc),
+            self.staff[3].pk: datetime(2024, 5, 6, 16, tzinfo=dt_timezone.utc),
+        })
+        summary = DailyAttendanceSummary.objects.get(user=self.staff[0])
+        self.assertEqual((summary.status, summary.duration), (DailyAttendanceSummary.PRESENT, timedelta(hours=9)))
+
+    def test_check_ins_not_yet_due_are_left_open(self):
+        report = close_open_check_ins(date(2024, 5, 6), now=datetime(2024, 5, 6, 20, tzinfo=dt_timezone.utc))
+
+        self.assertEqual((report['open'], report['closed'], report['skipped']), (3, 2, 1))
+        self.assertNotIn(self.staff[2].pk, self.check_outs())
+
+    def test_dry_run_writes_nothing(self):
+        out = StringIO()
+        call_command('auto_close_attendance', '--date', '2024-05-06', '--dry-run', stdout=out)
+
+        self.assertIn('[dry run] 2024-05-06: 3 open check-ins, 3 closed', out.getvalue())
+        self.assertEqual(list(self.check_outs()), [self.staff[3].pk])
+
+
+class LiveEventTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            email='live-admin@example.com', password='pass', first_name='Live', last_name='Admin'
+        )
+        cls.staff = User.objects.create_user(
+            email='live@example.com', password='pass', first_name='Live', last_name='Staff', role='staff'
+        )
+
+    @staticmethod
+    def parse(body):
+        """(id, event name, payload) of every event in an SSE body"""
+        events = []
+        for block in body.strip().split('\n\n'):
+            fields = dict(line.split(': ', 1) for line in block.split('\n') if not line.startswith(':'))
+            if 'event' in fields:
+                events.append((fields['id'], fields['event'], json.loads(fields['data'])))
+        return events
+
+    def test_cursor_parsing(self):
+        self.assertEqual(live.parse_cursor('12-3'), (12, 3))
+        for value in (None, '', '12', '-1-3', '1-2-3', 'a-b'):
+            with self.subTest(value=value):
+                self.assertIsNone(live.parse_cursor(value))
+
+    def test_poll_resumes_after_the_last_event_received(self):
+        start = live.current_cursor()
+        punch = Attendance.objects.create(user=self.staff, date=timezone.now().date(),
+                                          attendance_type=Attendance.CHECK_IN)
+        leave = LeaveRequest.objects.create(user=self.staff, start_date=date(2024, 5, 6), end_date=date(2024, 5, 7),
+                                            reason='Rest')
+
+        body = ''.join(live.poll_once(start))
+        self.assertTrue(body.startswith('retry: '))
+        events = self.parse(body)
+        self.assertEqual([(event_id, name, data['id']) for event_id, name, data in events], [
+            (f'{punch.pk}-{start[1]}', 'attendance', punch.pk),
+            (f'{punch.pk}-{leave.pk}', 'leave_request', leave.pk),
+        ])
+        self.assertEqual(events[0][2]['name'], 'Live Staff')
+
+        # A reconnect sends the id of the last event it got
+        self.assertEqual(self.parse(''.join(live.poll_once(live.parse_cursor(events[0][0])))), events[1:])
+        self.assertEqual(self.parse(''.join(live.poll_once(live.parse_cursor(events[1][0])))), [])
+
+    def test_batches_advance_the_cursor(self):
+        start = live.current_cursor()
+        punches = [
+            Attendance.objects.create(user=self.staff, date=date(2024, 5, day), attendance_type=Attendance.CHECK_IN)
+            for day in (6, 7, 8)
+        ]
+
+        events, cursor = live.events_since(start, limit=2)
+        self.assertEqual([data['id'] for _, data, _ in events], [punch.pk for punch in punches[:2]])
+        events, cursor = live.events_since(cursor, limit=2)
+        self.assertEqual([data['id'] for _, data, _ in events], [punches[2].pk])
+        self.assertEqual(live.events_since(cursor), ([], cursor))
+
+    def test_view_reads_the_last_event_id_header(self):
+        punch = Attendance.objects.create(user=self.staff, date=timezone.now().date(),
+                                          attendance_type=Attendance.CHECK_IN)
+        self.client.force_login(self.admin)
+
+        response = self.client.get(reverse('attendance:attendance_events'), secure=True,
+                                   HTTP_LAST_EVENT_ID=f'{punch.pk - 1}-{live.current_cursor()[1]}')
+
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        events = self.parse(b''.join(response.streaming_content).decode())
+        self.assertEqual([data['id'] for _, _, data in events], [punch.pk])
+
+
+class OfficeRollupTests(TestCase):
+    # Week of Monday 4 March 2024, with Wednesday a holiday, rebuilt on Thursday of the week after
+    weeks = [date(2024, 3, 4), date(2024, 3, 11)]
+    today = date(2024, 3, 14)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.addClassCleanup(business_calendar.invalidate)
+        Holiday.objects.create(name='Independence Day', date=date(2024, 3, 6))
+        cls.office = Office.objects.create(office_Name='Accra', office_location='Accra', office_purpose='HQ')
+        cls.branch = Office.objects.create(office_Name='Kumasi', office_location='Kumasi', office_purpose='Branch')
+        Office.objects.create(office_Name='Empty', office_location='Tamale', office_purpose='Branch')
+        cls.staff = [
+            User.objects.create_user(
+                email=f'rollup{index}@example.com', password='pass', first_name='Rollup', last_name=str(index),
+                role='staff', is_staff=True, office=office
+            )
+            for index, office in enumerate([cls.office, cls.office, cls.branch, None])
+        ]
+
+        present = [
+            (0, date(2024, 3, 4)), (0, date(2024, 3, 5)), (1, date(2024, 3, 4)),
+            (0, date(2024, 3, 6)),  # the holiday
+            (2, date(2024, 3, 15)),  # after today
+            (3, date(2024, 3, 4)),  # no office
+        ]
+        for index, day in present:
+            DailyAttendanceSummary.objects.create(
+                user=cls.staff[index], date=day, status=DailyAttendanceSummary.PRESENT,
+                first_check_in=datetime(day.year, day.month, day.day, 9, tzinfo=dt_timezone.utc),
+            )
+        # Thursday to the next Monday: two working days in the first week, one in the second
+        LeaveRequest.objects.bulk_create([
+            LeaveRequest(user=cls.staff[1], start_date=date(2024, 3, 7), end_date=date(2024, 3, 11),
+                         status=LeaveRequest.APPROVED, leave_type='annual', reason='Rest'),
+            LeaveRequest(user=cls.staff[2], start_date=date(2024, 3, 5), end_date=date(2024, 3, 5),
+                         status=LeaveRequest.PENDING, leave_type='annual', reason='Rest'),
+        ])
+
+    def rows(self):
+        return list(WeeklyOfficeAttendance.objects.order_by('office__office_Name', 'week_start').values_list(
+            'office__office_Name', 'week_start', 'staff_count', 'working_days', 'expected_days', 'leave_days',
+            'present_days',
+        ))
+
+    def test_rebuild_counts_working_days_up_to_today(self):
+        self.assertEqual(rebuild_office_weeks(self.weeks, today=self.today), 4)
+
+        self.assertEqual(self.rows(), [
+            ('Accra', date(2024, 3, 4), 2, 4, 8, 2, 3),
+            ('Accra', date(2024, 3, 11), 2, 4, 8, 1, 0),
+            ('Kumasi', date(2024, 3, 4), 1, 4, 4, 0, 0),
+            ('Kumasi', date(2024, 3, 11), 1, 4, 4, 0, 0),
+        ])
+        week = WeeklyOfficeAttendance.objects.get(office=self.office, week_start=date(2024, 3, 4))
+        self.assertEqual(week.attendance_percentage, 50.0)
+
+    def test_refresh_replaces_only_its_weeks(self):
+        WeeklyOfficeAttendance.objects.create(office=self.office, week_start=date(2024, 3, 4), present_days=99)
+        WeeklyOfficeAttendance.objects.create(office=self.office, week_start=date(2024, 2, 26), present_days=7)
+
+        self.assertEqual(refresh_office_rollups(weeks=1, today=date(2024, 3, 8)), 2)
+
+        self.assertEqual(
+            list(WeeklyOfficeAttendance.objects.filter(office=self.office).order_by('week_start')
+                 .values_list('week_start', 'present_days')),
+            [(date(2024, 2, 26), 7), (date(2024, 3, 4), 3)],
+        )
+
+    def test_command(self):
+        with self.assertRaises(CommandError):
+            call_command('rollup_office_attendance', weeks=0, stdout=StringIO())
+
+        out = StringIO()
+        call_command('rollup_office_attendance', weeks=2, stdout=out)
+        self.assertIn('Rebuilt 4 weekly office rows over the last 2 week(s).', out.getvalue())
@@ -11,7 +11,10 @@ urlpatterns = [
     # Staff URLs
     path('', login_required(views.dashboard), name='dashboard'),
     path('clock-in-out/', login_required(views.clock_in_out), name='clock_in_out'),
+    # Not login_required: the scan is checked before the login redirect, see kiosk_scan
+    path('kiosk/scan/', views.kiosk_scan, name='kiosk_scan'),
     path('request-leave/', login_required(views.request_leave), name='request_leave'),
+    path('request-leave/staffing-check/', login_required(views.leave_staffing_check), name='leave_staffing_check'),
     # Leave requests
     path('my-leave-requests/', login_required(views.my_leave_requests), name='my_leave_requests'),
     path('leave-requests/delete-all/', login_required(views.delete_all_leave_requests), name='delete_all_leave_requests'),
@@ -22,6 +25,8 @@ urlpatterns = [
     path('leave-request/<int:pk>/delete/', login_required(views.cancel_leave_request), name='cancel_leave_request'),
     path('history/', login_required(views.attendance_history), name='history'),
     path('history/user/<int:user_id>/', login_required(views.attendance_history), name='user_attendance_history'),
+    path('api/history/', login_required(views.attendance_history_api), name='history_api'),
+    path('api/history/user/<int:user_id>/', login_required(views.attendance_history_api), name='user_history_api'),
     path('clear-history/', login_required(views.clear_attendance_history), name='clear_history'),
     path('mark-absence/', login_required(views.mark_absence), name='mark_absence'),
 
@@ -29,9 +34,19 @@ urlpatterns = [
     path('admin/dashboard/', login_required(admin_required()(views.admin_dashboard)), name='admin_dashboard'),
     path('admin/leave/<int:pk>/', login_required(admin_required()(views.manage_leave_request)), name='manage_leave'),
     path('admin/report/', login_required(admin_required()(views.admin_attendance_report)), name='admin_attendance_report'),
+    path('admin/report/pdf/', login_required(admin_required()(views.attendance_report_pdf)), name='attendance_report_pdf'),
+    path('admin/report/pdf/<int:user_id>/', login_required(admin_required()(views.attendance_report_pdf)), name='staff_attendance_report_pdf'),
     path('admin/leave-requests/', login_required(admin_required()(views.admin_leave_requests)), name='admin_leave_requests'),
+    path('admin/events/', login_required(admin_required()(views.attendance_events)), name='attendance_events'),
     path('admin/staff-attendance/', login_required(admin_required()(views.all_staff_attendance)), name='all_staff_attendance'),
     path('admin/staff-attendance/<int:user_id>/', login_required(admin_required()(views.staff_attendance_history)), name='staff_attendance_history'),
+    path('admin/import/', login_required(admin_required()(views.import_attendance)), name='import_attendance'),
+    path('admin/heatmap/', login_required(admin_required()(views.attendance_heatmap)), name='attendance_heatmap'),
+    path('admin/heatmap/data/', login_required(admin_required()(views.attendance_heatmap_data)), name='attendance_heatmap_data'),
+    path('admin/office-trends/', login_required(admin_required()(views.office_attendance_trends)), name='office_attendance_trends'),
+    path('admin/office-trends/data/', login_required(admin_required()(views.office_attendance_trends_data)), name='office_attendance_trends_data'),
+    path('admin/kiosk/<int:office_id>/', login_required(admin_required()(views.kiosk_display)), name='kiosk_display'),
+    path('admin/kiosk/<int:office_id>/qr/', login_required(admin_required()(views.kiosk_qr)), name='kiosk_qr'),
     path('admin/holidays/', login_required(admin_required()(views.manage_holidays)), name='admin_manage_holidays'),
     path('admin/holidays/add/', login_required(admin_required()(views.add_holiday)), name='admin_add_holiday'),
     path('admin/holidays/<int:pk>/edit/', login_required(admin_required()(views.edit_holiday)), name='admin_edit_holiday'),
@@ -1,6 +1,8 @@
 from datetime import timedelta, date
 from django.utils import timezone
 
+from .business_calendar import business_calendar
+
 def calculate_working_hours(check_in, check_out):
     """Calculate working hours between check-in and check-out times."""
     if not check_in or not check_out:
@@ -36,24 +38,8 @@ def get_leave_days(start_date, end_date):
     if hasattr(end_date, 'date'):
         end_date = end_date.date()
     
-    # Calculate total days (inclusive)
-    delta = end_date - start_date
-    total_days = delta.days + 1  # +1 to include both start and end dates
-    
-    # Get all holidays in the date range
-    holidays = get_holidays_between_dates(start_date, end_date)
-    holiday_dates = [h.date for h in holidays]
-    
-    # Count working days (Monday=0, Sunday=6)
-    working_days = 0
-    for day in range(total_days):
-        current_date = start_date + timedelta(days=day)
-        # Count only weekdays (0-4 = Monday-Friday)
-        if current_date.weekday() < 5:  # 0=Monday, 6=Sunday
-            if current_date not in holiday_dates:
-                working_days += 1
-    
-    return working_days
+    # Count working days (weekday rule minus holidays) from the shared calendar
+    return business_calendar.count_working_days(start_date, end_date)
 
 def get_weekend_dates(start_date, end_date):
     """Get all weekend dates between two dates."""
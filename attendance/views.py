@@ -2,29 +2,46 @@ from django.urls import reverse
 from django.conf import settings
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse, HttpResponseForbidden, HttpResponseBadRequest, HttpResponseNotAllowed
+from django.contrib.auth.views import redirect_to_login
+from django.http import JsonResponse, HttpResponse, HttpResponseForbidden, HttpResponseBadRequest, HttpResponseNotAllowed, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
 from django.contrib import messages
 from django.db import transaction
 from django.utils import timezone
-from django.db.models import Q, Count, F, Case, When, Value, IntegerField
+from django.db.models import Count, F, Case, When, Value, IntegerField
 from django.db.models.functions import ExtractWeekDay, ExtractHour, Coalesce
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
+from django.utils.cache import get_conditional_response, patch_cache_control, set_response_etag
+from django.utils.http import http_date
 from django.utils.timezone import localdate, make_aware, is_naive, get_current_timezone
 from datetime import datetime, timedelta, time as dt_time, date
 import calendar
 import logging
 import json
 import pytz
+import io
+from zoneinfo import ZoneInfo
 
 from core.models import User, Office  # Removed Department, LeaveType, CompanyPolicy as they don't exist
 from .models import (
     Attendance, 
     LeaveRequest,
-    Holiday
+    Holiday,
+    DailyAttendanceSummary,
+    LeaveBalance
 )
-from .forms import LeaveRequestForm  # Only import forms that exist
+from .forms import LeaveRequestForm, PunchImportForm  # Only import forms that exist
 from .utils import (calculate_working_hours, get_holidays_between_dates,
                    get_leave_days, get_weekend_dates, is_weekend)
+from .rollups import rollup_attendance, attendance_percentage
+from .summaries import record_attendance, format_duration, archived_daily_summaries
+from .exports import stream_csv, daily_attendance_rows, staff_summary_rows, leave_request_rows
+from .business_calendar import business_calendar
+from .dashboard import get_admin_dashboard
+from . import clocking, counters, heatmap, history_api, kiosk, live, office_rollups, pdf_reports
+from .imports import import_punches
+from .leaves import overlapping_leave, staffing_conflicts
+from .balances import balances_for
 from .templatetags.attendance_filters import get_item
 
 # Create logger instance
@@ -38,7 +55,7 @@ def dashboard(request):
         today = timezone.now().date()
         today_attendance = Attendance.objects.filter(
             user=request.user,
-            timestamp__date=today
+            date=today
         ).order_by('timestamp')
         
         # Get recent attendance history
@@ -83,7 +100,7 @@ def get_todays_attendance(user):
     today = timezone.now().date()
     today_attendance = Attendance.objects.filter(
         user=user,
-        timestamp__date=today
+        date=today
     ).order_by('timestamp')
     
     # Check if user is currently checked in
@@ -118,12 +135,6 @@ def get_dashboard_context(request):
         attendance_data = get_todays_attendance(request.user)
         today = timezone.now().date()
         
-        # Get present staff count
-        present_today = Attendance.objects.filter(
-            timestamp__date=today,
-            attendance_type='check_in'
-        ).values('user').distinct().count()
-        
         # Get pending leave requests
         pending_requests = LeaveRequest.objects.filter(
             user=request.user,
@@ -140,13 +151,11 @@ def get_dashboard_context(request):
             date__gte=today
         ).order_by('date')[:5]
         
-        # Get total staff count
-        total_staff = User.objects.filter(is_staff=True).count()
-        
         context = {
             **attendance_data,
-            'total_staff': total_staff,
-            'present_today': present_today,
+            # Live counters kept in the cache by the clock-in service
+            'total_staff': counters.total_staff(),
+            'present_today': counters.present_today(today),
             'pending_requests': pending_requests,
             'recent_activity': recent_activity,
             'upcoming_holidays': upcoming_holidays,
@@ -168,78 +177,142 @@ def get_dashboard_context(request):
 
 @login_required
 def clock_in_out(request):
-    """Handle clock in/out actions"""
-    if request.method == 'POST':
-        now = timezone.now()
-        today = now.date()
-        ip_address = request.META.get('HTTP_X_FORWARDED_FOR') or request.META.get('REMOTE_ADDR')
-        
+    """
+    Handle clock in/out actions (form POST or AJAX, which gets the new state
+    as JSON). The POST names the punch it wants in ``action`` (check_in or
+    check_out); sending it again does nothing.
+    """
+    is_ajax = request.headers.get('X-Requested-With') == 'XMLHttpRequest'
+
+    if request.method != 'POST':
+        if is_ajax:
+            return JsonResponse({'success': False, 'message': 'Method not allowed'}, status=405)
+        return redirect('attendance:dashboard')
+
+    action = request.POST.get('action')
+    if action not in clocking.PUNCH_ACTIONS:
+        error_message = 'Choose whether to clock in or out.'
+        if is_ajax:
+            return JsonResponse({'success': False, 'message': error_message}, status=400)
+        messages.error(request, error_message)
+        return redirect('attendance:dashboard')
+
+    ip_address = request.META.get('HTTP_X_FORWARDED_FOR') or request.META.get('REMOTE_ADDR')
+
+    try:
+        result = clocking.clock_in_out(
+            request.user,
+            action,
+            ip_address=ip_address,
+            location=request.META.get('HTTP_CF_IPCOUNTRY', 'Unknown'),
+        )
+    except Exception as e:
+        logger.error(f"Error in clock_in_out view: {str(e)}", exc_info=True)
+        error_message = 'An error occurred while processing your request. Please try again.'
+        if is_ajax:
+            return JsonResponse({'success': False, 'message': error_message}, status=500)
+        messages.error(request, error_message)
+        return redirect('attendance:dashboard')
+
+    if is_ajax:
+        return JsonResponse({
+            'success': result['action'] is not None,
+            'action': result['action'],
+            'message': result['message'],
+            'current_status': result['current_status'],
+            'can_clock_in': result['can_clock_in'],
+            'check_in': result['check_in'].isoformat() if result['check_in'] else None,
+            'check_out': result['check_out'].isoformat() if result['check_out'] else None,
+            'today_hours': result['today_hours'],
+        })
+
+    if result['level'] == 'success':
+        messages.success(request, result['message'])
+    else:
+        messages.warning(request, result['message'])
+    return redirect('attendance:dashboard')
+
+def kiosk_scan(request):
+    """
+    Clock in or out by scanning an office kiosk QR code.
+
+    The rotating code is checked once, when it is scanned (GET ?t=), without
+    touching the database. From there a signed confirmation (?c=, see
+    kiosk.make_confirmation) carries the scan through the login page and
+    the confirmation form, and the POST that records the punch checks that
+    instead, so neither has to beat the code's rotation. The form offers
+    the user's next punch and posts it as ``action``, so pressing it twice
+    records it once.
+    """
+    confirmation = request.POST.get('c') if request.method == 'POST' else request.GET.get('c')
+    context = {'confirmation': confirmation, 'action': None, 'result': None, 'error': None}
+
+    try:
+        if confirmation or request.method == 'POST':
+            office_id = kiosk.verify_confirmation(confirmation or '')
+        else:
+            office_id = kiosk.verify_token(request.GET.get('t') or '')
+            confirmation = context['confirmation'] = kiosk.make_confirmation(office_id)
+    except kiosk.InvalidKioskToken as e:
+        context['error'] = str(e)
+        return render(request, 'attendance/kiosk/scan.html', context, status=400)
+
+    if not request.user.is_authenticated:
+        return redirect_to_login(f"{reverse('attendance:kiosk_scan')}?c={confirmation}")
+
+    if request.user.office_id != office_id:
+        context['error'] = 'This code belongs to another office. Scan the code at your own office entrance.'
+        return render(request, 'attendance/kiosk/scan.html', context, status=403)
+
+    if request.method != 'POST':
+        context['action'] = clocking.next_action(request.user)
+    elif request.POST.get('action') not in clocking.PUNCH_ACTIONS:
+        context['error'] = 'Scan the code on the screen again.'
+        return render(request, 'attendance/kiosk/scan.html', context, status=400)
+    else:
         try:
-            # Get all of today's attendance records for this user - check both date fields
-            today_attendances = Attendance.objects.filter(
-                Q(user=request.user) & 
-                (Q(date=today) | Q(timestamp__date=today))
-            ).order_by('timestamp')
-            
-            # Get the most recent attendance record
-            last_attendance = today_attendances.last()
-            
-            # Debug information
-            print(f"Found {today_attendances.count()} attendance records for today")
-            if last_attendance:
-                print(f"Last attendance: {last_attendance.attendance_type} at {last_attendance.timestamp}")
-            
-            # Determine if user is checking in or out
-            if last_attendance and last_attendance.attendance_type == 'check_in':
-                # User is checking out
-                # Check if they've already checked out today
-                if today_attendances.filter(attendance_type='check_out').exists():
-                    messages.warning(request, 'You have already checked out for today.')
-                    return redirect('attendance:dashboard')
-                
-                # Create check-out record
-                Attendance.objects.create(
-                    user=request.user,
-                    date=today,  # Use the date object directly
-                    attendance_type='check_out',
-                    ip_address=ip_address,
-                    notes=f'Checked out at {now.strftime("%I:%M %p")} via web interface',
-                    location=request.META.get('HTTP_CF_IPCOUNTRY', 'Unknown'),
-                    status='auto',
-                    recorded_by=request.user
-                )
-                messages.success(request, 'Successfully checked out!')
-                print(f"Created check-out record for user {request.user.id}")
-                
-            else:
-                # User is checking in
-                # Check if they've already checked in today
-                if today_attendances.filter(attendance_type='check_in').exists():
-                    messages.warning(request, 'You have already checked in today.')
-                    return redirect('attendance:dashboard')
-                
-                # Create check-in record
-                Attendance.objects.create(
-                    user=request.user,
-                    date=today,  # Use the date object directly
-                    attendance_type='check_in',
-                    ip_address=ip_address,
-                    notes=f'Checked in at {now.strftime("%I:%M %p")} via web interface',
-                    location=request.META.get('HTTP_CF_IPCOUNTRY', 'Unknown'),
-                    status='auto',
-                    recorded_by=request.user
-                )
-                messages.success(request, 'Successfully checked in!')
-                print(f"Created check-in record for user {request.user.id}")
-            
-            return redirect('attendance:dashboard')
-            
+            context['result'] = clocking.clock_in_out(
+                request.user,
+                request.POST['action'],
+                ip_address=request.META.get('HTTP_X_FORWARDED_FOR') or request.META.get('REMOTE_ADDR'),
+                location=f'Office kiosk {office_id}',
+                source='office kiosk',
+            )
         except Exception as e:
-            print(f"Error in clock_in_out view: {str(e)}")
-            messages.error(request, 'An error occurred while processing your request. Please try again.')
-            return redirect('attendance:dashboard')
-    
-    return redirect('attendance:dashboard')
+            logger.error(f"Error in kiosk_scan view: {str(e)}", exc_info=True)
+            context['error'] = 'An error occurred while processing your request. Please try again.'
+            return render(request, 'attendance/kiosk/scan.html', context, status=500)
+
+    return render(request, 'attendance/kiosk/scan.html', context)
+
+
+@login_required
+def kiosk_display(request, office_id):
+    """Full-screen rotating QR code for an office entrance (admin only)"""
+    if not request.user.is_staff:
+        return redirect('attendance:dashboard')
+
+    office = get_object_or_404(Office, pk=office_id)
+    return render(request, 'attendance/kiosk/display.html', {'office': office})
+
+
+@login_required
+def kiosk_qr(request, office_id):
+    """The office's QR code for the current window, as inline SVG in JSON (admin only)"""
+    if not request.user.is_staff:
+        return JsonResponse({'success': False, 'error': 'Permission denied.'}, status=403)
+
+    window = kiosk.current_window()
+    scan_url = request.build_absolute_uri(
+        f"{reverse('attendance:kiosk_scan')}?t={kiosk.make_token(office_id, window)}"
+    )
+    response = JsonResponse({
+        'svg': kiosk.qr_svg(scan_url, office_id, window),
+        'refresh_in': kiosk.seconds_left(),
+    })
+    patch_cache_control(response, no_store=True)
+    return response
+
 
 @login_required
 def request_leave(request):
@@ -257,12 +330,7 @@ def request_leave(request):
             print(f"Processing leave request from {leave_request.start_date} to {leave_request.end_date}")
             
             # Check for overlapping leave requests
-            overlapping_requests = LeaveRequest.objects.filter(
-                user=request.user,
-                status__in=['pending', 'approved'],
-                start_date__lte=leave_request.end_date,
-                end_date__gte=leave_request.start_date
-            )
+            overlapping_requests = overlapping_leave(request.user, leave_request.start_date, leave_request.end_date)
             
             if overlapping_requests.exists():
                 error_msg = 'You already have a leave request that overlaps with these dates.'
@@ -272,6 +340,14 @@ def request_leave(request):
                 try:
                     leave_request.save()
                     messages.success(request, 'Leave request submitted successfully!')
+                    staffing = staffing_conflicts(request.user, leave_request.start_date, leave_request.end_date,
+                                                  exclude_pk=leave_request.pk)
+                    if staffing['conflict_days']:
+                        messages.warning(
+                            request,
+                            f"Heads up: your office is already at its limit of people away on "
+                            f"{len(staffing['conflict_days'])} of the requested working days, so approval may take longer."
+                        )
                     print("Leave request saved successfully")  # Debug log
                     return redirect('attendance:dashboard')
                 except Exception as e:
@@ -310,6 +386,10 @@ def request_leave(request):
 @login_required
 def my_leave_requests(request):
     """View all leave requests for the current user"""
+    if request.GET.get('export') == 'csv':
+        leave_requests = LeaveRequest.objects.filter(user=request.user)
+        return stream_csv(leave_request_rows(leave_requests), 'my_leave_requests.csv')
+
     try:
         # Debug: Print user info
         print(f"User: {request.user}, ID: {request.user.id}")
@@ -340,8 +420,11 @@ def my_leave_requests(request):
         status_counts = [{'status': k, 'count': v} for k, v in status_count.items() if v > 0]
         print(f"Status counts: {status_counts}")
         
+        balance_year = timezone.now().year
         context = {
             'leave_requests': leave_requests,
+            'leave_balances': balances_for(request.user, balance_year),
+            'balance_year': balance_year,
             'status_counts': status_counts,
             'debug': settings.DEBUG,
             'has_pending_requests': status_count['pending'] > 0
@@ -632,7 +715,7 @@ def mark_absence(request):
                 messages.warning(request, 'You already have an attendance record for this date.')
             else:
                 # Create absent record
-                Attendance.objects.create(
+                attendance = Attendance.objects.create(
                     user=request.user,
                     date=absence_date,
                     attendance_type=Attendance.ABSENT,
@@ -640,6 +723,7 @@ def mark_absence(request):
                     notes=form.cleaned_data['reason'],
                     recorded_by=request.user
                 )
+                record_attendance(attendance)
                 messages.success(request, f'Successfully recorded absence for {absence_date}')
                 return redirect('attendance:dashboard')
     else:
@@ -656,7 +740,11 @@ def clear_attendance_history(request):
             today = timezone.now().date()
             deleted_count = Attendance.objects.filter(
                 user=request.user,
-                timestamp__date__lt=today
+                date__lt=today
+            ).delete()
+            DailyAttendanceSummary.objects.filter(
+                user=request.user,
+                date__lt=today
             ).delete()
             
             messages.success(request, f'Successfully cleared {deleted_count[0]} attendance records.')
@@ -694,51 +782,28 @@ def attendance_history(request, user_id=None):
         except (ValueError, TypeError) as e:
             messages.error(request, "Invalid date format. Please use YYYY-MM-DD format.")
     
-    # Get all attendance records (both check-in and check-out) for the user and date range
-    attendance_records = Attendance.objects.filter(
-        Q(user=user) &
-        (
-            (Q(date__isnull=False) & Q(date__range=[start_date, end_date])) |
-            (Q(timestamp__date__range=[start_date, end_date]))
-        )
-    ).order_by('timestamp')
-    
-    # Debug information
-    print(f"Found {attendance_records.count()} attendance records between {start_date} and {end_date}")
+    # Read the precomputed per-day summaries for the user and date range
+    daily_summaries = list(DailyAttendanceSummary.objects.filter(
+        user=user,
+        date__range=[start_date, end_date]
+    ).order_by('-date'))
+
+    # Days older than the retention window live in the archive instead
+    live_dates = {summary.date for summary in daily_summaries}
+    archived = [s for s in archived_daily_summaries(user, start_date, end_date) if s.date not in live_dates]
+    if archived:
+        daily_summaries = sorted(daily_summaries + archived, key=lambda summary: summary.date, reverse=True)
     
-    # Create a dictionary to store attendance by date
+    # Create a dictionary to store attendance by date (newest first)
     attendance_by_date = {}
-    
-    # Process each record
-    for record in attendance_records:
-        # Use date from record or fallback to timestamp date
-        record_date = record.date if record.date else record.timestamp.date()
-        
-        # Initialize date entry if it doesn't exist
-        if record_date not in attendance_by_date:
-            attendance_by_date[record_date] = {
-                'check_in': None,
-                'check_out': None,
-                'duration': None
-            }
-        
-        # Update check-in or check-out
-        if record.attendance_type == 'check_in':
-            attendance_by_date[record_date]['check_in'] = record.timestamp
-        elif record.attendance_type == 'check_out':
-            attendance_by_date[record_date]['check_out'] = record.timestamp
-        
-        # Calculate duration if both check-in and check-out exist
-        current = attendance_by_date[record_date]
-        if current['check_in'] and current['check_out']:
-            duration = current['check_out'] - current['check_in']
-            hours, remainder = divmod(duration.total_seconds(), 3600)
-            minutes, _ = divmod(remainder, 60)
-            current['duration'] = f"{int(hours)}h {int(minutes)}m"
-    
-    # Convert to a sorted list of dates
-    sorted_dates = sorted(attendance_by_date.keys(), reverse=True)
-    attendance_days = {date: attendance_by_date[date] for date in sorted_dates}
+    for summary in daily_summaries:
+        attendance_by_date[summary.date] = {
+            'check_in': summary.first_check_in,
+            'check_out': summary.last_check_out,
+            'duration': format_duration(summary.duration),
+            'status': summary.status
+        }
+    attendance_days = attendance_by_date
     
     # Calculate summary statistics
     total_days = (end_date - start_date).days + 1
@@ -755,7 +820,6 @@ def attendance_history(request, user_id=None):
     print(f"Present days: {present_days}, Total days: {total_days}, Attendance: {attendance_percentage}%")
     
     context = {
-        'attendance_records': attendance_records,
         'attendance_days': attendance_days,
         'start_date': start_date,
         'end_date': end_date,
@@ -773,101 +837,92 @@ def attendance_history(request, user_id=None):
 
 
 @login_required
-def admin_dashboard(request):
-    """Admin dashboard for managing attendance - OPTIMIZED VERSION"""
-    if not request.user.is_staff:
-        return redirect('attendance:dashboard')
+def attendance_history_api(request, user_id=None):
+    """
+    JSON per-day attendance history with keyset pagination.
 
-    today = timezone.now().date()
-    start_of_week = today - timedelta(days=today.weekday())
+    Query parameters: ``before`` (YYYY-MM-DD, exclusive) to page back, or
+    ``after`` (the next_cursor of the previous sync page, '0' for a first
+    sync) to fetch the days changed since, and ``limit``. Responses carry an ETag and Last-Modified header, and a
+    matching If-None-Match / If-Modified-Since gets a 304.
+    """
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+
+    if user_id and request.user.is_staff:
+        user = get_object_or_404(User, id=user_id, is_active=True)
+    elif user_id and user_id != request.user.id:
+        return JsonResponse({'success': False, 'error': 'You can only view your own attendance.'}, status=403)
+    else:
+        user = request.user
 
     try:
-        # OPTIMIZATION 1: Use more efficient queries with limits and defer unnecessary fields
-        print("Starting admin dashboard queries...")
+        before = history_api.parse_cursor(request.GET.get('before'))
+        after = history_api.parse_sync_cursor(request.GET.get('after'))
+        limit = history_api.parse_limit(request.GET.get('limit'))
+    except (ValueError, TypeError):
+        return JsonResponse({'success': False, 'error': 'Invalid cursor or limit. before is a YYYY-MM-DD date, after a sync cursor.'}, status=400)
+    if before and after:
+        return JsonResponse({'success': False, 'error': 'Use either before or after, not both.'}, status=400)
+
+    payload, last_modified = history_api.history_page(user, before=before, after=after, limit=limit)
+
+    response = JsonResponse(payload)
+    set_response_etag(response)
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    patch_cache_control(response, private=True, no_cache=True)
+
+    return get_conditional_response(
+        request,
+        etag=response['ETag'],
+        last_modified=int(last_modified.timestamp()) if last_modified else None,
+        response=response,
+    )
 
-        # Get pending leave requests (limit to 10 for dashboard)
-        pending_requests = LeaveRequest.objects.filter(
-            status='pending'
-        ).select_related('user').only(
-            'id', 'user__first_name', 'user__last_name', 'user__email',
-            'leave_type', 'start_date', 'end_date', 'created_at'
-        ).order_by('-created_at')[:10]  # Limit to 10 most recent
-
-        print(f"Found {pending_requests.count()} pending requests")
-
-        # Count active staff - simple count query
-        total_staff = User.objects.filter(is_active=True, is_staff=True).count()
-        print(f"Total staff: {total_staff}")
-
-        # Get today's check-ins (optimized with only necessary fields)
-        recent_checkins = Attendance.objects.filter(
-            timestamp__date=today,
-            attendance_type='check_in'
-        ).select_related('user').only(
-            'id', 'user__first_name', 'user__last_name', 'timestamp',
-            'user__email', 'attendance_type'
-        ).order_by('-timestamp')[:5]
 
-        print(f"Found {recent_checkins.count()} recent checkins")
+@login_required
+def attendance_events(request):
+    """
+    Server-sent events for new check-ins and leave requests.
 
-        # Get today's attendance summary (simplified - just count)
-        today_attendance_count = Attendance.objects.filter(
-            timestamp__date=today
-        ).count()
+    The cursor comes from the Last-Event-ID header on reconnects, then the
+    ``cursor`` query parameter, and defaults to the newest rows. Under ASGI
+    the response streams for a few minutes; under WSGI it returns what is
+    new right away and the browser polls through EventSource reconnects.
+    """
+    if not request.user.is_staff:
+        return HttpResponseForbidden('Staff access required.')
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
 
-        # Get upcoming holidays (limited)
-        upcoming_holidays = Holiday.objects.filter(
-            date__gte=today
-        ).only('id', 'name', 'date').order_by('date')[:5]
-
-        # Get recent past holidays (limited)
-        past_holidays = Holiday.objects.filter(
-            date__lt=today
-        ).only('id', 'name', 'date').order_by('-date')[:5]
-
-        # OPTIMIZATION 2: Simplify staff attendance summary - use direct queries
-        staff_attendance_summary = []
-
-        # Get active staff members
-        staff_members = User.objects.filter(
-            is_active=True,
-            is_staff=True
-        ).only('id', 'first_name', 'last_name', 'email')[:10]  # Limit to 10 staff
-
-        for staff in staff_members:
-            # Get week check-ins count using the correct related name 'attendances'
-            week_checkins_count = Attendance.objects.filter(
-                user=staff,
-                timestamp__date__range=[start_of_week, today],
-                attendance_type='check_in'
-            ).count()
-
-            # Get last check-in for this staff member
-            last_check_in = Attendance.objects.filter(
-                user=staff,
-                attendance_type='check_in'
-            ).only('timestamp').order_by('-timestamp').first()
-
-            staff_attendance_summary.append({
-                'staff': staff,
-                'present_days': week_checkins_count,
-                'total_days': (today - start_of_week).days + 1,
-                'last_check_in': last_check_in,
-            })
+    cursor = (live.parse_cursor(request.headers.get('Last-Event-ID'))
+              or live.parse_cursor(request.GET.get('cursor'))
+              or live.current_cursor())
 
-        print("All queries completed successfully")
+    events = live.stream(cursor) if isinstance(request, ASGIRequest) else live.poll_once(cursor)
+    response = StreamingHttpResponse(events, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
 
-        context = {
-            'today_attendance_count': today_attendance_count,
-            'pending_requests': pending_requests,
-            'upcoming_holidays': upcoming_holidays,
-            'past_holidays': past_holidays,
-            'staff_attendance': staff_attendance_summary,
-            'recent_checkins': recent_checkins,
-            'total_staff': total_staff,
-            'today': today,
-            'start_of_week': start_of_week,
-        }
+
+@login_required
+def admin_dashboard(request):
+    """Admin dashboard for managing attendance - OPTIMIZED VERSION"""
+    if not request.user.is_staff:
+        return redirect('attendance:dashboard')
+
+    today = timezone.now().date()
+
+    try:
+        # Taken before the page data so the live stream misses nothing rendered after it
+        live_cursor = live.format_cursor(live.current_cursor())
+
+        # Aggregates are cached and invalidated by attendance.signals
+        context = get_admin_dashboard(today)
+        context['live_cursor'] = live_cursor
 
         return render(request, 'attendance/admin/dashboard.html', context)
 
@@ -940,7 +995,17 @@ def manage_leave_request(request, pk):
             
         return redirect('attendance:admin_leave_requests')
         
-    return render(request, 'attendance/admin/manage_leave.html', {'leave_request': leave_request})
+    staffing = staffing_conflicts(
+        leave_request.user, leave_request.start_date, leave_request.end_date, exclude_pk=leave_request.pk
+    )
+    balance = LeaveBalance.objects.filter(
+        user=leave_request.user, year=leave_request.start_date.year, leave_type=leave_request.leave_type
+    ).first()
+    return render(request, 'attendance/admin/manage_leave.html', {
+        'leave_request': leave_request,
+        'staffing': staffing,
+        'balance': balance,
+    })
 
 @login_required
 def admin_attendance_report(request):
@@ -957,48 +1022,83 @@ def admin_attendance_report(request):
         end_date = today
     
     # Get all active staff users
-    users = User.objects.filter(is_active=True, is_staff=True).order_by('first_name', 'last_name')
-    
-    # Get attendance summary
+    users = list(User.objects.filter(is_active=True, is_staff=True).order_by('first_name', 'last_name'))
+
+    # Stream the per-day detail behind the report instead of rendering it
+    if request.GET.get('export') == 'csv':
+        return stream_csv(
+            daily_attendance_rows(start_date, end_date, users),
+            f'attendance_report_{start_date:%Y%m%d}_{end_date:%Y%m%d}.csv'
+        )
+
+    # Get attendance summary for every user in one grouped query
+    rollup = rollup_attendance(start_date, end_date, users)
     attendance_summary = []
     for user in users:
-        # Get user's attendance records in the date range
-        user_attendance = Attendance.objects.filter(
-            user=user,
-            timestamp__date__range=[start_date, end_date]
-        ).order_by('timestamp')
-        
-        # Get unique dates with check-ins
-        present_dates = user_attendance.filter(
-            attendance_type='check_in'
-        ).values_list('timestamp__date', flat=True).distinct()
-        
-        # Get all dates in the range
-        all_dates = [start_date + timedelta(days=x) for x in range((end_date - start_date).days + 1)]
-        
-        # Calculate present and absent days
-        present_days = len(present_dates)
-        total_days = len(all_dates)
-        absent_days = total_days - present_days
-        
+        summary = rollup[user.pk]
+        present_days = summary['checked_in_days']
+        total_days = summary['total_days']
+
         attendance_summary.append({
             'user': user,
             'present_days': present_days,
-            'absent_days': absent_days,
+            'absent_days': total_days - present_days,
             'total_days': total_days,
-            'attendance_percentage': round((present_days / total_days * 100) if total_days > 0 else 0, 2)
+            'attendance_percentage': attendance_percentage(present_days, total_days)
         })
     
     context = {
         'start_date': start_date,
         'end_date': end_date,
         'attendance_summary': attendance_summary,
-        'total_users': users.count(),
+        'total_users': len(users),
     }
     
     return render(request, 'attendance/admin/attendance_report.html', context)
 
 
+@login_required
+def attendance_report_pdf(request, user_id=None):
+    """
+    Monthly attendance PDFs: one staff member's PDF, or a zip of every
+    staff PDF (optionally of one office) streamed while it is built. PDFs
+    are rendered in the request's own process, so a zip that would have to
+    render more than ATTENDANCE_PDF_MAX_INLINE_RENDERS of them is refused;
+    the attendance_pdf_reports command renders a whole month across several
+    processes and fills the cache these downloads are served from.
+    """
+    if not request.user.is_staff:
+        return redirect('attendance:dashboard')
+
+    today = timezone.now().date()
+    try:
+        year, month = pdf_reports.parse_month(request.GET.get('month'), default=(today.year, today.month))
+    except (ValueError, TypeError):
+        return HttpResponseBadRequest('Invalid month. Use YYYY-MM format.')
+
+    if user_id:
+        member = get_object_or_404(User.objects.select_related('office'), id=user_id)
+        filename, pdf = next(pdf_reports.monthly_report_pdfs([member], year, month))
+        response = HttpResponse(pdf, content_type='application/pdf')
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+    office_id = _heatmap_office(request)
+    staff = pdf_reports.staff_for_reports(office_id)
+    try:
+        pdfs = pdf_reports.monthly_report_pdfs(staff, year, month, max_renders=pdf_reports.max_inline_renders())
+    except pdf_reports.TooManyReports as e:
+        return HttpResponseBadRequest(
+            f'{e} Download one office at a time, or have an administrator run '
+            f'"manage.py attendance_pdf_reports --month {year:04d}-{month:02d}", after which this download '
+            f'is served from the cache.'
+        )
+    response = StreamingHttpResponse(pdf_reports.stream_zip(pdfs), content_type='application/zip')
+    scope = f'office{office_id}_' if office_id else ''
+    response['Content-Disposition'] = f'attachment; filename="attendance_{scope}{year:04d}-{month:02d}.zip"'
+    return response
+
+
 @login_required
 def admin_leave_requests(request):
     """View all leave requests for admin, organized by status - FIXED VERSION"""
@@ -1012,8 +1112,16 @@ def admin_leave_requests(request):
     if active_tab not in ['pending', 'approved', 'rejected']:
         active_tab = 'pending'
 
+    # Export every request (optionally of one status) as a streamed CSV
+    if request.GET.get('export') == 'csv':
+        leave_requests = LeaveRequest.objects.all()
+        if request.GET.get('status') in dict(LeaveRequest.STATUS_CHOICES):
+            leave_requests = leave_requests.filter(status=request.GET['status'])
+        return stream_csv(leave_request_rows(leave_requests), 'leave_requests.csv')
+
     try:
         print("Starting FIXED admin_leave_requests queries...")
+        live_cursor = live.format_cursor(live.current_cursor())
 
         # Get counts first (lightweight queries)
         pending_count = LeaveRequest.objects.filter(status='pending').count()
@@ -1046,6 +1154,7 @@ def admin_leave_requests(request):
             'approved_count': approved_count,
             'rejected_count': rejected_count,
             'active_tab': active_tab,
+            'live_cursor': live_cursor,
         }
 
         print("All queries completed successfully")
@@ -1189,21 +1298,10 @@ def delete_holiday(request, pk):
 
 def working_days_count(start_date, end_date):
     """
-    Returns the number of working days (Monday to Saturday) between two dates (inclusive).
+    Returns the number of working days between two dates (inclusive),
+    using the shared business calendar (weekday rule and holidays).
     """
-    days = (end_date - start_date).days + 1
-    # Calculate full weeks and remaining days
-    full_weeks = days // 7
-    remaining_days = days % 7
-    # Start with full weeks (6 working days per week - Monday to Saturday)
-    working_days = full_weeks * 6
-    # Add remaining working days
-    start_weekday = start_date.weekday()  # Monday is 0, Sunday is 6
-    for day in range(remaining_days):
-        current_weekday = (start_weekday + day) % 7
-        if current_weekday < 6:  # 0-5 are Monday to Saturday
-            working_days += 1
-    return working_days
+    return business_calendar.count_working_days(start_date, end_date)
 
 @login_required
 def staff_attendance_history(request, user_id):
@@ -1248,63 +1346,31 @@ def staff_attendance_history(request, user_id):
     print(f"Staff: {staff_name}")
     print(f"Date Range: {start_date} to {end_date}")
     
-    # Get records in chronological order for accurate processing
-    attendance_records = Attendance.objects.filter(
-        user=staff,
-        timestamp__date__range=[start_date, end_date]
-    ).order_by('timestamp')
-    
-    print(f"Found {attendance_records.count()} records in date range")
-    
-    # Initialize attendance_by_date with all working days in range (Monday to Saturday)
+    # Initialize attendance_by_date with all working days in range
     attendance_by_date = {}
-    current_date = start_date
-    while current_date <= end_date:
-        # Include Monday (0) through Saturday (5)
-        if current_date.weekday() < 6:  # 0-5 = Monday-Saturday
-            attendance_by_date[current_date] = {
-                'check_in': None,
-                'check_out': None,
-                'duration': None,
-                'status': 'absent'  # Default status
-            }
-        current_date += timedelta(days=1)
+    for working_day in business_calendar.working_days(start_date, end_date):
+        attendance_by_date[working_day] = {
+            'check_in': None,
+            'check_out': None,
+            'duration': None,
+            'status': 'absent'  # Default status
+        }
     
-    # Process each record and update attendance data
-    for record in attendance_records:
-        record_date = record.timestamp.date()
-        
-        # Skip if date is outside our range (shouldn't happen due to query)
-        if record_date not in attendance_by_date:
-            print(f"Skipping record outside working days: {record_date}")
+    # Overlay the precomputed daily summaries in one range scan
+    daily_summaries = DailyAttendanceSummary.objects.filter(
+        user=staff,
+        date__range=[start_date, end_date]
+    )
+    for summary in daily_summaries:
+        # Skip days outside the working week
+        if summary.date not in attendance_by_date:
             continue
-            
-        # Update check-in or check-out time
-        if record.attendance_type == 'check_in':
-            if attendance_by_date[record_date]['check_in'] is None or \
-               record.timestamp < attendance_by_date[record_date]['check_in']:
-                attendance_by_date[record_date]['check_in'] = record.timestamp
-                
-        elif record.attendance_type == 'check_out':
-            if attendance_by_date[record_date]['check_out'] is None or \
-               record.timestamp > attendance_by_date[record_date]['check_out']:
-                attendance_by_date[record_date]['check_out'] = record.timestamp
-    
-    # Calculate durations and status for each day
-    for date_key, data in attendance_by_date.items():
-        if data['check_in'] and data['check_out']:
-            if data['check_out'] > data['check_in']:
-                duration = data['check_out'] - data['check_in']
-                hours, remainder = divmod(duration.total_seconds(), 3600)
-                minutes, _ = divmod(remainder, 60)
-                data['duration'] = f"{int(hours)}h {int(minutes):02d}m"
-                data['status'] = 'present'
-            else:
-                data['status'] = 'invalid_times'
-        elif data['check_in']:
-            data['status'] = 'checked_in_only'
-        elif data['check_out']:
-            data['status'] = 'checked_out_only'
+        attendance_by_date[summary.date] = {
+            'check_in': summary.first_check_in,
+            'check_out': summary.last_check_out,
+            'duration': format_duration(summary.duration, pad_minutes=True),
+            'status': summary.status
+        }
     
     # Sort dates in descending order for display
     sorted_dates = sorted(attendance_by_date.keys(), reverse=True)
@@ -1337,7 +1403,6 @@ def staff_attendance_history(request, user_id):
         'selected_user': staff,  # Ensure selected_user is available
         'is_own_profile': request.user == staff,
         'staff_list': staff_list,  # Staff list for dropdown
-        'attendance_records': attendance_records,
         'attendance_days': attendance_days,
         'start_date': start_date,
         'end_date': end_date,
@@ -1377,52 +1442,31 @@ def all_staff_attendance(request):
         messages.error(request, 'Invalid date format. Using current month.')
     
     # Get all active staff members
-    staff_members = User.objects.filter(is_staff=True, is_active=True).order_by('first_name', 'last_name')
+    staff_members = list(User.objects.filter(is_staff=True, is_active=True).order_by('first_name', 'last_name'))
     
+    # Aggregate check-in/check-out pairs for every staff member at once
+    rollup = rollup_attendance(start_date, end_date, staff_members)
+
     staff_attendance = []
     for staff in staff_members:
-        # Get all check-in/check-out pairs for the date range
-        attendance_data = Attendance.objects.filter(
-            user=staff,
-            timestamp__date__range=[start_date, end_date]
-        ).order_by('timestamp')
-        
-        # Group by date and calculate working hours
-        daily_hours = {}
-        for record in attendance_data:
-            date_key = record.timestamp.date()
-            if date_key not in daily_hours:
-                daily_hours[date_key] = {'check_in': None, 'check_out': None}
-            
-            if record.attendance_type == 'check_in':
-                daily_hours[date_key]['check_in'] = record.timestamp
-            elif record.attendance_type == 'check_out':
-                daily_hours[date_key]['check_out'] = record.timestamp
-        
-        # Calculate total working hours and present days
-        total_hours = 0
-        present_days = 0
-        
-        for date_key, times in daily_hours.items():
-            if times['check_in'] and times['check_out']:
-                duration = times['check_out'] - times['check_in']
-                total_hours += duration.total_seconds() / 3600  # Convert to hours
-                present_days += 1
-        
-        total_days = (end_date - start_date).days + 1
-        attendance_percentage = round((present_days / total_days * 100), 2) if total_days > 0 else 0
-        
+        summary = rollup[staff.pk]
         staff_attendance.append({
             'staff': staff,
-            'present_days': present_days,
-            'total_days': total_days,
-            'attendance_percentage': attendance_percentage,
-            'total_hours': round(total_hours, 2),
-            'last_activity': attendance_data.last().timestamp if attendance_data.exists() else None,
+            'present_days': summary['present_days'],
+            'total_days': summary['total_days'],
+            'attendance_percentage': attendance_percentage(summary['present_days'], summary['total_days']),
+            'total_hours': round(summary['total_hours'], 2),
+            'last_activity': summary['last_activity'],
         })
     
     # Sort by staff name
     staff_attendance = sorted(staff_attendance, key=lambda x: (x['staff'].first_name, x['staff'].last_name))
+
+    if request.GET.get('export') == 'csv':
+        return stream_csv(
+            staff_summary_rows(staff_attendance),
+            f'staff_attendance_{start_date:%Y%m%d}_{end_date:%Y%m%d}.csv'
+        )
     
     return render(request, 'attendance/admin/all_staff_attendance.html', {
         'staff_attendance': staff_attendance,
@@ -1430,3 +1474,182 @@ def all_staff_attendance(request):
         'end_date': end_date.strftime('%Y-%m-%d'),
         'total_days': (end_date - start_date).days + 1,
     })
+
+
+def _heatmap_range(params, today):
+    """Date range of the heatmap: ?period=month|quarter or explicit start/end dates"""
+    period = params.get('period', 'month')
+    start = params.get('start_date')
+    end = params.get('end_date')
+
+    if start and end:
+        start_date = datetime.strptime(start, '%Y-%m-%d').date()
+        end_date = datetime.strptime(end, '%Y-%m-%d').date()
+        if end_date < start_date:
+            raise ValueError('End date cannot be before start date')
+        if (end_date - start_date).days > 365:
+            start_date = end_date - timedelta(days=365)
+        return start_date, end_date, 'custom'
+
+    anchor = datetime.strptime(start, '%Y-%m-%d').date() if start else today
+    if period == 'quarter':
+        start_date = anchor.replace(month=(anchor.month - 1) // 3 * 3 + 1, day=1)
+        months = 3
+    else:
+        start_date = anchor.replace(day=1)
+        months = 1
+        period = 'month'
+    next_month = start_date.month - 1 + months
+    end_date = start_date.replace(year=start_date.year + next_month // 12, month=next_month % 12 + 1) - timedelta(days=1)
+    return start_date, end_date, period
+
+
+def _heatmap_office(request):
+    office_id = request.GET.get('office')
+    return int(office_id) if office_id and office_id.isdigit() else None
+
+
+@login_required
+def attendance_heatmap(request):
+    """Staff x day attendance grid for a month or quarter (admin only)"""
+    if not request.user.is_staff:
+        return redirect('attendance:dashboard')
+
+    today = timezone.now().date()
+    try:
+        start_date, end_date, period = _heatmap_range(request.GET, today)
+    except (ValueError, TypeError):
+        messages.error(request, 'Invalid date format. Using current month.')
+        start_date, end_date, period = _heatmap_range({}, today)
+
+    office_id = _heatmap_office(request)
+    staff = heatmap.staff_for_heatmap(office_id)
+
+    context = {
+        'heatmap': heatmap.heatmap_payload(start_date, end_date, staff, today=today),
+        'start_date': start_date,
+        'end_date': end_date,
+        'period': period,
+        'offices': Office.objects.all().order_by('office_Name'),
+        'selected_office': office_id,
+        'staff_count': len(staff),
+    }
+    return render(request, 'attendance/admin/attendance_heatmap.html', context)
+
+
+@login_required
+def attendance_heatmap_data(request):
+    """JSON form of the staff x day attendance grid (admin only)"""
+    if not request.user.is_staff:
+        return JsonResponse({'success': False, 'error': 'Permission denied.'}, status=403)
+
+    today = timezone.now().date()
+    try:
+        start_date, end_date, _ = _heatmap_range(request.GET, today)
+    except (ValueError, TypeError):
+        return JsonResponse({'success': False, 'error': 'Invalid date range. Use YYYY-MM-DD format.'}, status=400)
+
+    staff = heatmap.staff_for_heatmap(_heatmap_office(request))
+    return JsonResponse(heatmap.heatmap_payload(start_date, end_date, staff, today=today))
+
+
+def _trend_weeks(request):
+    weeks = request.GET.get('weeks')
+    weeks = int(weeks) if weeks and weeks.isdigit() else office_rollups.TREND_WEEKS
+    return min(max(weeks, 1), 104)
+
+
+@login_required
+def office_attendance_trends(request):
+    """Weekly attendance percentage per office over the last year (admin only)"""
+    if not request.user.is_staff:
+        return redirect('attendance:dashboard')
+
+    context = {
+        'offices': Office.objects.all().order_by('office_Name'),
+        'selected_office': _heatmap_office(request),
+        'weeks': _trend_weeks(request),
+    }
+    return render(request, 'attendance/admin/office_trends.html', context)
+
+
+@login_required
+def office_attendance_trends_data(request):
+    """Chart data for the office trends, read from the weekly rollup table only"""
+    if not request.user.is_staff:
+        return JsonResponse({'success': False, 'error': 'Permission denied.'}, status=403)
+
+    payload = office_rollups.office_trend(weeks=_trend_weeks(request), office_id=_heatmap_office(request))
+    response = JsonResponse(payload)
+    # The rollup only moves when the nightly command runs
+    patch_cache_control(response, private=True, max_age=300)
+    return response
+
+
+@login_required
+def import_attendance(request):
+    """Upload a badge reader CSV and bulk import its punches (admin only)"""
+    if not request.user.is_staff:
+        return redirect('attendance:dashboard')
+
+    result = None
+    if request.method == 'POST':
+        form = PunchImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            # Decode the upload line by line instead of reading it into memory
+            lines = io.TextIOWrapper(form.cleaned_data['file'].file, encoding='utf-8-sig', newline='')
+            try:
+                result = import_punches(
+                    lines,
+                    recorded_by=request.user,
+                    source=form.cleaned_data['source'],
+                    tz=ZoneInfo(form.cleaned_data['timezone']),
+                    replace=form.cleaned_data['replace'],
+                    dry_run=form.cleaned_data['dry_run'],
+                )
+            except (ValueError, UnicodeDecodeError) as e:
+                messages.error(request, f'Could not import the file: {e}')
+            else:
+                level = messages.WARNING if result.error_count else messages.SUCCESS
+                prefix = 'Validated (nothing written). ' if form.cleaned_data['dry_run'] else ''
+                messages.add_message(request, level, prefix + result.summary())
+    else:
+        form = PunchImportForm()
+
+    return render(request, 'attendance/admin/import_attendance.html', {'form': form, 'result': result})
+
+
+@login_required
+def leave_staffing_check(request):
+    """JSON staffing check for a prospective leave of the current user"""
+    try:
+        start_date = datetime.strptime(request.GET.get('start_date', ''), '%Y-%m-%d').date()
+        end_date = datetime.strptime(request.GET.get('end_date', ''), '%Y-%m-%d').date()
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Invalid date format. Please use YYYY-MM-DD format.'}, status=400)
+    if end_date < start_date or (end_date - start_date).days > 366:
+        return JsonResponse({'success': False, 'error': 'Invalid date range.'}, status=400)
+
+    staffing = staffing_conflicts(request.user, start_date, end_date)
+    # Colleagues' names are only shown to admins; staff see counts
+    show_names = request.user.is_superuser
+    return JsonResponse({
+        'success': True,
+        'overlapping': [
+            {'start_date': other.start_date.isoformat(), 'end_date': other.end_date.isoformat(), 'status': other.status}
+            for other in staffing['overlapping']
+        ],
+        'office_size': staffing['office_size'],
+        'max_away': staffing['max_away'],
+        'days': [
+            {
+                'date': row['date'].isoformat(),
+                'approved': row['approved'],
+                'pending': row['pending'],
+                'conflict': row in staffing['conflict_days'],
+                **({'people': [person['name'] for person in row['people']]} if show_names else {}),
+            }
+            for row in staffing['days']
+        ],
+        'conflict_days': [row['date'].isoformat() for row in staffing['conflict_days']],
+    })
@@ -0,0 +1,171 @@
+import gzip
+import json
+import logging
+import os
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+
+from django.apps import apps
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_CHUNK_SIZE = 2000
+
+
+class ArchiveSpec:
+    """
+    How one model is archived: which column dates a row and how long rows
+    stay in the database.
+
+    Settings:
+        ARCHIVE_ROOT       directory holding the archive; required, and it must be
+                           on a persistent disk since the app directory is
+                           replaced on every deploy
+        ARCHIVE_RETENTION  {spec name: days kept in the database}
+    """
+
+    def __init__(self, name, model_label, date_field, retention_days, is_datetime=False):
+        self.name = name
+        self.model_label = model_label
+        self.date_field = date_field
+        self.default_retention_days = retention_days
+        self.is_datetime = is_datetime
+
+    @property
+    def model(self):
+        return apps.get_model(self.model_label)
+
+    @property
+    def retention_days(self):
+        return getattr(settings, 'ARCHIVE_RETENTION', {}).get(self.name, self.default_retention_days)
+
+    def cutoff(self, today=None):
+        """Rows dated before this day are archived"""
+        return (today or timezone.now().date()) - timedelta(days=self.retention_days)
+
+    def expired(self, cutoff):
+        if self.is_datetime:
+            # Partitions use UTC days, matching the stored timestamps
+            cutoff = datetime.combine(cutoff, time.min, tzinfo=dt_timezone.utc)
+        return self.model.objects.filter(**{f'{self.date_field}__lt': cutoff})
+
+    def row_date(self, row):
+        value = row[self.date_field]
+        return value.date() if self.is_datetime else value
+
+
+ARCHIVE_SPECS = {
+    spec.name: spec for spec in (
+        ArchiveSpec('attendance', 'attendance.Attendance', 'date', 365),
+        ArchiveSpec('attendance_summary', 'attendance.DailyAttendanceSummary', 'date', 365),
+        ArchiveSpec('chat_history', 'chatbot.ChatHistory', 'timestamp', 180, is_datetime=True),
+    )
+}
+
+
+def archive_configured():
+    return bool(getattr(settings, 'ARCHIVE_ROOT', None))
+
+
+def archive_root():
+    if not archive_configured():
+        # No default: a directory inside the app would vanish with the next deploy,
+        # taking rows already deleted from the database with it
+        raise ImproperlyConfigured('ARCHIVE_ROOT is not set. Point it at a persistent disk before archiving.')
+    return str(settings.ARCHIVE_ROOT)
+
+
+def partition_path(name, year, month):
+    """Monthly partition file: <root>/<name>/<year>/<year>-<month>.jsonl.gz"""
+    return os.path.join(archive_root(), name, f'{year:04d}', f'{year:04d}-{month:02d}.jsonl.gz')
+
+
+def _append(path, rows):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Appending adds a new gzip member; readers see one continuous stream
+    with open(path, 'ab') as raw_file:
+        with gzip.GzipFile(fileobj=raw_file, mode='ab') as archive_file:
+            for row in rows:
+                archive_file.write(json.dumps(row, cls=DjangoJSONEncoder, separators=(',', ':')).encode('utf-8'))
+                archive_file.write(b'\n')
+        raw_file.flush()
+        os.fsync(raw_file.fileno())
+
+
+def archive_expired(spec, cutoff=None, chunk_size=ARCHIVE_CHUNK_SIZE, dry_run=False):
+    """
+    Move the rows of ``spec`` dated before ``cutoff`` into the archive.
+
+    Rows are read in primary-key chunks. Each chunk is appended to its
+    monthly partition files and synced to disk before its rows are deleted
+    in a transaction of their own, so an interrupted run loses nothing; at
+    worst a re-run archives a chunk twice, and readers drop duplicate ids.
+    Returns the number of rows archived.
+    """
+    archive_root()
+    cutoff = cutoff or spec.cutoff()
+    model = spec.model
+    fields = [field.attname for field in model._meta.concrete_fields]
+    pk_name = model._meta.pk.attname
+    expired = spec.expired(cutoff).order_by('pk')
+
+    if dry_run:
+        return expired.count()
+
+    archived = 0
+    last_pk = None
+    while True:
+        chunk = expired if last_pk is None else expired.filter(pk__gt=last_pk)
+        rows = list(chunk.values(*fields)[:chunk_size])
+        if not rows:
+            break
+
+        partitions = {}
+        for row in rows:
+            day = spec.row_date(row)
+            partitions.setdefault((day.year, day.month), []).append(row)
+        for (year, month), partition_rows in partitions.items():
+            _append(partition_path(spec.name, year, month), partition_rows)
+
+        pks = [row[pk_name] for row in rows]
+        with transaction.atomic():
+            model.objects.filter(pk__in=pks).delete()
+
+        archived += len(rows)
+        last_pk = pks[-1]
+        logger.info(f'Archived {archived} {spec.name} rows older than {cutoff}')
+
+    return archived
+
+
+def read_archive(name, start_date, end_date, predicate=None):
+    """
+    Yield the archived rows of spec ``name`` dated within [start_date, end_date].
+
+    Only the monthly partitions overlapping the range are opened. Values
+    come back as stored (dates and datetimes as ISO strings). ``predicate``
+    filters rows before they are yielded; repeated ids are skipped. Nothing
+    is yielded when ARCHIVE_ROOT is not set, as nothing can have been archived.
+    """
+    if not archive_configured():
+        return
+    spec = ARCHIVE_SPECS[name]
+    seen = set()
+    year, month = start_date.year, start_date.month
+    while (year, month) <= (end_date.year, end_date.month):
+        path = partition_path(name, year, month)
+        if os.path.exists(path):
+            with gzip.open(path, 'rt', encoding='utf-8') as archive_file:
+                for line in archive_file:
+                    row = json.loads(line)
+                    day = date.fromisoformat(row[spec.date_field][:10])
+                    if not start_date <= day <= end_date or row['id'] in seen:
+                        continue
+                    if predicate is None or predicate(row):
+                        seen.add(row['id'])
+                        yield row
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
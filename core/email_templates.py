@@ -0,0 +1,51 @@
+import re
+import secrets
+
+from django.template.loader import render_to_string
+from django.utils.html import conditional_escape
+
+
+class CampaignTemplate:
+    """
+    An email rendered once for a whole send, with holes for the few values
+    that differ per recipient.
+
+    The template is rendered with a unique marker in place of each of
+    ``slots``; the output is split on the markers, so render() only has to
+    join the static parts with the escaped recipient values. A slot must
+    be output as-is (``{{ slot }}``, no filters). If a marker does not come
+    through the render unchanged, every render() falls back to rendering
+    the full template.
+    """
+
+    def __init__(self, name, context, slots):
+        self.name = name
+        self.context = dict(context)
+        self.slots = tuple(slots)
+
+        token = secrets.token_hex(8)
+        markers = {f'@@{token}:{slot}@@': slot for slot in self.slots}
+        html = render_to_string(name, {**self.context, **{slot: marker for marker, slot in markers.items()}})
+
+        pattern = re.compile('|'.join(re.escape(marker) for marker in markers))
+        found = pattern.findall(html) if markers else []
+        if set(found) == set(markers):
+            self._parts = pattern.split(html) if markers else [html]
+            self._order = [markers[marker] for marker in found]
+        else:
+            self._parts = self._order = None
+
+    @property
+    def precompiled(self):
+        return self._parts is not None
+
+    def render(self, **values):
+        """The email for one recipient; slot values are HTML-escaped unless marked safe"""
+        if self._parts is None:
+            return render_to_string(self.name, {**self.context, **values})
+        escaped = {slot: str(conditional_escape(values.get(slot, ''))) for slot in self.slots}
+        output = [self._parts[0]]
+        for slot, part in zip(self._order, self._parts[1:]):
+            output.append(escaped[slot])
+            output.append(part)
+        return ''.join(output)
@@ -0,0 +1,40 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.archive import ARCHIVE_CHUNK_SIZE, ARCHIVE_SPECS, archive_configured, archive_expired, archive_root
+
+
+class Command(BaseCommand):
+    help = ('Move Attendance, daily attendance summaries and ChatHistory rows older than their '
+            'retention window into compressed monthly JSONL files under ARCHIVE_ROOT')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--only', action='append', choices=sorted(ARCHIVE_SPECS),
+                            help='Archive only this data set (can be repeated)')
+        parser.add_argument('--before', help='Archive rows dated before this day (YYYY-MM-DD) '
+                                             'instead of using the retention window')
+        parser.add_argument('--chunk-size', type=int, default=ARCHIVE_CHUNK_SIZE)
+        parser.add_argument('--dry-run', action='store_true', help='Only count the rows that would be archived')
+
+    def handle(self, *args, **options):
+        if not archive_configured():
+            raise CommandError('ARCHIVE_ROOT is not set. Point it at a persistent disk: '
+                               'the app directory is replaced on every deploy.')
+
+        cutoff = None
+        if options['before']:
+            try:
+                cutoff = datetime.strptime(options['before'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError(f'Invalid date "{options["before"]}". Use YYYY-MM-DD format.')
+
+        for name in options['only'] or ARCHIVE_SPECS:
+            spec = ARCHIVE_SPECS[name]
+            spec_cutoff = cutoff or spec.cutoff()
+            count = archive_expired(spec, cutoff=spec_cutoff, chunk_size=options['chunk_size'],
+                                    dry_run=options['dry_run'])
+            verb = 'Would archive' if options['dry_run'] else 'Archived'
+            self.stdout.write(self.style.SUCCESS(
+                f'{verb} {count} {name} rows dated before {spec_cutoff} into {archive_root()}'
+            ))
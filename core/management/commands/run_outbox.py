@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.outbox import OUTBOX_BATCH_SIZE, drain_outbox
+
+
+class Command(BaseCommand):
+    help = ('Send the queued transactional emails (password resets, RFP and field job notifications, '
+            'newsletter verification codes). Keep it running as a worker with --loop, or run it every '
+            'minute from cron, e.g. "* * * * * manage.py run_outbox".')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=OUTBOX_BATCH_SIZE,
+                            help=f'Emails per SMTP connection (default {OUTBOX_BATCH_SIZE})')
+        parser.add_argument('--limit', type=int, help='Stop after this many emails')
+        parser.add_argument('--loop', action='store_true', help='Keep polling for new emails instead of exiting')
+        parser.add_argument('--interval', type=int, default=5, help='Seconds between polls with --loop (default 5)')
+
+    def handle(self, *args, **options):
+        for name in ('batch_size', 'limit', 'interval'):
+            if options[name] is not None and options[name] < 1:
+                raise CommandError(f"--{name.replace('_', '-')} must be at least 1.")
+
+        while True:
+            sent, failed, seconds = drain_outbox(batch_size=options['batch_size'], limit=options['limit'])
+            if sent or failed or not options['loop']:
+                self.stdout.write(self.style.SUCCESS(
+                    f'Sent {sent} outbox emails, {failed} failed, in {seconds:.1f}s.'
+                ))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
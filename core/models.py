@@ -428,4 +428,43 @@ class ManagingPartner(models.Model):
 
     def get_formatted_joining_date(self):
         """Return formatted joining date"""
-        return self.joining_date.strftime("%B %d, %Y")
\ No newline at end of file
+        return self.joining_date.strftime("%B %d, %Y")
+
+class OutboxEmail(models.Model):
+    """
+    A transactional email waiting to be sent. Views enqueue rows through
+    core.outbox.enqueue_mail and the run_outbox worker sends them, so no
+    request waits on the SMTP server.
+    """
+    PENDING = 'pending'
+    SENT = 'sent'
+    DEAD = 'dead'
+
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (SENT, 'Sent'),
+        (DEAD, 'Dead'),
+    ]
+
+    subject = models.CharField(max_length=998)
+    body = models.TextField(blank=True)
+    html_body = models.TextField(blank=True)
+    from_email = models.CharField(max_length=254, blank=True)
+    to = models.JSONField(default=list)
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # Earliest time the worker may (re)try the row; pushed forward by backoff and while a worker holds it
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            # Worker scan: status = 'pending' AND next_attempt_at <= now ORDER BY next_attempt_at
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} -> {', '.join(self.to)} ({self.status})"
@@ -0,0 +1,162 @@
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from .models import OutboxEmail
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_BATCH_SIZE = 50
+
+
+def _max_attempts():
+    return getattr(settings, 'OUTBOX_MAX_ATTEMPTS', 5)
+
+
+def _backoff_seconds():
+    return getattr(settings, 'OUTBOX_BACKOFF_SECONDS', 60)
+
+
+def _lease_seconds():
+    return getattr(settings, 'OUTBOX_LEASE_SECONDS', 300)
+
+
+def enqueue_mail(subject, message, from_email, recipient_list, html_message=None):
+    """
+    Drop-in for send_mail() that only stores the email; the run_outbox
+    worker sends it. The row is written in the caller's transaction, so a
+    request that rolls back never sends its email.
+    """
+    return OutboxEmail.objects.create(
+        subject=subject,
+        body=message,
+        html_body=html_message or '',
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL or '',
+        to=list(recipient_list),
+    )
+
+
+def retry_delay(attempts):
+    """Exponential backoff after the given number of failed attempts: 1, 2, 4, ... times the base delay"""
+    return timedelta(seconds=_backoff_seconds() * 2 ** (attempts - 1))
+
+
+def claim_batch(batch_size=OUTBOX_BATCH_SIZE, now=None):
+    """
+    Take up to ``batch_size`` due emails for this worker.
+
+    The rows are locked with SKIP LOCKED (where the database supports it)
+    just long enough to push next_attempt_at one lease ahead, so a second
+    worker skips them, and a worker that dies mid-batch only delays its
+    rows by OUTBOX_LEASE_SECONDS.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        batch = list(
+            OutboxEmail.objects.select_for_update(skip_locked=True)
+            .filter(status=OutboxEmail.PENDING, next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'pk')[:batch_size]
+        )
+        if batch:
+            OutboxEmail.objects.filter(pk__in=[email.pk for email in batch]).update(
+                next_attempt_at=now + timedelta(seconds=_lease_seconds())
+            )
+    return batch
+
+
+def _message(email, connection):
+    message = EmailMultiAlternatives(
+        subject=email.subject,
+        body=email.body,
+        from_email=email.from_email or None,
+        to=email.to,
+        connection=connection,
+    )
+    if email.html_body:
+        message.attach_alternative(email.html_body, 'text/html')
+    return message
+
+
+def _record_failure(email, error):
+    email.attempts += 1
+    email.last_error = error[:1000]
+    if email.attempts >= _max_attempts():
+        email.status = OutboxEmail.DEAD
+        logger.error(f"Outbox email {email.pk} to {email.to} dead-lettered after {email.attempts} attempts: {error}")
+    else:
+        email.next_attempt_at = timezone.now() + retry_delay(email.attempts)
+        logger.warning(f"Outbox email {email.pk} to {email.to} failed (attempt {email.attempts}): {error}")
+    email.save(update_fields=['attempts', 'last_error', 'status', 'next_attempt_at'])
+
+
+def _defer(batch, error):
+    """Put claimed emails back for the next run without using up an attempt"""
+    logger.warning(f"Outbox: could not open mail connection, {len(batch)} emails deferred: {error}")
+    OutboxEmail.objects.filter(pk__in=[email.pk for email in batch]).update(
+        next_attempt_at=timezone.now() + timedelta(seconds=_backoff_seconds()),
+        last_error=f'Could not open mail connection: {error}'[:1000],
+    )
+
+
+def send_batch(batch):
+    """
+    Send claimed emails over one SMTP connection. Each row is marked sent
+    as soon as its message is handed over, so a worker that dies mid-batch
+    does not send it again. A failure is retried with exponential backoff
+    until OUTBOX_MAX_ATTEMPTS, after which the row is dead-lettered
+    (status 'dead') and left for an admin to look at. When the connection
+    cannot be opened at all the emails are only put back by
+    OUTBOX_BACKOFF_SECONDS, so an SMTP outage does not use up their
+    attempts. Returns (sent, failed).
+    """
+    sent = failed = 0
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception as e:
+        _defer(batch, str(e))
+        return 0, len(batch)
+
+    try:
+        for email in batch:
+            try:
+                connection.send_messages([_message(email, connection)])
+            except Exception as e:
+                _record_failure(email, str(e))
+                failed += 1
+            else:
+                OutboxEmail.objects.filter(pk=email.pk).update(
+                    status=OutboxEmail.SENT, sent_at=timezone.now(), last_error='',
+                )
+                sent += 1
+    finally:
+        connection.close()
+    return sent, failed
+
+
+def drain_outbox(batch_size=OUTBOX_BATCH_SIZE, limit=None):
+    """
+    Send due emails batch by batch until none are left (or ``limit`` have
+    been handled). Returns (sent, failed, seconds).
+
+    Settings:
+        OUTBOX_MAX_ATTEMPTS     tries before an email is dead-lettered (default 5)
+        OUTBOX_BACKOFF_SECONDS  delay before the first retry, doubled for each further one (default 60)
+        OUTBOX_LEASE_SECONDS    how long a claimed email is hidden from other workers (default 300)
+    """
+    started = time.perf_counter()
+    sent = failed = 0
+    while limit is None or sent + failed < limit:
+        size = batch_size if limit is None else min(batch_size, limit - sent - failed)
+        batch = claim_batch(size)
+        if not batch:
+            break
+        batch_sent, batch_failed = send_batch(batch)
+        sent += batch_sent
+        failed += batch_failed
+    return sent, failed, time.perf_counter() - started
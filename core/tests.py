@@ -1,3 +1,211 @@
-from django.test import TestCase
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.core import mail
+from django.core.exceptions import ImproperlyConfigured
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import CommandError, call_command
+from django.template.loader import render_to_string
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from attendance.models import DailyAttendanceSummary
+
+from .archive import ARCHIVE_SPECS, _append, archive_expired, partition_path, read_archive
+from .email_templates import CampaignTemplate
+from .models import OutboxEmail, User
+from .outbox import claim_batch, drain_outbox, enqueue_mail
+
+
+class FlakyBackend(EmailBackend):
+    """locmem backend that refuses addresses at refused.example"""
+
+    def send_messages(self, messages):
+        for message in messages:
+            if any(address.endswith('@refused.example') for address in message.to):
+                raise ConnectionError('Recipient refused')
+        return super().send_messages(messages)
+
+
+class UnreachableBackend(EmailBackend):
+    """locmem backend whose SMTP server cannot be reached"""
+
+    def open(self):
+        raise ConnectionError('Connection refused')
+
+
+class WorkerKilled(BaseException):
+    pass
+
+
+class DyingBackend(EmailBackend):
+    """locmem backend whose worker is killed when it reaches an address at dies.example"""
+
+    def send_messages(self, messages):
+        if any(address.endswith('@dies.example') for message in messages for address in message.to):
+            raise WorkerKilled()
+        return super().send_messages(messages)
+
+
+class OutboxTests(TestCase):
+    def test_enqueue_only_stores_the_email(self):
+        enqueue_mail('Hello', 'Plain', 'from@example.com', ['to@example.com'], html_message='<p>Hi</p>')
+
+        self.assertEqual(len(mail.outbox), 0)
+        sent, failed, _ = drain_outbox()
+        self.assertEqual((sent, failed), (1, 0))
+        self.assertEqual(mail.outbox[0].to, ['to@example.com'])
+        self.assertEqual(mail.outbox[0].alternatives[0][0], '<p>Hi</p>')
+        self.assertEqual(OutboxEmail.objects.get().status, OutboxEmail.SENT)
+
+    def test_forgot_password_does_not_wait_for_smtp(self):
+        User.objects.create_user(email='staff@example.com', password='pass', first_name='Sam', last_name='Lee')
+
+        response = self.client.post(reverse('forgot_password'), {'email': 'staff@example.com'})
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(OutboxEmail.objects.get().to, ['staff@example.com'])
+        call_command('run_outbox', stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_claimed_rows_are_hidden_from_other_workers(self):
+        enqueue_mail('Hello', 'Plain', 'from@example.com', ['to@example.com'])
+
+        self.assertEqual(len(claim_batch()), 1)
+        self.assertEqual(claim_batch(), [])
+
+    @override_settings(EMAIL_BACKEND='core.tests.FlakyBackend', OUTBOX_MAX_ATTEMPTS=2, OUTBOX_BACKOFF_SECONDS=60)
+    def test_failures_back_off_then_dead_letter(self):
+        enqueue_mail('Hello', 'Plain', 'from@example.com', ['bad@refused.example'])
+        enqueue_mail('Hello', 'Plain', 'from@example.com', ['good@example.com'])
+
+        self.assertEqual(drain_outbox()[:2], (1, 1))
+        failed = OutboxEmail.objects.get(to=['bad@refused.example'])
+        self.assertEqual((failed.status, failed.attempts), (OutboxEmail.PENDING, 1))
+        self.assertGreater(failed.next_attempt_at, timezone.now() + timedelta(seconds=50))
+
+        # Nothing is due until the backoff has passed
+        self.assertEqual(drain_outbox()[:2], (0, 0))
+        OutboxEmail.objects.filter(pk=failed.pk).update(next_attempt_at=timezone.now())
+        self.assertEqual(drain_outbox()[:2], (0, 1))
+
+        failed.refresh_from_db()
+        self.assertEqual((failed.status, failed.attempts), (OutboxEmail.DEAD, 2))
+        self.assertIn('Recipient refused', failed.last_error)
+        self.assertEqual([message.to for message in mail.outbox], [['good@example.com']])
+
+
+    @override_settings(EMAIL_BACKEND='core.tests.UnreachableBackend', OUTBOX_MAX_ATTEMPTS=1, OUTBOX_BACKOFF_SECONDS=60)
+    def test_smtp_outage_does_not_use_up_attempts(self):
+        enqueue_mail('Hello', 'Plain', 'from@example.com', ['to@example.com'])
+
+        self.assertEqual(drain_outbox()[:2], (0, 1))
+
+        email = OutboxEmail.objects.get()
+        self.assertEqual((email.status, email.attempts), (OutboxEmail.PENDING, 0))
+        self.assertIn('Connection refused', email.last_error)
+        self.assertGreater(email.next_attempt_at, timezone.now() + timedelta(seconds=50))
+
+    @override_settings(EMAIL_BACKEND='core.tests.DyingBackend')
+    def test_emails_sent_before_a_worker_dies_stay_sent(self):
+        enqueue_mail('Hello', 'Plain', 'from@example.com', ['first@example.com'])
+        enqueue_mail('Hello', 'Plain', 'from@example.com', ['last@dies.example'])
+
+        with self.assertRaises(WorkerKilled):
+            drain_outbox()
+
+        self.assertEqual(list(OutboxEmail.objects.order_by('pk').values_list('to', 'status')), [
+            (['first@example.com'], OutboxEmail.SENT), (['last@dies.example'], OutboxEmail.PENDING),
+        ])
+
+
+class CampaignTemplateTests(TestCase):
+    def setUp(self):
+        self.newsletter = SimpleNamespace(title='Q3 <Tax> update', message='Line one\nLine two')
+
+    def test_matches_a_full_render(self):
+        template = CampaignTemplate('newsletter/newsletter_email.html', {'newsletter': self.newsletter},
+                                    slots=('subscriber_name', 'unsubscribe_url'))
+        self.assertTrue(template.precompiled)
+
+        values = {'subscriber_name': 'Ama & <Kofi>', 'unsubscribe_url': 'https://example.com/u/?t=a:b'}
+        self.assertEqual(
+            template.render(**values),
+            render_to_string('newsletter/newsletter_email.html', {'newsletter': self.newsletter, **values}),
+        )
+
+    def test_filtered_slot_falls_back_to_full_render(self):
+        template = CampaignTemplate('newsletter/otp_email.html', {'otp': '1234'}, slots=('user_name', 'otp'))
+        self.assertTrue(template.precompiled)
+
+        template = CampaignTemplate('newsletter/newsletter_email.html', {}, slots=('newsletter',))
+        self.assertFalse(template.precompiled)
+        self.assertIn('Q3 &lt;Tax&gt; update', template.render(newsletter=self.newsletter))
+
+
+class ArchiveTests(TestCase):
+
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        settings_override = override_settings(ARCHIVE_ROOT=root, ARCHIVE_RETENTION={'attendance_summary': 365})
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.spec = ARCHIVE_SPECS['attendance_summary']
+        self.user = User.objects.create_user(email='archive@example.com', password='pass',
+                                             first_name='Archive', last_name='User')
+        today = timezone.now().date()
+        self.old_days = [today - timedelta(days=offset) for offset in (400, 420, 440, 460, 480)]
+        self.recent_day = today - timedelta(days=10)
+        for day in self.old_days + [self.recent_day]:
+            DailyAttendanceSummary.objects.create(user=self.user, date=day, status=DailyAttendanceSummary.ABSENT)
+
+    def archived(self):
+        return list(read_archive('attendance_summary', min(self.old_days), self.recent_day))
+
+    def test_round_trip(self):
+        expected = list(DailyAttendanceSummary.objects.filter(date__in=self.old_days).order_by('pk').values())
+
+        self.assertEqual(archive_expired(self.spec, chunk_size=2), len(self.old_days))
+
+        rows = sorted(self.archived(), key=lambda row: row['id'])
+        self.assertEqual([row['id'] for row in rows], [row['id'] for row in expected])
+        self.assertEqual([row['date'] for row in rows], [row['date'].isoformat() for row in expected])
+        self.assertEqual({row['status'] for row in rows}, {DailyAttendanceSummary.ABSENT})
+        self.assertEqual(list(DailyAttendanceSummary.objects.values_list('date', flat=True)), [self.recent_day])
+
+    def test_rows_are_deleted_only_once_written(self):
+        with mock.patch('core.archive._append', side_effect=OSError('disk full')), self.assertRaises(OSError):
+            archive_expired(self.spec)
+        self.assertEqual(DailyAttendanceSummary.objects.count(), len(self.old_days) + 1)
+
+        out = StringIO()
+        call_command('archive_records', only=['attendance_summary'], dry_run=True, stdout=out)
+        self.assertIn(f'Would archive {len(self.old_days)} attendance_summary rows', out.getvalue())
+        self.assertEqual(self.archived(), [])
+
+    def test_rerun_duplicates_are_skipped_on_read(self):
+        rows = list(self.spec.expired(self.spec.cutoff()).values())
+        archive_expired(self.spec)
+        # A run that died between writing and deleting leaves the same rows in the file twice
+        for row in rows:
+            _append(partition_path('attendance_summary', row['date'].year, row['date'].month), [row])
+
+        ids = [row['id'] for row in self.archived()]
+        self.assertEqual(sorted(ids), sorted(row['id'] for row in rows))
+
+    def test_refuses_to_run_without_archive_root(self):
+        with override_settings(ARCHIVE_ROOT=None):
+            with self.assertRaises(CommandError):
+                call_command('archive_records', stdout=StringIO())
+            with self.assertRaises(ImproperlyConfigured):
+                archive_expired(self.spec)
+            self.assertEqual(self.archived(), [])
+        self.assertEqual(DailyAttendanceSummary.objects.count(), len(self.old_days) + 1)
@@ -966,6 +966,7 @@ from django.utils.html import strip_tags
 from django.conf import settings
 from django.utils import timezone  # <-- Make sure this is imported
 from .models import User, PasswordResetOTP
+from .outbox import enqueue_mail
 
 def forgot_password(request):
     if request.method == 'POST':
@@ -993,7 +994,7 @@ def forgot_password(request):
             from_email = settings.EMAIL_HOST_USER
             recipient_list = [user.email]
 
-            send_mail(
+            enqueue_mail(
                 subject,
                 plain_message,
                 from_email,
@@ -131,6 +131,29 @@ DATABASES = {
 }
 
 
+# Cache shared by every gunicorn worker and by the cron commands: the
+# dashboard versions, holiday bitmaps and report caches only stay
+# consistent if all processes see the same entries. Redis when REDIS_URL
+# is set, otherwise a database table created by "manage.py createcachetable".
+# The attendance counters need atomic increments and live in their own
+# table (attendance.AttendanceCounter), whichever backend this is.
+REDIS_URL = os.environ.get('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'django_cache',
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -314,6 +337,13 @@ CSRF_TRUSTED_ORIGINS = [
     'http://ob-global.onrender.com',
 ]
 
+# Absolute base URL for links in emails sent outside a request (newsletter unsubscribe links)
+SITE_URL = os.environ.get('SITE_URL', 'https://ob-global.onrender.com')
+
+# Directory for rows moved out of the database by archive_records. Must be a persistent
+# disk: the app directory is replaced on every deploy. Archiving refuses to run while unset
+ARCHIVE_ROOT = os.environ.get('ARCHIVE_ROOT')
+
 # Session settings for 15-minute inactivity timeout
 SESSION_COOKIE_AGE = 900  # 15 minutes
 SESSION_SAVE_EVERY_REQUEST = True  # CRITICAL: This resets the timer on each request
@@ -8,6 +8,7 @@ from django.utils import timezone
 from .models import FieldJob, FieldJobAssignment, FieldReport
 from .forms import FieldJobForm, FieldReportForm
 from core.models import User
+from core.outbox import enqueue_mail
 import json
 from django.contrib import messages
 from django.core.exceptions import PermissionDenied
@@ -603,7 +604,7 @@ def field_report_detail(request, report_id):
 
 
 def send_poc_approval_email(field_job, assignment):
-    """Send approval code email to POC for a specific assignment"""
+    """Queue the approval code email to the POC for a specific assignment"""
     try:
         subject = f'Field Job Approval Code - {field_job.client_name}'
 
@@ -631,16 +632,15 @@ def send_poc_approval_email(field_job, assignment):
 
         message = render_to_string('fieldwork/emails/poc_approval_email.html', context)
 
-        send_mail(
+        enqueue_mail(
             subject,
             f'Please use approval code {assignment.poc_approval_code} for {staff_name} at {field_job.client_name} on {formatted_datetime}.',
             settings.DEFAULT_FROM_EMAIL,
             [field_job.poc_email],
             html_message=message,
-            fail_silently=False,
         )
 
-        logger.info(f"POC approval email sent to {field_job.poc_email} for assignment {assignment.id}")
+        logger.info(f"POC approval email queued for {field_job.poc_email} for assignment {assignment.id}")
 
     except Exception as e:
         logger.error(f"Failed to send POC approval email: {str(e)}")
@@ -648,7 +648,7 @@ def send_poc_approval_email(field_job, assignment):
 
 
 def send_staff_assignment_email(field_job, staff):
-    """Send assignment notification email to staff member"""
+    """Queue the assignment notification email to a staff member"""
     try:
         subject = f'New Field Job Assignment - {field_job.client_name}'
 
@@ -673,16 +673,15 @@ def send_staff_assignment_email(field_job, staff):
 
         message = render_to_string('fieldwork/emails/staff_assignment_email.html', context)
 
-        send_mail(
+        enqueue_mail(
             subject,
             f'You have been assigned to a field job at {field_job.client_name} on {formatted_datetime}.',
             settings.DEFAULT_FROM_EMAIL,
             [staff.email],
             html_message=message,
-            fail_silently=False,
         )
 
-        logger.info(f"Staff assignment email sent to {staff.email} for job {field_job.id}")
+        logger.info(f"Staff assignment email queued for {staff.email} for job {field_job.id}")
 
     except Exception as e:
         logger.error(f"Failed to send staff assignment email: {str(e)}")
@@ -0,0 +1,259 @@
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core import signing
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.urls import reverse
+from django.utils import timezone
+
+from core.email_templates import CampaignTemplate
+
+from .models import Newsletter, NewsletterDelivery, Subscriber, masks_sharing
+from .stats import invalidate_stats
+
+logger = logging.getLogger(__name__)
+
+
+def _batch_size():
+    return getattr(settings, 'NEWSLETTER_DELIVERY_BATCH_SIZE', 50)
+
+
+def _max_attempts():
+    return getattr(settings, 'NEWSLETTER_DELIVERY_MAX_ATTEMPTS', 3)
+
+
+def _lease_seconds():
+    return getattr(settings, 'NEWSLETTER_DELIVERY_LEASE_SECONDS', 300)
+
+
+UNSUBSCRIBE_SALT = 'newsletter.unsubscribe'
+
+
+def unsubscribe_url(subscriber_id):
+    """Absolute link that lets a subscriber leave the list without logging in; signed with SECRET_KEY"""
+    token = signing.dumps(subscriber_id, salt=UNSUBSCRIBE_SALT, compress=True)
+    return f"{getattr(settings, 'SITE_URL', '').rstrip('/')}{reverse('newsletter:unsubscribe')}?t={token}"
+
+
+def subscriber_from_token(token):
+    """Subscriber id of an unsubscribe token; raises signing.BadSignature for anything forged"""
+    return signing.loads(token, salt=UNSUBSCRIBE_SALT)
+
+
+def newsletter_template(newsletter):
+    """The newsletter email, rendered once; only the recipient's name and unsubscribe link vary"""
+    return CampaignTemplate('newsletter/newsletter_email.html', {'newsletter': newsletter},
+                            slots=('subscriber_name', 'unsubscribe_url'))
+
+
+def audience(newsletter):
+    """
+    Verified subscribers sharing at least one preference with the newsletter
+    (all of them if it has none): one query on subscriber_audience_idx.
+    """
+    subscribers = Subscriber.objects.filter(is_verified=True)
+    if newsletter.preference_mask:
+        subscribers = subscribers.filter(preference_mask__in=masks_sharing(newsletter.preference_mask))
+    return subscribers
+
+
+def queue_newsletter(newsletter):
+    """
+    Create a pending delivery for every recipient of the newsletter.
+
+    Sending a newsletter that already went out starts a new campaign, so
+    its old deliveries are dropped first. Otherwise existing rows are kept:
+    queueing again only adds subscribers who joined since, and a send that
+    was interrupted carries on with its pending rows. Returns the number
+    of deliveries still to be sent.
+    """
+    with transaction.atomic():
+        if newsletter.sent:
+            newsletter.deliveries.all().delete()
+            newsletter.sent = False
+            newsletter.sent_at = None
+            newsletter.save(update_fields=['sent', 'sent_at'])
+
+        recipients = audience(newsletter).order_by('pk').values_list('pk', 'email')
+        NewsletterDelivery.objects.bulk_create(
+            (NewsletterDelivery(newsletter=newsletter, subscriber_id=pk, email=email)
+             for pk, email in recipients.iterator(chunk_size=2000)),
+            batch_size=1000,
+            ignore_conflicts=True,
+        )
+    return _outstanding(newsletter).count()
+
+
+def _outstanding(newsletter):
+    """Deliveries of the newsletter that still have to go out: pending, or failed with attempts left"""
+    return newsletter.deliveries.filter(
+        Q(status=NewsletterDelivery.PENDING)
+        | Q(status=NewsletterDelivery.FAILED, attempts__lt=_max_attempts())
+    )
+
+
+def delivery_progress(newsletter):
+    """Per-status delivery counts of the newsletter, from one grouped query"""
+    counts = dict(newsletter.deliveries.order_by().values_list('status').annotate(total=Count('pk')))
+    progress = {status: counts.get(status, 0) for status, _ in NewsletterDelivery.STATUS_CHOICES}
+    progress['total'] = sum(counts.values())
+    return progress
+
+
+def _message(newsletter, template, delivery, connection):
+    html_content = template.render(
+        subscriber_name=delivery.subscriber.first_name,
+        unsubscribe_url=unsubscribe_url(delivery.subscriber_id),
+    )
+    message = EmailMessage(
+        subject=newsletter.title,
+        body=html_content,
+        from_email=settings.EMAIL_HOST_USER,
+        to=[delivery.email],
+        connection=connection,
+    )
+    message.content_subtype = 'html'
+    return message
+
+
+def claim_batch(newsletter, batch_size, cursor=0, now=None):
+    """
+    Take up to ``batch_size`` outstanding deliveries of the newsletter after
+    ``cursor`` for this run.
+
+    The rows are locked with SKIP LOCKED (where the database supports it)
+    just long enough to set claimed_until one lease ahead, so an overlapping
+    run (a cron tick while the previous send is still going) skips them. A
+    run that dies mid-batch only holds its rows for
+    NEWSLETTER_DELIVERY_LEASE_SECONDS.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        claimed = list(
+            _outstanding(newsletter).select_for_update(skip_locked=True)
+            .filter(Q(claimed_until__isnull=True) | Q(claimed_until__lte=now), pk__gt=cursor)
+            .order_by('pk').values_list('pk', flat=True)[:batch_size]
+        )
+        if claimed:
+            NewsletterDelivery.objects.filter(pk__in=claimed).update(
+                claimed_until=now + timedelta(seconds=_lease_seconds())
+            )
+    return list(
+        NewsletterDelivery.objects.filter(pk__in=claimed).order_by('pk')
+        .select_related('subscriber').only('pk', 'email', 'subscriber__first_name')
+    ) if claimed else []
+
+
+def _send_batch(newsletter, template, batch):
+    """
+    Send one claimed batch over a single SMTP connection. Each message goes
+    through send_messages on the open connection so a refused address only
+    fails its own row, and each row is recorded as soon as its message is
+    handed over, so a run that dies mid-batch does not send it again.
+    """
+    sent = failed = 0
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception as e:
+        logger.error(f"Newsletter {newsletter.pk}: could not open mail connection: {e}")
+        for delivery in batch:
+            _record_failure(delivery, str(e))
+        return 0, len(batch)
+
+    try:
+        for delivery in batch:
+            try:
+                connection.send_messages([_message(newsletter, template, delivery, connection)])
+            except Exception as e:
+                logger.warning(f"Newsletter {newsletter.pk}: delivery to {delivery.email} failed: {e}")
+                _record_failure(delivery, str(e))
+                failed += 1
+            else:
+                NewsletterDelivery.objects.filter(pk=delivery.pk).update(
+                    status=NewsletterDelivery.SENT, sent_at=timezone.now(), attempts=F('attempts') + 1,
+                    last_error='', claimed_until=None,
+                )
+                sent += 1
+    finally:
+        connection.close()
+    return sent, failed
+
+
+def _record_failure(delivery, error):
+    NewsletterDelivery.objects.filter(pk=delivery.pk).update(
+        status=NewsletterDelivery.FAILED, attempts=F('attempts') + 1, last_error=error[:1000], claimed_until=None,
+    )
+
+
+def deliver_newsletter(newsletter, batch_size=None, limit=None):
+    """
+    Work off the outstanding deliveries of one newsletter.
+
+    Rows are claimed in primary key order, ``batch_size`` at a time (see
+    claim_batch), and every batch reuses one SMTP connection. Each row is
+    visited at most once per call, so a failing address is retried on the
+    next run until it reaches NEWSLETTER_DELIVERY_MAX_ATTEMPTS. Rows claimed
+    by another run are left to it. The email body is rendered once for the
+    whole send; per recipient only the name and unsubscribe link are filled
+    in. When nothing is left outstanding the newsletter is marked sent.
+    ``limit`` caps the number of recipients handled by this call. Returns
+    (sent, failed).
+
+    Settings:
+        NEWSLETTER_DELIVERY_BATCH_SIZE     recipients per SMTP connection (default 50)
+        NEWSLETTER_DELIVERY_MAX_ATTEMPTS   tries per recipient before giving up (default 3)
+        NEWSLETTER_DELIVERY_LEASE_SECONDS  how long a claimed row is hidden from other runs (default 300)
+    """
+    batch_size = batch_size or _batch_size()
+    template = newsletter_template(newsletter)
+
+    # Subscribers who unsubscribed or were deleted since the send was queued are skipped
+    _outstanding(newsletter).filter(subscriber__isnull=True).update(
+        status=NewsletterDelivery.FAILED, attempts=_max_attempts(), last_error='Unsubscribed before delivery',
+    )
+
+    sent = failed = 0
+    cursor = 0
+    while limit is None or sent + failed < limit:
+        size = batch_size if limit is None else min(batch_size, limit - sent - failed)
+        batch = claim_batch(newsletter, size, cursor=cursor)
+        if not batch:
+            break
+        cursor = batch[-1].pk
+        batch_sent, batch_failed = _send_batch(newsletter, template, batch)
+        sent += batch_sent
+        failed += batch_failed
+
+    if not _outstanding(newsletter).exists():
+        if Newsletter.objects.filter(pk=newsletter.pk, sent=False).update(sent=True, sent_at=timezone.now()):
+            invalidate_stats()
+    return sent, failed
+
+
+def deliver_pending(batch_size=None, limit=None):
+    """
+    Deliver every newsletter with outstanding recipients, oldest first.
+    Returns (sent, failed, seconds) for the whole run.
+    """
+    started = time.perf_counter()
+    sent = failed = 0
+    newsletter_ids = (
+        NewsletterDelivery.objects.filter(
+            Q(status=NewsletterDelivery.PENDING)
+            | Q(status=NewsletterDelivery.FAILED, attempts__lt=_max_attempts())
+        ).order_by('newsletter_id').values_list('newsletter_id', flat=True).distinct()
+    )
+    for newsletter in Newsletter.objects.filter(pk__in=list(newsletter_ids)).order_by('pk'):
+        remaining = None if limit is None else limit - sent - failed
+        if remaining is not None and remaining <= 0:
+            break
+        newsletter_sent, newsletter_failed = deliver_newsletter(newsletter, batch_size=batch_size, limit=remaining)
+        sent += newsletter_sent
+        failed += newsletter_failed
+        logger.info(f"Newsletter {newsletter.pk}: {newsletter_sent} sent, {newsletter_failed} failed")
+    return sent, failed, time.perf_counter() - started
@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from newsletter.delivery import deliver_pending
+
+
+class Command(BaseCommand):
+    help = ('Send the queued newsletter deliveries in batches, one SMTP connection per batch. '
+            'Run it every few minutes from cron, e.g. "*/5 * * * * manage.py send_newsletter_deliveries", '
+            'or keep it running as a worker with --loop.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int,
+                            help='Recipients per SMTP connection (default: NEWSLETTER_DELIVERY_BATCH_SIZE or 50)')
+        parser.add_argument('--limit', type=int, help='Stop after this many recipients')
+        parser.add_argument('--loop', action='store_true', help='Keep polling for new deliveries instead of exiting')
+        parser.add_argument('--interval', type=int, default=30,
+                            help='Seconds between polls with --loop (default 30)')
+
+    def handle(self, *args, **options):
+        for name in ('batch_size', 'limit'):
+            if options[name] is not None and options[name] < 1:
+                raise CommandError(f"--{name.replace('_', '-')} must be at least 1.")
+        if options['interval'] < 1:
+            raise CommandError('--interval must be at least 1.')
+
+        while True:
+            sent, failed, seconds = deliver_pending(batch_size=options['batch_size'], limit=options['limit'])
+            if sent or failed or not options['loop']:
+                rate = (sent + failed) / seconds if seconds else 0
+                self.stdout.write(self.style.SUCCESS(
+                    f'Sent {sent} newsletter emails, {failed} failed, in {seconds:.1f}s ({rate:.1f} emails/s).'
+                ))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
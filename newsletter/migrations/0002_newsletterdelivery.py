@@ -0,0 +1,33 @@
+# Generated by Django 5.2.1 on 2026-10-18 05:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('newsletter', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NewsletterDelivery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('email', models.EmailField(max_length=254)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('sent', 'Sent'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('newsletter', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='deliveries', to='newsletter.newsletter')),
+                ('subscriber', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='deliveries', to='newsletter.subscriber')),
+            ],
+            options={
+                'verbose_name_plural': 'Newsletter deliveries',
+                'indexes': [models.Index(fields=['newsletter', 'status', 'id'], name='newsletter_delivery_queue_idx')],
+                'unique_together': {('newsletter', 'email')},
+            },
+        ),
+    ]
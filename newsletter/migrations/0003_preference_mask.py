@@ -0,0 +1,49 @@
+# Generated by Django 5.2.1 on 2026-10-18 05:40
+
+from django.db import migrations, models
+from django.db.models import F
+
+# Frozen copy of newsletter.models.PREFERENCE_BITS as of this migration
+PREFERENCE_BITS = {
+    'audit': 1 << 0,
+    'tax': 1 << 1,
+    'consulting': 1 << 2,
+    'forensic_service': 1 << 3,
+    'managed_service': 1 << 4,
+    'technology_solution': 1 << 5,
+    'advisory': 1 << 6,
+}
+
+
+def fill_preference_masks(apps, schema_editor):
+    """Set preference_mask from the booleans: one UPDATE per preference and model"""
+    for model_name in ('Subscriber', 'Newsletter'):
+        model = apps.get_model('newsletter', model_name)
+        model.objects.update(preference_mask=0)
+        for field, bit in PREFERENCE_BITS.items():
+            model.objects.filter(**{field: True}).update(preference_mask=F('preference_mask') + bit)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('newsletter', '0002_newsletterdelivery'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='newsletter',
+            name='preference_mask',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='subscriber',
+            name='preference_mask',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='subscriber',
+            index=models.Index(fields=['is_verified', 'preference_mask'], name='subscriber_audience_idx'),
+        ),
+        migrations.RunPython(fill_preference_masks, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 05:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('newsletter', '0003_preference_mask'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='newsletterdelivery',
+            name='claimed_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
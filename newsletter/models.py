@@ -3,8 +3,49 @@
 from django.db import models
 from django.utils import timezone
 
+# Bit of each preference in ``preference_mask``. Append new preferences at
+# the end: the bits are stored, so existing ones must never be renumbered.
+PREFERENCE_BITS = {
+    'audit': 1 << 0,
+    'tax': 1 << 1,
+    'consulting': 1 << 2,
+    'forensic_service': 1 << 3,
+    'managed_service': 1 << 4,
+    'technology_solution': 1 << 5,
+    'advisory': 1 << 6,
+}
+ALL_PREFERENCES = sum(PREFERENCE_BITS.values())
 
-class Subscriber(models.Model):
+
+def masks_sharing(mask):
+    """
+    Every preference mask with at least one bit in common with ``mask``.
+    With seven preferences that is at most 127 values, which lets "shares a
+    preference" run as an index lookup (preference_mask IN ...) instead of
+    a bitwise expression the database has to evaluate row by row.
+    """
+    return [candidate for candidate in range(1, ALL_PREFERENCES + 1) if candidate & mask]
+
+
+class PreferenceMaskMixin:
+    """
+    Keeps ``preference_mask`` in step with the seven preference booleans on
+    every save(). Queryset.update() on the booleans bypasses it; update the
+    mask in the same call when doing that.
+    """
+
+    def compute_preference_mask(self):
+        return sum(bit for field, bit in PREFERENCE_BITS.items() if getattr(self, field))
+
+    def save(self, *args, **kwargs):
+        self.preference_mask = self.compute_preference_mask()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and set(update_fields) & PREFERENCE_BITS.keys():
+            kwargs['update_fields'] = {*update_fields, 'preference_mask'}
+        super().save(*args, **kwargs)
+
+
+class Subscriber(PreferenceMaskMixin, models.Model):
     """
     Stores a subscriber's information and newsletter preferences.
     """
@@ -22,17 +63,23 @@ class Subscriber(models.Model):
     managed_service = models.BooleanField(default=False)
     technology_solution = models.BooleanField(default=False)
     advisory = models.BooleanField(default=False)
+    # Bitwise OR of PREFERENCE_BITS for the booleans above, maintained by save()
+    preference_mask = models.PositiveSmallIntegerField(default=0)
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Audience selection: is_verified = 1 AND preference_mask IN (...)
+            models.Index(fields=['is_verified', 'preference_mask'], name='subscriber_audience_idx'),
+        ]
+
     def __str__(self):
         return self.email
 
 
-from django.db import models
-
-class Newsletter(models.Model):
+class Newsletter(PreferenceMaskMixin, models.Model):
     """
     Stores newsletter content created by the admin.
     """
@@ -47,6 +94,8 @@ class Newsletter(models.Model):
     managed_service = models.BooleanField(default=False)
     technology_solution = models.BooleanField(default=False)
     advisory = models.BooleanField(default=False)
+    # Bitwise OR of PREFERENCE_BITS for the booleans above, maintained by save()
+    preference_mask = models.PositiveSmallIntegerField(default=0)
 
     sent = models.BooleanField(default=False)
     sent_at = models.DateTimeField(blank=True, null=True)
@@ -74,4 +123,43 @@ class Newsletter(models.Model):
         return preferences
 
     def __str__(self):
-        return self.title
\ No newline at end of file
+        return self.title
+
+class NewsletterDelivery(models.Model):
+    """
+    One recipient of a newsletter send. Rows are queued when the admin sends
+    the newsletter and worked off in batches by the delivery engine, so an
+    interrupted send resumes with the rows still pending.
+    """
+    PENDING = 'pending'
+    SENT = 'sent'
+    FAILED = 'failed'
+
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (SENT, 'Sent'),
+        (FAILED, 'Failed'),
+    ]
+
+    newsletter = models.ForeignKey(Newsletter, on_delete=models.CASCADE, related_name='deliveries')
+    subscriber = models.ForeignKey(Subscriber, on_delete=models.SET_NULL, null=True, blank=True,
+                                   related_name='deliveries')
+    email = models.EmailField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    # Set while a delivery run holds the row, so an overlapping run skips it
+    claimed_until = models.DateTimeField(blank=True, null=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name_plural = 'Newsletter deliveries'
+        unique_together = ('newsletter', 'email')
+        indexes = [
+            # Work queue scan: newsletter = X AND status = Y AND id > cursor
+            models.Index(fields=['newsletter', 'status', 'id'], name='newsletter_delivery_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.newsletter} -> {self.email} ({self.status})"
@@ -0,0 +1,12 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Newsletter, Subscriber
+from .stats import invalidate_stats
+
+
+@receiver([post_save, post_delete], sender=Subscriber)
+@receiver([post_save, post_delete], sender=Newsletter)
+def refresh_dashboard_stats(sender, **kwargs):
+    """Every dashboard number is a count over these two tables"""
+    invalidate_stats()
@@ -0,0 +1,54 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Q
+
+from .models import PREFERENCE_BITS, Newsletter, Subscriber
+
+STATS_CACHE_KEY = 'newsletter:dashboard:stats'
+
+
+def _timeout():
+    return getattr(settings, 'NEWSLETTER_STATS_CACHE_TIMEOUT', 300)
+
+
+def compute_stats():
+    """Dashboard numbers from one aggregate query per model"""
+    subscribers = Subscriber.objects.aggregate(
+        total=Count('pk'),
+        verified=Count('pk', filter=Q(is_verified=True)),
+        **{field: Count('pk', filter=Q(**{field: True})) for field in PREFERENCE_BITS},
+    )
+    newsletters = Newsletter.objects.aggregate(
+        total=Count('pk'),
+        sent=Count('pk', filter=Q(sent=True)),
+    )
+    return {
+        'total_subscribers': subscribers['total'],
+        'verified_subscribers': subscribers['verified'],
+        'unverified_subscribers': subscribers['total'] - subscribers['verified'],
+        'total_newsletters': newsletters['total'],
+        'sent_newsletters': newsletters['sent'],
+        'unsent_newsletters': newsletters['total'] - newsletters['sent'],
+        'preference_labels': list(PREFERENCE_BITS),
+        'preference_data': [subscribers[field] for field in PREFERENCE_BITS],
+    }
+
+
+def dashboard_stats():
+    """
+    compute_stats(), cached until a subscriber or newsletter changes.
+
+    Settings:
+        NEWSLETTER_STATS_CACHE_TIMEOUT  upper bound on staleness for writes that bypass signals (default 300)
+    """
+    stats = cache.get(STATS_CACHE_KEY)
+    if stats is None:
+        stats = compute_stats()
+        cache.set(STATS_CACHE_KEY, stats, _timeout())
+    return stats
+
+
+def invalidate_stats():
+    """Drop the cached stats once the surrounding transaction commits"""
+    transaction.on_commit(lambda: cache.delete(STATS_CACHE_KEY))
@@ -1,3 +1,215 @@
-from django.test import TestCase
+from datetime import timedelta
+from io import StringIO
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .delivery import audience, deliver_newsletter, delivery_progress, queue_newsletter, unsubscribe_url
+from .models import PREFERENCE_BITS, Newsletter, NewsletterDelivery, Subscriber
+from .stats import STATS_CACHE_KEY, dashboard_stats
+
+
+class RefusingBackend(EmailBackend):
+    """locmem backend that refuses addresses at refused.example"""
+
+    def send_messages(self, messages):
+        for message in messages:
+            if any(address.endswith('@refused.example') for address in message.to):
+                raise ValueError('Recipient refused')
+        return super().send_messages(messages)
+
+
+class OverlappingRunBackend(EmailBackend):
+    """locmem backend that starts a second delivery run while the first is mid-batch, like an early cron tick"""
+    newsletter = None
+
+    def send_messages(self, messages):
+        newsletter, OverlappingRunBackend.newsletter = OverlappingRunBackend.newsletter, None
+        if newsletter is not None:
+            OverlappingRunBackend.overlap_result = deliver_newsletter(newsletter, batch_size=2)
+        return super().send_messages(messages)
+
+
+class NewsletterDeliveryTests(TestCase):
+    def setUp(self):
+        for index in range(5):
+            Subscriber.objects.create(first_name=f'S{index}', last_name='Test',
+                                      email=f's{index}@example.com', is_verified=True, tax=True)
+        Subscriber.objects.create(first_name='Audit', last_name='Only', email='audit@example.com',
+                                  is_verified=True, audit=True)
+        Subscriber.objects.create(first_name='New', last_name='Tax', email='new@example.com', tax=True)
+        self.newsletter = Newsletter.objects.create(title='Tax update', message='Hello', tax=True)
+
+    def test_one_message_per_recipient(self):
+        self.assertEqual(queue_newsletter(self.newsletter), 5)
+        self.assertEqual(deliver_newsletter(self.newsletter, batch_size=2), (5, 0))
+
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertTrue(all(len(message.to) == 1 for message in mail.outbox))
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox),
+                         [f's{index}@example.com' for index in range(5)])
+        self.newsletter.refresh_from_db()
+        self.assertTrue(self.newsletter.sent)
+        self.assertEqual(delivery_progress(self.newsletter)['sent'], 5)
+
+    def test_interrupted_send_resumes(self):
+        queue_newsletter(self.newsletter)
+        self.assertEqual(deliver_newsletter(self.newsletter, batch_size=2, limit=3), (3, 0))
+        self.newsletter.refresh_from_db()
+        self.assertFalse(self.newsletter.sent)
+
+        # Queueing again keeps the progress made so far
+        self.assertEqual(queue_newsletter(self.newsletter), 2)
+        call_command('send_newsletter_deliveries', stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(len({message.to[0] for message in mail.outbox}), 5)
+        self.newsletter.refresh_from_db()
+        self.assertTrue(self.newsletter.sent)
+
+    @override_settings(EMAIL_BACKEND='newsletter.tests.OverlappingRunBackend')
+    def test_overlapping_runs_send_each_recipient_once(self):
+        queue_newsletter(self.newsletter)
+        OverlappingRunBackend.newsletter = self.newsletter
+
+        first = deliver_newsletter(self.newsletter, batch_size=2)
+
+        # The second run skipped the two rows the first one had claimed and sent the other three
+        self.assertEqual(OverlappingRunBackend.overlap_result, (3, 0))
+        self.assertEqual(first, (2, 0))
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox),
+                         [f's{index}@example.com' for index in range(5)])
+        self.assertFalse(NewsletterDelivery.objects.exclude(status=NewsletterDelivery.SENT).exists())
+        self.newsletter.refresh_from_db()
+        self.assertTrue(self.newsletter.sent)
+
+    def test_expired_claim_is_taken_over(self):
+        queue_newsletter(self.newsletter)
+        NewsletterDelivery.objects.update(claimed_until=timezone.now() + timedelta(minutes=5))
+        self.assertEqual(deliver_newsletter(self.newsletter), (0, 0))
+
+        NewsletterDelivery.objects.update(claimed_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(deliver_newsletter(self.newsletter), (5, 0))
+
+    @override_settings(EMAIL_BACKEND='newsletter.tests.RefusingBackend', NEWSLETTER_DELIVERY_MAX_ATTEMPTS=2)
+    def test_failed_recipient_is_retried_then_given_up(self):
+        Subscriber.objects.create(first_name='Bad', last_name='Address', email='bad@refused.example',
+                                  is_verified=True, tax=True)
+        queue_newsletter(self.newsletter)
+
+        self.assertEqual(deliver_newsletter(self.newsletter), (5, 1))
+        self.assertEqual(deliver_newsletter(self.newsletter), (0, 1))
+        self.assertEqual(deliver_newsletter(self.newsletter), (0, 0))
+
+        failed = NewsletterDelivery.objects.get(email='bad@refused.example')
+        self.assertEqual((failed.status, failed.attempts), (NewsletterDelivery.FAILED, 2))
+        self.assertEqual(len(mail.outbox), 5)
+        self.newsletter.refresh_from_db()
+        self.assertTrue(self.newsletter.sent)
+
+
+class PreferenceMaskTests(TestCase):
+    def test_mask_follows_booleans(self):
+        subscriber = Subscriber.objects.create(first_name='A', last_name='B', email='a@example.com',
+                                               audit=True, advisory=True)
+        self.assertEqual(subscriber.preference_mask, PREFERENCE_BITS['audit'] | PREFERENCE_BITS['advisory'])
+
+        subscriber.audit = False
+        subscriber.tax = True
+        subscriber.save(update_fields=['audit', 'tax'])
+        subscriber.refresh_from_db()
+        self.assertEqual(subscriber.preference_mask, PREFERENCE_BITS['tax'] | PREFERENCE_BITS['advisory'])
+
+    def test_audience_shares_a_preference(self):
+        fields = list(PREFERENCE_BITS)
+        for index, field in enumerate(fields):
+            Subscriber.objects.create(first_name='S', last_name='T', email=f'{field}@example.com',
+                                      is_verified=True, **{field: True, fields[index - 1]: True})
+        Subscriber.objects.create(first_name='U', last_name='V', email='unverified@example.com', tax=True)
+
+        newsletter = Newsletter.objects.create(title='T', message='M', tax=True, advisory=True)
+        with self.assertNumQueries(1):
+            emails = sorted(audience(newsletter).values_list('email', flat=True))
+        self.assertEqual(emails, ['advisory@example.com', 'audit@example.com',
+                                  'consulting@example.com', 'tax@example.com'])
+
+        everyone = Newsletter.objects.create(title='T', message='M')
+        self.assertEqual(audience(everyone).count(), len(fields))
+
+
+# The query counts below are about the model queries, not a database-backed cache
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class DashboardStatsTests(TestCase):
+    def setUp(self):
+        cache.delete(STATS_CACHE_KEY)
+        self.admin = get_user_model().objects.create_user(
+            email='admin@example.com', password='pass', first_name='A', last_name='B', is_staff=True,
+        )
+        Subscriber.objects.create(first_name='A', last_name='B', email='a@example.com', is_verified=True, tax=True)
+        Subscriber.objects.create(first_name='C', last_name='D', email='c@example.com', tax=True, audit=True)
+        Newsletter.objects.create(title='T', message='M', sent=True)
+
+    def test_one_query_per_model_then_cached(self):
+        with self.assertNumQueries(2):
+            stats = dashboard_stats()
+        self.assertEqual((stats['total_subscribers'], stats['verified_subscribers']), (2, 1))
+        self.assertEqual((stats['total_newsletters'], stats['sent_newsletters']), (1, 1))
+        self.assertEqual(dict(zip(stats['preference_labels'], stats['preference_data']))['tax'], 2)
+
+        with self.assertNumQueries(0):
+            dashboard_stats()
+
+    def test_saves_invalidate_and_endpoint_serves_stats(self):
+        dashboard_stats()
+        with self.captureOnCommitCallbacks(execute=True):
+            Subscriber.objects.create(first_name='E', last_name='F', email='e@example.com', is_verified=True)
+
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('newsletter:admin_dashboard_data'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['verified_subscribers'], 2)
+
+
+class PersonalizedNewsletterTests(TestCase):
+    def test_each_recipient_gets_their_name_and_unsubscribe_link(self):
+        ama = Subscriber.objects.create(first_name='Ama', last_name='K', email='ama@example.com', is_verified=True)
+        Subscriber.objects.create(first_name='Kofi', last_name='M', email='kofi@example.com', is_verified=True)
+        newsletter = Newsletter.objects.create(title='News', message='Hello')
+        queue_newsletter(newsletter)
+
+        deliver_newsletter(newsletter)
+
+        bodies = {message.to[0]: message.body for message in mail.outbox}
+        self.assertIn('Hello Ama,', bodies['ama@example.com'])
+        self.assertIn('Hello Kofi,', bodies['kofi@example.com'])
+        self.assertIn(unsubscribe_url(ama.pk).replace('&', '&amp;'), bodies['ama@example.com'])
+
+        url = unsubscribe_url(ama.pk)
+        token = url.split('?t=')[1]
+        self.assertContains(self.client.get(url.split('?')[0], {'t': token}), 'ama@example.com')
+        self.assertTrue(Subscriber.objects.filter(pk=ama.pk).exists())
+        self.client.post(reverse('newsletter:unsubscribe'), {'t': token})
+        self.assertFalse(Subscriber.objects.filter(pk=ama.pk).exists())
+
+    def test_forged_unsubscribe_token_is_rejected(self):
+        subscriber = Subscriber.objects.create(first_name='A', last_name='B', email='a@example.com')
+
+        self.client.post(reverse('newsletter:unsubscribe'), {'t': f'{subscriber.pk}:forged'})
+
+        self.assertTrue(Subscriber.objects.filter(pk=subscriber.pk).exists())
+
+    def test_unsubscribed_before_delivery_is_skipped(self):
+        subscriber = Subscriber.objects.create(first_name='A', last_name='B', email='a@example.com', is_verified=True)
+        newsletter = Newsletter.objects.create(title='News', message='Hello')
+        queue_newsletter(newsletter)
+        subscriber.delete()
+
+        self.assertEqual(deliver_newsletter(newsletter), (0, 0))
+        self.assertEqual(len(mail.outbox), 0)
+        newsletter.refresh_from_db()
+        self.assertTrue(newsletter.sent)
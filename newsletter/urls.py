@@ -12,9 +12,11 @@ urlpatterns = [
     # Public-facing views
     path('subscribe/', views.newsletter_subscribe, name='subscribe'),
     path('verify-otp/', views.verify_otp, name='verify_otp'),
+    path('unsubscribe/', views.unsubscribe, name='unsubscribe'),
 
     # Admin Dashboard main page
     path('admin-dashboard/', views.admin_dashboard, name='admin_dashboard'),
+    path('admin-dashboard/data/', views.admin_dashboard_data, name='admin_dashboard_data'),
 
     # Paths for managing subscribers
     path('admin/subscribers/', views.subscriber_list, name='subscriber_list'),
@@ -2,11 +2,7 @@ import random
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required, user_passes_test
-from django.core.mail import EmailMessage
-from django.template.loader import render_to_string
 from django.conf import settings
-from django.utils import timezone
-from django.db.models import Q
 
 from .models import Subscriber, Newsletter
 from .forms import SubscriberForm, OTPForm, NewsletterForm
@@ -21,8 +17,6 @@ def is_admin(user):
 import random
 from django.shortcuts import render, redirect
 from django.contrib import messages
-from django.core.mail import EmailMessage
-from django.template.loader import render_to_string
 from django.conf import settings
 
 from .models import Subscriber
@@ -30,17 +24,19 @@ from .forms import SubscriberForm
 
 import random
 import logging
+from django.core import signing
+from django.utils.html import strip_tags
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required, user_passes_test
-from django.core.mail import EmailMessage
 from django.template.loader import render_to_string
 from django.conf import settings
-from django.utils import timezone
-from django.db.models import Q
 
 from .models import Subscriber, Newsletter
 from .forms import SubscriberForm, OTPForm, NewsletterForm
+from core.outbox import enqueue_mail
+from .delivery import delivery_progress, queue_newsletter, subscriber_from_token
+from .stats import dashboard_stats
 
 # Set up logger
 logger = logging.getLogger(__name__)
@@ -129,18 +125,17 @@ def newsletter_subscribe(request):
                 'is_otp': True,
             }
             html_content = render_to_string('newsletter/otp_email.html', context)
-            email_message = EmailMessage(
-                subject='Verify Your Subscription to OB Global Newsletter',
-                body=html_content,
-                from_email=settings.EMAIL_HOST_USER,
-                to=[email],
+            enqueue_mail(
+                'Verify Your Subscription to OB Global Newsletter',
+                strip_tags(html_content),
+                settings.EMAIL_HOST_USER,
+                [email],
+                html_message=html_content,
             )
-            email_message.content_subtype = 'html'
-            email_message.send()
-            logger.info(f"OTP email sent successfully to {email}")
+            logger.info(f"OTP email queued for {email}")
 
         except Exception as e:
-            logger.error(f"Failed to send OTP email to {email}: {str(e)}")
+            logger.error(f"Failed to queue OTP email to {email}: {str(e)}")
             messages.info(request,
                           "Subscription received! If you don't receive the verification email, please contact support.")
 
@@ -184,16 +179,13 @@ def verify_otp(request):
                     }
                     html_content = render_to_string('newsletter/welcome_email.html', context)
 
-                    email_message = EmailMessage(
-                        subject='Welcome to the OB Global Newsletter!',
-                        body=html_content,
-                        from_email=settings.EMAIL_HOST_USER,
-                        to=[subscriber.email],
+                    enqueue_mail(
+                        'Welcome to the OB Global Newsletter!',
+                        strip_tags(html_content),
+                        settings.EMAIL_HOST_USER,
+                        [subscriber.email],
+                        html_message=html_content,
                     )
-                    email_message.content_subtype = 'html'
-
-                    # Send email with fail_silently to prevent crashes
-                    email_message.send(fail_silently=True)
 
                     messages.success(request,
                                      "You have been successfully subscribed! A confirmation email has been sent.")
@@ -213,6 +205,25 @@ def verify_otp(request):
 
     return render(request, 'newsletter/verify_otp.html', {'form': form, 'email': subscriber.email})
 
+def unsubscribe(request):
+    """
+    Target of the unsubscribe link in every newsletter. The signed token
+    identifies the subscriber; GET asks for confirmation so link scanners
+    cannot unsubscribe anyone, POST removes the subscriber.
+    """
+    token = request.POST.get('t') or request.GET.get('t', '')
+    try:
+        subscriber = Subscriber.objects.filter(pk=subscriber_from_token(token)).first()
+    except signing.BadSignature:
+        subscriber = None
+
+    if subscriber is not None and request.method == 'POST':
+        logger.info(f"Subscriber {subscriber.email} unsubscribed")
+        subscriber.delete()
+        return render(request, 'newsletter/unsubscribe.html', {'unsubscribed': True})
+
+    return render(request, 'newsletter/unsubscribe.html', {'subscriber': subscriber, 'token': token})
+
 # --- Admin Dashboard Views ---
 # (Rest of the views remain unchanged)
 # newsletter/views.py
@@ -221,8 +232,7 @@ def verify_otp(request):
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required, user_passes_test
 from .models import Subscriber, Newsletter
-from django.db.models import Count
-from django.db.models.functions import Coalesce
+from django.http import JsonResponse
 
 
 # A simple decorator to check for admin status
@@ -236,37 +246,16 @@ def admin_dashboard(request):
     """
     Renders the admin dashboard with data for visualizations.
     """
-    # Get total counts
-    total_subscribers = Subscriber.objects.count()
-    verified_subscribers = Subscriber.objects.filter(is_verified=True).count()
-    unverified_subscribers = total_subscribers - verified_subscribers
-
-    total_newsletters = Newsletter.objects.count()
-    sent_newsletters = Newsletter.objects.filter(sent=True).count()
-    unsent_newsletters = total_newsletters - sent_newsletters
-
-    # Get subscriber preference counts
-    preference_counts = {
-        'audit': Subscriber.objects.filter(audit=True).count(),
-        'tax': Subscriber.objects.filter(tax=True).count(),
-        'consulting': Subscriber.objects.filter(consulting=True).count(),
-        'forensic_service': Subscriber.objects.filter(forensic_service=True).count(),
-        'managed_service': Subscriber.objects.filter(managed_service=True).count(),
-        'technology_solution': Subscriber.objects.filter(technology_solution=True).count(),
-        'advisory': Subscriber.objects.filter(advisory=True).count(),
-    }
+    return render(request, 'newsletter/admin_dashboard.html', dashboard_stats())
 
-    context = {
-        'total_subscribers': total_subscribers,
-        'verified_subscribers': verified_subscribers,
-        'unverified_subscribers': unverified_subscribers,
-        'total_newsletters': total_newsletters,
-        'sent_newsletters': sent_newsletters,
-        'unsent_newsletters': unsent_newsletters,
-        'preference_labels': list(preference_counts.keys()),
-        'preference_data': list(preference_counts.values()),
-    }
-    return render(request, 'newsletter/admin_dashboard.html', context)
+
+@login_required
+@user_passes_test(is_admin)
+def admin_dashboard_data(request):
+    """
+    The dashboard numbers as JSON, for the charts.
+    """
+    return JsonResponse(dashboard_stats())
 
 # ... (rest of your views remain unchanged)
 
@@ -382,7 +371,12 @@ def newsletter_detail(request, pk):
             return redirect('newsletter:admin_dashboard')
 
     form = NewsletterForm(instance=newsletter)
-    return render(request, 'newsletter/newsletter_detail.html', {'form': form, 'newsletter': newsletter})
+    context = {
+        'form': form,
+        'newsletter': newsletter,
+        'delivery': delivery_progress(newsletter),
+    }
+    return render(request, 'newsletter/newsletter_detail.html', context)
 
 
 @login_required
@@ -394,71 +388,19 @@ def delete_newsletter(request, pk):
     return redirect('newsletter:admin_dashboard')
 
 
-# newsletter/views.py
-# newsletter/views.py
-
-from django.db import connection  # ⬅️ ADD THIS IMPORT AT THE TOP OF THE FILE
-
-
 @login_required
 @user_passes_test(is_admin)
 def send_newsletter(request, pk):
+    """
+    Queues one delivery per recipient; the emails themselves are sent in
+    batches by the send_newsletter_deliveries command, not in this request.
+    """
     newsletter = get_object_or_404(Newsletter, pk=pk)
 
-    q_objects = Q()
-    if newsletter.audit:
-        q_objects |= Q(audit=True)
-    if newsletter.tax:
-        q_objects |= Q(tax=True)
-    if newsletter.consulting:
-        q_objects |= Q(consulting=True)
-    if newsletter.forensic_service:
-        q_objects |= Q(forensic_service=True)
-    if newsletter.managed_service:
-        q_objects |= Q(managed_service=True)
-    if newsletter.technology_solution:
-        q_objects |= Q(technology_solution=True)
-    if newsletter.advisory:
-        q_objects |= Q(advisory=True)
-
-    # 🚨 MODIFICATION 1: Use .values_list() for efficiency
-    # This fetches only the 'email' column, reducing query load and memory,
-    # and preventing timeouts during the initial database query.
-    if not q_objects:
-        email_list = list(Subscriber.objects.filter(is_verified=True).values_list('email', flat=True))
-    else:
-        email_list = list(Subscriber.objects.filter(q_objects, is_verified=True).values_list('email', flat=True))
-
-    if email_list:
-        # Prepare the HTML content for the email using a template
-        html_content = render_to_string('newsletter/newsletter_email.html', {'newsletter': newsletter})
-
-        # CRITICAL FIX: Close the database connection
-        # before the long-running email process begins.
-        # This ensures the connection isn't idle long enough to be timed out by the server.
-        connection.close()
-
-        # Create an EmailMessage instance
-        email_message = EmailMessage(
-            subject=newsletter.title,
-            body=html_content,
-            from_email=settings.EMAIL_HOST_USER,
-            # Using a list comprehension to prepare the 'to' field for bulk sending
-            to=email_list,
-        )
-
-        # Set the content subtype to 'html'
-        email_message.content_subtype = 'html'
-
-        # Send the email
-        # NOTE: For bulk, use email_message.send(fail_silently=True) for better resilience
-        email_message.send()
-
-        # Django will automatically re-open a new connection for the save operation.
-        newsletter.sent = True
-        newsletter.sent_at = timezone.now()
-        newsletter.save()
-        messages.success(request, f"Newsletter '{newsletter.title}' sent to {len(email_list)} subscribers.")
+    queued = queue_newsletter(newsletter)
+    if queued:
+        messages.success(request, f"Newsletter '{newsletter.title}' queued for {queued} subscribers. "
+                                  f"It is delivered in batches in the background.")
     else:
         messages.warning(request, "No subscribers found for the selected preferences.")
 
@@ -589,7 +531,6 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from .models import Newsletter
 from .forms import NewsletterForm
-from django.utils import timezone
 
 
 @login_required
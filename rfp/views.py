@@ -5,7 +5,6 @@ from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
 from django.http import HttpResponseForbidden, HttpResponseRedirect, JsonResponse
 from django.db.models import Q
-from django.core.mail import send_mail
 from django.template.loader import render_to_string
 from django.utils import timezone
 import os
@@ -14,6 +13,7 @@ import re  # Added for postal code validation
 
 from .models import RFPReferral, RFPFile
 from django.contrib.auth import get_user_model
+from core.outbox import enqueue_mail
 
 User = get_user_model()
 
@@ -54,16 +54,15 @@ def send_rfp_submission_email(referral):
     """
 
     try:
-        send_mail(
+        enqueue_mail(
             subject,
             plain_message,
             FROM_EMAIL,
             TO_EMAIL,
             html_message=html_message,
-            fail_silently=False,
         )
     except Exception as e:
-        print(f"Failed to send RFP submission email: {e}")
+        print(f"Failed to queue RFP submission email: {e}")
 
 
 def send_rfp_update_notification(referral, user_who_made_change, action):
@@ -73,7 +72,8 @@ def send_rfp_update_notification(referral, user_who_made_change, action):
     Actions: 'update', 'file_add', 'file_delete', 'delete'.
     NOTE: This uses the 'emails/rfp_update_notification.html' template.
 
-    MODIFIED: Returns True on success, False on failure.
+    The email is queued in the outbox and sent by the run_outbox worker.
+    Returns True once queued, False on failure.
     """
 
     ADMIN_EMAIL = ['hyallison5050@gmail.com']
@@ -146,17 +146,16 @@ def send_rfp_update_notification(referral, user_who_made_change, action):
     """
 
     try:
-        send_mail(
+        enqueue_mail(
             subject=subject,
             message=plain_message,
             from_email=FROM_EMAIL,
             recipient_list=recipient_list,
             html_message=html_content,
-            fail_silently=False,
         )
         return True  # Return success status
     except Exception as e:
-        print(f"Error sending RFP update notification email: {e}")
+        print(f"Error queueing RFP update notification email: {e}")
         return False  # Return failure status
 
 